@@ -0,0 +1,54 @@
+"""Create resumable upload session tables
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create upload_sessions table
+    op.create_table('upload_sessions',
+        sa.Column('id', sa.String(36), nullable=False),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('filepath', sa.String(500), nullable=False),
+        sa.Column('filetype', sa.String(10), nullable=False),
+        sa.Column('upload_type', sa.String(50), nullable=False),
+        sa.Column('total_size', sa.BigInteger(), nullable=False),
+        sa.Column('chunk_size', sa.Integer(), nullable=False),
+        sa.Column('total_chunks', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False),
+        sa.Column('upload_record_id', sa.Integer(), nullable=True),
+        sa.Column('created_by', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # Create upload_session_chunks table
+    op.create_table('upload_session_chunks',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('session_id', sa.String(36), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('checksum', sa.String(64), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('session_id', 'chunk_index', name='uq_upload_session_chunk')
+    )
+    op.create_index('ix_upload_session_chunks_session_id', 'upload_session_chunks', ['session_id'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_session_chunks_session_id', table_name='upload_session_chunks')
+    op.drop_table('upload_session_chunks')
+    op.drop_table('upload_sessions')
@@ -0,0 +1,89 @@
+"""Create ingestion target tables for Zomato settlements and HDFC MPR
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Store and tax columns on POS orders
+    op.add_column('orders', sa.Column('store_code', sa.String(255), nullable=True))
+    op.add_column('orders', sa.Column('tax_amount', sa.Float(), nullable=True))
+    op.create_index('ix_orders_store_code', 'orders', ['store_code'])
+
+    # Create zomato table
+    op.create_table('zomato',
+        sa.Column('id', sa.String(255), nullable=False),
+        sa.Column('order_id', sa.String(255), nullable=True),
+        sa.Column('pos_order_id', sa.String(255), nullable=True),
+        sa.Column('store_code', sa.String(255), nullable=True),
+        sa.Column('order_date', sa.DateTime(), nullable=True),
+        sa.Column('action', sa.String(50), nullable=True),
+        sa.Column('order_status', sa.String(255), nullable=True),
+        sa.Column('net_amount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('tax_paid_by_customer', sa.Numeric(15, 2), nullable=True),
+        sa.Column('commission_value', sa.Numeric(15, 2), nullable=True),
+        sa.Column('pg_applied_on', sa.Numeric(15, 2), nullable=True),
+        sa.Column('pg_charge', sa.Numeric(15, 2), nullable=True),
+        sa.Column('taxes_zomato_fee', sa.Numeric(15, 2), nullable=True),
+        sa.Column('tds_amount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('final_amount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('credit_note_amount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('pro_discount_passthrough', sa.Numeric(15, 2), nullable=True),
+        sa.Column('customer_discount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('rejection_penalty_charge', sa.Numeric(15, 2), nullable=True),
+        sa.Column('user_credits_charge', sa.Numeric(15, 2), nullable=True),
+        sa.Column('promo_recovery_adj', sa.Numeric(15, 2), nullable=True),
+        sa.Column('icecream_handling', sa.Numeric(15, 2), nullable=True),
+        sa.Column('icecream_deductions', sa.Numeric(15, 2), nullable=True),
+        sa.Column('order_support_cost', sa.Numeric(15, 2), nullable=True),
+        sa.Column('merchant_delivery_charge', sa.Numeric(15, 2), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_zomato_order_id', 'zomato', ['order_id'])
+    op.create_index('ix_zomato_store_date', 'zomato', ['store_code', 'order_date'])
+
+    # Create mpr_hdfc table
+    op.create_table('mpr_hdfc',
+        sa.Column('uid', sa.String(255), nullable=False),
+        sa.Column('channel', sa.String(20), nullable=False),
+        sa.Column('store_code', sa.String(255), nullable=True),
+        sa.Column('mid', sa.String(128), nullable=True),
+        sa.Column('tid', sa.String(128), nullable=True),
+        sa.Column('rrn', sa.String(128), nullable=True),
+        sa.Column('auth_code', sa.String(128), nullable=True),
+        sa.Column('card_number', sa.String(128), nullable=True),
+        sa.Column('payment_mode', sa.String(128), nullable=True),
+        sa.Column('transaction_date', sa.Date(), nullable=True),
+        sa.Column('settlement_date', sa.Date(), nullable=True),
+        sa.Column('gross_amount', sa.Numeric(15, 2), nullable=True),
+        sa.Column('commission', sa.Numeric(15, 2), nullable=True),
+        sa.Column('gst', sa.Numeric(15, 2), nullable=True),
+        sa.Column('net_amount', sa.Numeric(15, 2), nullable=True),
+        sa.PrimaryKeyConstraint('uid')
+    )
+    op.create_index('ix_mpr_hdfc_transaction_date', 'mpr_hdfc', ['transaction_date'])
+    op.create_index('ix_mpr_hdfc_tid', 'mpr_hdfc', ['tid'])
+
+
+def downgrade():
+    op.drop_index('ix_mpr_hdfc_tid', table_name='mpr_hdfc')
+    op.drop_index('ix_mpr_hdfc_transaction_date', table_name='mpr_hdfc')
+    op.drop_table('mpr_hdfc')
+    op.drop_index('ix_zomato_store_date', table_name='zomato')
+    op.drop_index('ix_zomato_order_id', table_name='zomato')
+    op.drop_table('zomato')
+    op.drop_index('ix_orders_store_code', table_name='orders')
+    op.drop_column('orders', 'tax_amount')
+    op.drop_column('orders', 'store_code')
@@ -0,0 +1,26 @@
+"""Add content hash to upload logs for duplicate detection
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('upload_logs', sa.Column('sha256', sa.String(64), nullable=True))
+    # NULL hashes (uploads made before this migration) never collide
+    op.create_unique_constraint('uq_upload_logs_type_sha256', 'upload_logs', ['upload_type', 'sha256'])
+
+
+def downgrade():
+    op.drop_constraint('uq_upload_logs_type_sha256', 'upload_logs', type_='unique')
+    op.drop_column('upload_logs', 'sha256')
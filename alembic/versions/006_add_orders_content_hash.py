@@ -0,0 +1,25 @@
+"""Add content hash to orders for idempotent upsert ingestion
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('orders', sa.Column('content_hash', sa.String(16), nullable=True))
+    op.create_index('ix_orders_order_id_content_hash', 'orders', ['order_id', 'content_hash'])
+
+
+def downgrade():
+    op.drop_index('ix_orders_order_id_content_hash', table_name='orders')
+    op.drop_column('orders', 'content_hash')
@@ -0,0 +1,25 @@
+"""Add parse cache location and parser version to upload logs
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('upload_logs', sa.Column('cache_path', sa.String(500), nullable=True))
+    op.add_column('upload_logs', sa.Column('cache_version', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('upload_logs', 'cache_version')
+    op.drop_column('upload_logs', 'cache_path')
@@ -0,0 +1,38 @@
+"""Create upload header mapping registry
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'upload_header_mappings',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('upload_type', sa.String(50), nullable=False),
+        sa.Column('parser_version', sa.Integer(), nullable=False),
+        sa.Column('signature', sa.String(64), nullable=False),
+        sa.Column('headers', sa.Text(), nullable=False),
+        sa.Column('mapping', sa.Text(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_used_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('upload_type', 'parser_version', 'signature', name='uq_upload_header_mappings_signature'),
+    )
+    op.create_index(op.f('ix_upload_header_mappings_id'), 'upload_header_mappings', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_upload_header_mappings_id'), table_name='upload_header_mappings')
+    op.drop_table('upload_header_mappings')
@@ -0,0 +1,26 @@
+"""Add content-addressed storage key to upload logs
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('upload_logs', sa.Column('storage_key', sa.String(255), nullable=True))
+    # Blob garbage collection looks uploads up by key
+    op.create_index('ix_upload_logs_storage_key', 'upload_logs', ['storage_key'])
+
+
+def downgrade():
+    op.drop_index('ix_upload_logs_storage_key', table_name='upload_logs')
+    op.drop_column('upload_logs', 'storage_key')
@@ -0,0 +1,23 @@
+"""Record when retention housekeeping purged an upload's files
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('upload_logs', sa.Column('purged_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('upload_logs', 'purged_at')
@@ -0,0 +1,44 @@
+"""Create per-store, per-day rollup table
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'store_daily_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(30), nullable=False),
+        sa.Column('store_code', sa.String(255), nullable=False),
+        sa.Column('business_date', sa.Date(), nullable=False),
+        sa.Column('txn_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('gross_amount', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('net_amount', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('tax_amount', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('commission', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('pg_charge', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('tds_amount', sa.Numeric(15, 2), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source', 'store_code', 'business_date', name='uq_store_daily_rollup_key'),
+    )
+    op.create_index(op.f('ix_store_daily_rollup_id'), 'store_daily_rollup', ['id'], unique=False)
+    # Dashboard queries filter a source by date range
+    op.create_index('ix_store_daily_rollup_source_date', 'store_daily_rollup', ['source', 'business_date'])
+
+
+def downgrade():
+    op.drop_index('ix_store_daily_rollup_source_date', table_name='store_daily_rollup')
+    op.drop_index(op.f('ix_store_daily_rollup_id'), table_name='store_daily_rollup')
+    op.drop_table('store_daily_rollup')
@@ -0,0 +1,38 @@
+"""Create reconciliation dirty partitions table
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012'
+down_revision = '011'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'reconciliation_dirty_partitions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(30), nullable=False),
+        sa.Column('store_code', sa.String(255), nullable=False),
+        sa.Column('business_date', sa.Date(), nullable=False),
+        sa.Column('marked_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source', 'store_code', 'business_date', name='uq_dirty_partition_key'),
+    )
+    op.create_index(op.f('ix_reconciliation_dirty_partitions_id'), 'reconciliation_dirty_partitions',
+                    ['id'], unique=False)
+    op.create_index('ix_dirty_partition_source_date', 'reconciliation_dirty_partitions',
+                    ['source', 'business_date'])
+
+
+def downgrade():
+    op.drop_index('ix_dirty_partition_source_date', table_name='reconciliation_dirty_partitions')
+    op.drop_index(op.f('ix_reconciliation_dirty_partitions_id'), table_name='reconciliation_dirty_partitions')
+    op.drop_table('reconciliation_dirty_partitions')
@@ -0,0 +1,25 @@
+"""Record how confidently sheet rows were matched
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013'
+down_revision = '012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('zomato_pos_vs_3po_data', sa.Column('match_confidence', sa.Numeric(5, 4), nullable=True))
+    op.add_column('zomato_3po_vs_pos_data', sa.Column('match_confidence', sa.Numeric(5, 4), nullable=True))
+
+
+def downgrade():
+    op.drop_column('zomato_3po_vs_pos_data', 'match_confidence')
+    op.drop_column('zomato_pos_vs_3po_data', 'match_confidence')
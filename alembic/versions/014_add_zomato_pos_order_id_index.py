@@ -0,0 +1,23 @@
+"""Index Zomato rows by merchant order ID for the SQL reconciliation engine
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014'
+down_revision = '013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_zomato_pos_order_id', 'zomato', ['pos_order_id'])
+
+
+def downgrade():
+    op.drop_index('ix_zomato_pos_order_id', table_name='zomato')
@@ -0,0 +1,37 @@
+"""Create per-organization Zomato rate cards
+
+Revision ID: 015
+Revises: 014
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '015'
+down_revision = '014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('zomato_rate_cards',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('organization_id', sa.BigInteger(), nullable=False),
+        sa.Column('store_code', sa.String(255), nullable=True),
+        sa.Column('effective_from', sa.Date(), nullable=False),
+        sa.Column('commission_rate', sa.Numeric(7, 5), nullable=False),
+        sa.Column('pg_rate', sa.Numeric(7, 5), nullable=False),
+        sa.Column('fee_gst_rate', sa.Numeric(7, 5), nullable=False),
+        sa.Column('tds_rate', sa.Numeric(7, 5), nullable=False),
+        sa.Column('created_by', sa.String(255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_zomato_rate_cards_org_date', 'zomato_rate_cards', ['organization_id', 'effective_from'])
+
+
+def downgrade():
+    op.drop_index('ix_zomato_rate_cards_org_date', table_name='zomato_rate_cards')
+    op.drop_table('zomato_rate_cards')
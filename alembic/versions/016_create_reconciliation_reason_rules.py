@@ -0,0 +1,31 @@
+"""Create per-organization reconciliation reason rules
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '016'
+down_revision = '015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reconciliation_reason_rules',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('organization_id', sa.BigInteger(), nullable=False),
+        sa.Column('rules', sa.Text(), nullable=False),
+        sa.Column('updated_by', sa.String(255), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('organization_id')
+    )
+
+
+def downgrade():
+    op.drop_table('reconciliation_reason_rules')
@@ -5,8 +5,10 @@ Database configuration and connection management
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import text
+from contextlib import asynccontextmanager
 from app.config.settings import settings, get_database_urls
 import logging
+import threading
 
 # Note: Model imports are handled in main.py to avoid circular imports
 
@@ -23,6 +25,30 @@ main_engine = None
 sso_session_factory = None
 main_session_factory = None
 
+# Engines of background job threads, each bound to its thread's event loop
+_job_thread = threading.local()
+
+
+def _build_engine(url: str):
+    connect_args = {"local_infile": True} if settings.db_local_infile else {}
+    return create_async_engine(
+        url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        echo=settings.debug,
+        connect_args=connect_args,
+    )
+
+
+def _build_session_factory(engine):
+    return async_sessionmaker(
+        engine,
+        class_=AsyncSession,
+        expire_on_commit=False
+    )
+
 
 async def create_engines():
     """Create database engines"""
@@ -31,38 +57,13 @@ async def create_engines():
     try:
         sso_url, main_url = get_database_urls()
         
-        # SSO Database Engine
-        sso_engine = create_async_engine(
-            sso_url,
-            pool_size=settings.db_pool_size,
-            max_overflow=settings.db_max_overflow,
-            pool_timeout=settings.db_pool_timeout,
-            pool_recycle=settings.db_pool_recycle,
-            echo=settings.debug,
-        )
-        
-        # Main Database Engine
-        main_engine = create_async_engine(
-            main_url,
-            pool_size=settings.db_pool_size,
-            max_overflow=settings.db_max_overflow,
-            pool_timeout=settings.db_pool_timeout,
-            pool_recycle=settings.db_pool_recycle,
-            echo=settings.debug,
-        )
+        # SSO and Main Database Engines
+        sso_engine = _build_engine(sso_url)
+        main_engine = _build_engine(main_url)
         
         # Create session factories
-        sso_session_factory = async_sessionmaker(
-            sso_engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
-        
-        main_session_factory = async_sessionmaker(
-            main_engine,
-            class_=AsyncSession,
-            expire_on_commit=False
-        )
+        sso_session_factory = _build_session_factory(sso_engine)
+        main_session_factory = _build_session_factory(main_engine)
         
         logger.info("Database engines created successfully")
         
@@ -71,6 +72,30 @@ async def create_engines():
         raise
 
 
+def use_thread_engines():
+    """Give sessions opened in the calling thread engines of its own
+
+    Background jobs run on one event loop per thread (see
+    ``app.workers.jobs``), and pooled connections cannot move between event
+    loops, so a job thread must not use the engines created on the API's
+    loop. Its engines are created on first use and kept for its later jobs.
+    """
+    _job_thread.enabled = True
+
+
+async def _session_factories():
+    """SSO and Main session factories for the calling thread"""
+    if getattr(_job_thread, "enabled", False):
+        if getattr(_job_thread, "sso_session_factory", None) is None:
+            sso_url, main_url = get_database_urls()
+            _job_thread.sso_session_factory = _build_session_factory(_build_engine(sso_url))
+            _job_thread.main_session_factory = _build_session_factory(_build_engine(main_url))
+        return _job_thread.sso_session_factory, _job_thread.main_session_factory
+    if not sso_session_factory or not main_session_factory:
+        await create_engines()
+    return sso_session_factory, main_session_factory
+
+
 async def test_connections():
     """Test database connections"""
     try:
@@ -126,3 +151,21 @@ async def get_main_db():
             yield session
         finally:
             await session.close()
+
+
+@asynccontextmanager
+async def sso_db_session():
+    """SSO database session for use outside request handlers"""
+    factory, _ = await _session_factories()
+    
+    async with factory() as session:
+        yield session
+
+
+@asynccontextmanager
+async def main_db_session():
+    """Main database session for use outside request handlers"""
+    _, factory = await _session_factories()
+    
+    async with factory() as session:
+        yield session
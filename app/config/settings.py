@@ -3,7 +3,7 @@ Application settings and configuration
 """
 
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 import os
 
 
@@ -58,6 +58,7 @@ class Settings(BaseSettings):
     db_max_overflow: int = 10
     db_pool_timeout: int = 30
     db_pool_recycle: int = 3600
+    db_local_infile: bool = False
     
     # Organization & Tool IDs
     organization_id: int = 1
@@ -73,7 +74,84 @@ class Settings(BaseSettings):
     redis_host: str = "localhost"
     redis_port: int = 6379
     redis_db: int = 0
-    
+
+    # File Uploads
+    upload_dir: str = "uploads"
+    upload_chunk_size: int = 1024 * 1024
+    upload_session_chunk_size: int = 8 * 1024 * 1024
+
+    # Upload Storage
+    storage_backend: str = "local"  # local or s3
+    storage_root: Optional[str] = None  # local backend; defaults to {upload_dir}/store
+    storage_compression: str = "zstd"  # zstd, gzip or none
+    storage_compression_level: int = 3
+    storage_gc_grace_seconds: int = 3600
+    s3_bucket: Optional[str] = None
+    s3_prefix: str = ""
+    s3_endpoint_url: Optional[str] = None  # e.g. a MinIO server
+    s3_region: Optional[str] = None
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+
+    # Generated Reports
+    reports_dir: str = "reports"
+
+    # Retention (housekeeping job)
+    retention_upload_days: int = 90  # raw files of completed uploads
+    retention_upload_type_days: Dict[str, int] = {}  # per-type overrides, e.g. {"orders": 30}
+    retention_report_days: int = 30
+    retention_report_type_days: Dict[str, int] = {}  # keyed by report filename prefix, e.g. {"trm": 7}
+    retention_archive_dir: Optional[str] = None  # move expired files here instead of deleting them
+    retention_batch_size: int = 200
+    housekeeping_interval_hours: float = 24.0
+
+    # Upload Processing
+    ingest_batch_size: int = 5000
+    ingest_use_staging: bool = True
+    bulk_load_mode: str = "executemany"
+    bulk_load_batch_size: int = 1000
+    bulk_load_infile_min_bytes: int = 50 * 1024 * 1024
+    upload_max_concurrent: int = 4
+    upload_max_concurrent_per_type: int = 2
+    upload_type_limits: Dict[str, int] = {}  # per-type overrides, e.g. {"orders": 1}
+    upload_schedule_retry_seconds: int = 5
+    upload_slot_stale_seconds: int = 600
+    upload_progress_interval: float = 2.0
+
+    # Reconciliation
+    sheet_generation_mode: str = "full"  # full, or opt in to incremental
+    reconciliation_tolerance: float = 1.0  # largest payout difference still counted as reconciled
+    reconciliation_memory_budget_mb: float = 256  # per partition of stores and dates
+    reconciliation_workers: int = 0  # partitions reconciled at once; 0 uses process_pool_workers
+    reconciliation_bucket_days: int = 7
+    reconciliation_match_slack_minutes: int = 60  # POS timestamps may differ this much from Zomato's
+    reconciliation_fuzzy_match: bool = True  # pair orders without a shared ID on time and amount
+    reconciliation_fuzzy_window_minutes: float = 30  # keep within the match slack
+    reconciliation_fuzzy_amount_tolerance: float = 1.0
+    reconciliation_fuzzy_candidates: int = 64  # POS orders nearest in time on each side of a sale; 0 for all
+    reconciliation_engine: str = "python"  # python, or opt in to sql or auto (sql between the row bounds below)
+    reconciliation_sql_min_rows: int = 50_000
+    reconciliation_sql_max_rows: int = 5_000_000
+    reconciliation_main_schema: str = ""  # main database name as seen from sso; empty uses its configured name
+    zomato_commission_rate: float = 0.18
+    zomato_pg_rate: float = 0.02
+    zomato_fee_gst_rate: float = 0.18  # GST on commission and PG charges
+    zomato_tds_rate: float = 0.001  # TDS under section 194-O
+
+    # Process Pool (CPU-bound parsing and report writing)
+    process_pool_workers: int = 2  # 0 runs the work in threads instead
+    process_pool_max_tasks_per_child: int = 50
+    process_pool_spool_batches: int = 4
+
+    # Background Jobs
+    job_broker: str = "redis"  # redis, filesystem or memory (tests only, refused in production)
+    job_broker_url: Optional[str] = None
+    job_queue_dir: str = "job_queue"
+    job_visibility_timeout: int = 3600
+    job_max_retries: int = 5
+    job_retry_backoff: int = 10
+    job_retry_backoff_max: int = 600
+
     class Config:
         env_file = ".env"
         case_sensitive = False
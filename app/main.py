@@ -12,6 +12,7 @@ import asyncio
 from dotenv import load_dotenv
 from app.config.database import create_engines, test_connections
 from app.workers.tasks import run_scheduled_tasks
+from app.workers.process_pool import process_pool
 
 # Load environment variables
 load_dotenv()
@@ -25,11 +26,11 @@ from app.models.sso import (
     ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
     OrdersNotInPosData, OrdersNotIn3poData,
     # Reconciliation Models (now in SSO for compatibility)
-    ZomatoVsPosSummary, ThreepoDashboard, Store, Trm
+    ZomatoVsPosSummary, ThreepoDashboard, Store, Trm, ZomatoOrder, MprHdfc
 )
 from app.models.main import (
     # Main database models
-    Orders, UploadRecord
+    Orders, UploadRecord, UploadSession, UploadSessionChunk
 )
 
 # Import routes
@@ -72,6 +73,12 @@ async def startup_event():
         # Test database connections
         await test_connections()
         
+        # Start and warm up the process pool for CPU-bound work
+        await process_pool.warmup()
+        
+        # Set up the job queue now, so JOB_BROKER=memory is refused or warned about at startup
+        from app.workers.celery_app import celery_app  # noqa: F401
+        
         print("✅ Database connections established successfully")
         print("✅ Application startup completed")
         
@@ -79,6 +86,12 @@ async def startup_event():
         print(f"❌ Application startup failed: {e}")
         raise
 
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Application shutdown tasks"""
+    process_pool.shutdown()
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -4,6 +4,10 @@ Main Models Package
 
 from .orders import Orders
 from .upload_record import UploadRecord
+from .header_mapping import HeaderMapping
+from .store_daily_rollup import StoreDailyRollup
+from .dirty_partition import DirtyPartition
+from .upload_session import UploadSession, UploadSessionChunk
 from .sheet_data import (
     ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
     OrdersNotInPosData, OrdersNotIn3poData
@@ -15,6 +19,11 @@ from .reconciliation import (
 __all__ = [
     "Orders",
     "UploadRecord",
+    "HeaderMapping",
+    "StoreDailyRollup",
+    "DirtyPartition",
+    "UploadSession",
+    "UploadSessionChunk",
     # Sheet Data Models
     "ZomatoPosVs3poData",
     "Zomato3poVsPosData", 
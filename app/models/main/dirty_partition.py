@@ -0,0 +1,76 @@
+"""
+Dirty Partition model for main database
+"""
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, Index, UniqueConstraint, select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import Base
+from datetime import date, datetime
+from typing import List, Optional, Set, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DirtyPartition(Base):
+    """Store and business date of a source whose rows changed since the last reconciliation
+
+    Marked by ingestion in the same transaction that merges the rows, and
+    cleared by incremental sheet generation once the store-day is rebuilt.
+    """
+    __tablename__ = "reconciliation_dirty_partitions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(30), nullable=False)
+    store_code = Column(String(255), nullable=False)
+    business_date = Column(Date, nullable=False)
+    marked_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('source', 'store_code', 'business_date', name='uq_dirty_partition_key'),
+        Index('ix_dirty_partition_source_date', 'source', 'business_date'),
+    )
+
+    @classmethod
+    def _filtered(cls, query, sources: List[str], start_date: date, end_date: date,
+                  store_codes: Optional[List[str]], marked_before: Optional[datetime]):
+        query = query.where(
+            cls.source.in_(sources),
+            cls.business_date >= start_date,
+            cls.business_date <= end_date,
+        )
+        if store_codes:
+            query = query.where(cls.store_code.in_(store_codes))
+        if marked_before is not None:
+            query = query.where(cls.marked_at <= marked_before)
+        return query
+
+    @classmethod
+    async def get_keys(cls, db: AsyncSession, sources: List[str], start_date: date, end_date: date,
+                       store_codes: Optional[List[str]] = None,
+                       marked_before: Optional[datetime] = None) -> Set[Tuple[str, date]]:
+        """(store_code, business_date) pairs marked dirty for any of the sources"""
+        try:
+            query = cls._filtered(select(cls.store_code, cls.business_date),
+                                  sources, start_date, end_date, store_codes, marked_before)
+            result = await db.execute(query)
+            return set(result.all())
+        except Exception as e:
+            logger.error(f"Error getting dirty partitions: {e}")
+            raise
+
+    @classmethod
+    async def clear(cls, db: AsyncSession, sources: List[str], start_date: date, end_date: date,
+                    store_codes: Optional[List[str]] = None,
+                    marked_before: Optional[datetime] = None) -> int:
+        """Remove marks that have been reconciled; marks made after marked_before are kept"""
+        try:
+            result = await db.execute(
+                cls._filtered(delete(cls), sources, start_date, end_date, store_codes, marked_before)
+            )
+            await db.commit()
+            return result.rowcount
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error clearing dirty partitions: {e}")
+            raise
@@ -0,0 +1,87 @@
+"""
+Header Mapping model for main database
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, UniqueConstraint
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from app.config.database import Base
+from datetime import datetime
+from typing import Dict, List
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HeaderMapping(Base):
+    """Column mapping learned for one vendor header layout
+
+    Keyed by upload type, parser version and the signature (hash) of the
+    normalized header row, so a layout seen before is mapped without
+    matching its headers again.
+    """
+    __tablename__ = "upload_header_mappings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    upload_type = Column(String(50), nullable=False)
+    parser_version = Column(Integer, nullable=False)
+    signature = Column(String(64), nullable=False)
+    headers = Column(Text, nullable=False)
+    mapping = Column(Text, nullable=False)
+    hits = Column(Integer, default=0, nullable=False)
+    last_used_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('upload_type', 'parser_version', 'signature', name='uq_upload_header_mappings_signature'),
+    )
+
+    @classmethod
+    async def get_mappings(cls, db: AsyncSession, upload_type: str, parser_version: int) -> Dict[str, Dict[int, str]]:
+        """Known mappings for an upload type, keyed by header signature"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(
+                select(cls.signature, cls.mapping)
+                .where(cls.upload_type == upload_type, cls.parser_version == parser_version)
+            )
+            return {
+                signature: {int(position): name for position, name in json.loads(mapping).items()}
+                for signature, mapping in result.all()
+            }
+        except Exception as e:
+            logger.error(f"Error getting header mappings: {e}")
+            return {}
+
+    @classmethod
+    async def record_use(cls, db: AsyncSession, upload_type: str, parser_version: int, signature: str,
+                         headers: List, mapping: Dict[int, str]):
+        """Store a newly resolved mapping, or count another use of a known one"""
+        try:
+            from sqlalchemy import update
+            now = datetime.utcnow()
+            result = await db.execute(
+                update(cls)
+                .where(cls.upload_type == upload_type, cls.parser_version == parser_version,
+                       cls.signature == signature)
+                .values(hits=cls.hits + 1, last_used_at=now)
+            )
+            if result.rowcount == 0:
+                db.add(cls(
+                    upload_type=upload_type,
+                    parser_version=parser_version,
+                    signature=signature,
+                    headers=json.dumps(headers),
+                    mapping=json.dumps(mapping),
+                    hits=1,
+                    last_used_at=now,
+                ))
+            await db.commit()
+        except IntegrityError:
+            # Another worker stored the same layout first
+            await db.rollback()
+        except Exception as e:
+            logger.error(f"Error recording header mapping: {e}")
+            await db.rollback()
+            raise
@@ -2,7 +2,7 @@
 Orders model for Main database
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Boolean, Index
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import Base
 from datetime import datetime
@@ -18,14 +18,22 @@ class Orders(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     order_id = Column(String(255), unique=True, index=True, nullable=False)
+    store_code = Column(String(255), index=True, nullable=True)
     customer_name = Column(String(255), nullable=True)
     order_amount = Column(Float, nullable=True)
+    tax_amount = Column(Float, nullable=True)
     order_date = Column(DateTime, nullable=True)
     status = Column(String(100), nullable=True)
     payment_method = Column(String(100), nullable=True)
+    content_hash = Column(String(16), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Covers the per-batch hash lookup done by upsert ingestion
+        Index('ix_orders_order_id_content_hash', 'order_id', 'content_hash'),
+    )
+    
     @classmethod
     async def create(cls, db: AsyncSession, **kwargs):
         """Create a new order"""
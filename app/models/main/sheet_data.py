@@ -68,6 +68,7 @@ class ZomatoPosVs3poData(Base):
     reconciled_amount = Column(Numeric(15, 2), nullable=True)
     unreconciled_amount = Column(Numeric(15, 2), nullable=True)
     pos_vs_zomato_reason = Column(String(255), nullable=True)
+    match_confidence = Column(Numeric(5, 4), nullable=True)  # 1 for order ID matches
     order_status_pos = Column(String(255), nullable=True)
     
     created_at = Column(DateTime, nullable=True)
@@ -159,6 +160,7 @@ class Zomato3poVsPosData(Base):
     reconciled_status = Column(String(255), nullable=True)
     reconciled_amount = Column(Numeric(15, 2), nullable=True)
     unreconciled_amount = Column(Numeric(15, 2), nullable=True)
+    match_confidence = Column(Numeric(5, 4), nullable=True)  # 1 for order ID matches
     
     created_at = Column(DateTime, nullable=True)
     updated_at = Column(DateTime, nullable=True)
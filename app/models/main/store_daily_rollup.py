@@ -0,0 +1,98 @@
+"""
+Store Daily Rollup model for main database
+"""
+
+from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, Index, UniqueConstraint, select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import Base
+from datetime import date, datetime
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Summed columns, in the order they are reported
+ROLLUP_MEASURES = ["gross_amount", "net_amount", "tax_amount", "commission", "pg_charge", "tds_amount"]
+
+
+class StoreDailyRollup(Base):
+    """Per-store, per-business-date totals of one ingested source
+
+    Maintained by ingestion with additive upserts: each upload adds the
+    totals of its new rows and swaps old for new values on updated rows.
+    """
+    __tablename__ = "store_daily_rollup"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(30), nullable=False)
+    store_code = Column(String(255), nullable=False)
+    business_date = Column(Date, nullable=False)
+    txn_count = Column(Integer, nullable=False, default=0)
+    gross_amount = Column(Numeric(15, 2), nullable=False, default=0)
+    net_amount = Column(Numeric(15, 2), nullable=False, default=0)
+    tax_amount = Column(Numeric(15, 2), nullable=False, default=0)
+    commission = Column(Numeric(15, 2), nullable=False, default=0)
+    pg_charge = Column(Numeric(15, 2), nullable=False, default=0)
+    tds_amount = Column(Numeric(15, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('source', 'store_code', 'business_date', name='uq_store_daily_rollup_key'),
+        Index('ix_store_daily_rollup_source_date', 'source', 'business_date'),
+    )
+
+    def to_dict(self):
+        return {
+            "source": self.source,
+            "store_code": self.store_code,
+            "business_date": self.business_date.isoformat() if self.business_date else None,
+            "txn_count": self.txn_count,
+            **{name: float(getattr(self, name) or 0) for name in ROLLUP_MEASURES},
+        }
+
+    @classmethod
+    async def get_daily_totals(cls, db: AsyncSession, source: str, start_date: date, end_date: date,
+                               store_codes: Optional[List[str]] = None):
+        """Rollup rows of a source between two business dates, inclusive"""
+        try:
+            query = select(cls).where(
+                cls.source == source,
+                cls.business_date >= start_date,
+                cls.business_date <= end_date,
+            )
+            if store_codes:
+                query = query.where(cls.store_code.in_(store_codes))
+            result = await db.execute(query.order_by(cls.business_date, cls.store_code))
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting store daily totals: {e}")
+            return []
+
+    @classmethod
+    async def get_totals_by_store(cls, db: AsyncSession, source: str, start_date: date, end_date: date,
+                                  store_codes: Optional[List[str]] = None) -> List[dict]:
+        """Totals per store over a date range, summed from the daily rows"""
+        try:
+            query = select(
+                cls.store_code,
+                func.sum(cls.txn_count).label("txn_count"),
+                *[func.sum(getattr(cls, name)).label(name) for name in ROLLUP_MEASURES],
+            ).where(
+                cls.source == source,
+                cls.business_date >= start_date,
+                cls.business_date <= end_date,
+            )
+            if store_codes:
+                query = query.where(cls.store_code.in_(store_codes))
+            result = await db.execute(query.group_by(cls.store_code).order_by(cls.store_code))
+            return [
+                {
+                    "store_code": row.store_code,
+                    "txn_count": int(row.txn_count or 0),
+                    **{name: float(getattr(row, name) or 0) for name in ROLLUP_MEASURES},
+                }
+                for row in result.all()
+            ]
+        except Exception as e:
+            logger.error(f"Error getting store totals: {e}")
+            return []
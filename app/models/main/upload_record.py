@@ -2,7 +2,7 @@
 Upload Record model for main database
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Index, UniqueConstraint
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import Base
 from datetime import datetime
@@ -25,9 +25,19 @@ class UploadRecord(Base):
     status = Column(String(20), default="uploaded", nullable=False)
     message = Column(Text, nullable=True)
     processed_data = Column(Text, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    cache_path = Column(String(500), nullable=True)
+    cache_version = Column(Integer, nullable=True)
+    storage_key = Column(String(255), nullable=True)
+    purged_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        UniqueConstraint('upload_type', 'sha256', name='uq_upload_logs_type_sha256'),
+        Index('ix_upload_logs_storage_key', 'storage_key'),
+    )
+    
     @classmethod
     async def create(cls, db: AsyncSession, **kwargs):
         """Create a new upload record"""
@@ -53,6 +63,80 @@ class UploadRecord(Base):
             logger.error(f"Error getting upload record by ID: {e}")
             return None
     
+    @classmethod
+    async def get_by_hash(cls, db: AsyncSession, upload_type: str, sha256: str):
+        """Get the upload of the given type with identical file contents"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(
+                select(cls).where(cls.upload_type == upload_type, cls.sha256 == sha256)
+            )
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Error getting upload record by hash: {e}")
+            return None
+    
+    @classmethod
+    async def is_stored_file_referenced(cls, db: AsyncSession, storage_key: str) -> bool:
+        """Whether any upload still points at a stored file"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(select(cls.id).where(cls.storage_key == storage_key).limit(1))
+            return result.first() is not None
+        except Exception as e:
+            # Raise rather than guess: a wrong answer would delete a file still in use
+            logger.error(f"Error checking stored file references: {e}")
+            raise
+    
+    @classmethod
+    async def get_storage_keys(cls, db: AsyncSession) -> set:
+        """Every stored file key still referenced by an upload"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(select(cls.storage_key).where(cls.storage_key.isnot(None)).distinct())
+            return set(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error getting stored file keys: {e}")
+            raise
+    
+    @classmethod
+    async def get_expired(cls, db: AsyncSession, cutoff: datetime, limit: int,
+                          upload_types: Optional[List[str]] = None,
+                          exclude_types: Optional[List[str]] = None):
+        """Completed uploads last updated before cutoff whose files are not yet purged"""
+        try:
+            from sqlalchemy import select
+            query = select(cls).where(
+                cls.status == "completed",
+                cls.purged_at.is_(None),
+                cls.updated_at < cutoff,
+            )
+            if upload_types:
+                query = query.where(cls.upload_type.in_(upload_types))
+            if exclude_types:
+                query = query.where(cls.upload_type.notin_(exclude_types))
+            result = await db.execute(query.order_by(cls.id).limit(limit))
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting expired upload records: {e}")
+            raise
+    
+    @classmethod
+    async def mark_files_purged(cls, db: AsyncSession, upload_ids: List[int], purged_at: datetime):
+        """Record that the uploads' raw file, parse cache and error file were removed"""
+        try:
+            from sqlalchemy import update
+            await db.execute(
+                update(cls)
+                .where(cls.id.in_(upload_ids))
+                .values(storage_key=None, cache_path=None, cache_version=None, purged_at=purged_at)
+            )
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error marking upload files purged: {e}")
+            await db.rollback()
+            raise
+    
     @classmethod
     async def get_all_with_pagination(cls, db: AsyncSession, page: int = 1, limit: int = 10, 
                                      status: Optional[str] = None, upload_type: Optional[str] = None):
@@ -99,13 +183,14 @@ class UploadRecord(Base):
         """Update upload record"""
         try:
             from sqlalchemy import select, update
-            result = await db.execute(
+            await db.execute(
                 update(cls)
                 .where(cls.id == upload_id)
                 .values(**kwargs, updated_at=datetime.utcnow())
-                .returning(cls)
             )
             await db.commit()
+            # MySQL has no UPDATE ... RETURNING, so re-read the row
+            result = await db.execute(select(cls).where(cls.id == upload_id))
             return result.scalar_one_or_none()
         except Exception as e:
             logger.error(f"Error updating upload record: {e}")
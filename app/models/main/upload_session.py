@@ -0,0 +1,155 @@
+"""
+Resumable upload session models for main database
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, UniqueConstraint
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import Base
+from datetime import datetime
+from typing import List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSession(Base):
+    """Resumable upload session model"""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String(36), primary_key=True)
+    filename = Column(String(255), nullable=False)
+    filepath = Column(String(500), nullable=False)
+    filetype = Column(String(10), nullable=False)
+    upload_type = Column(String(50), nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    status = Column(String(20), default="pending", nullable=False)
+    upload_record_id = Column(Integer, nullable=True)
+    created_by = Column(String(255), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def chunk_length(self, chunk_index: int) -> int:
+        """Expected byte length of a chunk; the last chunk may be short"""
+        if chunk_index == self.total_chunks - 1:
+            return self.total_size - chunk_index * self.chunk_size
+        return self.chunk_size
+
+    @classmethod
+    async def create(cls, db: AsyncSession, **kwargs):
+        """Create a new upload session"""
+        try:
+            upload_session = cls(**kwargs)
+            db.add(upload_session)
+            await db.commit()
+            await db.refresh(upload_session)
+            return upload_session
+        except Exception as e:
+            logger.error(f"Error creating upload session: {e}")
+            await db.rollback()
+            raise
+
+    @classmethod
+    async def get_by_id(cls, db: AsyncSession, session_id: str):
+        """Get upload session by ID"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(select(cls).where(cls.id == session_id))
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Error getting upload session by ID: {e}")
+            return None
+
+    @classmethod
+    async def update(cls, db: AsyncSession, session_id: str, **kwargs):
+        """Update upload session"""
+        try:
+            from sqlalchemy import update
+            await db.execute(
+                update(cls)
+                .where(cls.id == session_id)
+                .values(**kwargs, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error updating upload session: {e}")
+            await db.rollback()
+            raise
+
+
+class UploadSessionChunk(Base):
+    """Chunk received for a resumable upload session"""
+    __tablename__ = "upload_session_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String(36), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    checksum = Column(String(64), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('session_id', 'chunk_index', name='uq_upload_session_chunk'),
+    )
+
+    @classmethod
+    async def invalidate(cls, db: AsyncSession, session_id: str, chunk_index: int):
+        """Forget a chunk before its bytes are overwritten, so a failed resend leaves it missing"""
+        try:
+            from sqlalchemy import delete
+            await db.execute(
+                delete(cls)
+                .where(cls.session_id == session_id)
+                .where(cls.chunk_index == chunk_index)
+            )
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error invalidating upload chunk: {e}")
+            await db.rollback()
+            raise
+
+    @classmethod
+    async def mark_received(cls, db: AsyncSession, session_id: str, chunk_index: int,
+                            size: int, checksum: str):
+        """Record a verified chunk, replacing any earlier copy of the same index"""
+        try:
+            from sqlalchemy import delete
+            await db.execute(
+                delete(cls)
+                .where(cls.session_id == session_id)
+                .where(cls.chunk_index == chunk_index)
+            )
+            db.add(cls(session_id=session_id, chunk_index=chunk_index, size=size, checksum=checksum))
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error recording upload chunk: {e}")
+            await db.rollback()
+            raise
+
+    @classmethod
+    async def get_received_indexes(cls, db: AsyncSession, session_id: str) -> List[int]:
+        """Get the sorted chunk indexes received for a session"""
+        try:
+            from sqlalchemy import select
+            result = await db.execute(
+                select(cls.chunk_index)
+                .where(cls.session_id == session_id)
+                .order_by(cls.chunk_index)
+            )
+            return list(result.scalars().all())
+        except Exception as e:
+            logger.error(f"Error getting received upload chunks: {e}")
+            return []
+
+    @classmethod
+    async def delete_for_session(cls, db: AsyncSession, session_id: str):
+        """Delete all chunk records for a session"""
+        try:
+            from sqlalchemy import delete
+            await db.execute(delete(cls).where(cls.session_id == session_id))
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Error deleting upload chunks: {e}")
+            await db.rollback()
+            raise
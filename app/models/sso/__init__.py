@@ -18,8 +18,10 @@ from .sheet_data import (
     OrdersNotInPosData, OrdersNotIn3poData
 )
 from .reconciliation import (
-    ZomatoVsPosSummary, ThreepoDashboard, Store, Trm
+    ZomatoVsPosSummary, ThreepoDashboard, Store, Trm, ZomatoOrder, MprHdfc
 )
+from .zomato_rate_card import ZomatoRateCard
+from .reconciliation_reason_rules import ReconciliationReasonRules
 
 __all__ = [
     "UserDetails",
@@ -43,5 +45,9 @@ __all__ = [
     "ZomatoVsPosSummary",
     "ThreepoDashboard",
     "Store",
-    "Trm"
+    "Trm",
+    "ZomatoOrder",
+    "MprHdfc",
+    "ZomatoRateCard",
+    "ReconciliationReasonRules"
 ]
\ No newline at end of file
@@ -495,3 +495,98 @@ class Trm(Base):
         except Exception as e:
             logger.error(f"Error getting count: {e}")
             return 0
+
+
+class ZomatoOrder(Base):
+    """Zomato (3PO) settlement order model"""
+    __tablename__ = "zomato"
+    
+    id = Column(String(255), primary_key=True)
+    order_id = Column(String(255), nullable=True)
+    pos_order_id = Column(String(255), nullable=True)
+    store_code = Column(String(255), nullable=True)
+    order_date = Column(DateTime, nullable=True)
+    action = Column(String(50), nullable=True)
+    order_status = Column(String(255), nullable=True)
+    
+    # Settlement amounts
+    net_amount = Column(Numeric(15, 2), nullable=True)
+    tax_paid_by_customer = Column(Numeric(15, 2), nullable=True)
+    commission_value = Column(Numeric(15, 2), nullable=True)
+    pg_applied_on = Column(Numeric(15, 2), nullable=True)
+    pg_charge = Column(Numeric(15, 2), nullable=True)
+    taxes_zomato_fee = Column(Numeric(15, 2), nullable=True)
+    tds_amount = Column(Numeric(15, 2), nullable=True)
+    final_amount = Column(Numeric(15, 2), nullable=True)
+    
+    # Adjustments
+    credit_note_amount = Column(Numeric(15, 2), nullable=True)
+    pro_discount_passthrough = Column(Numeric(15, 2), nullable=True)
+    customer_discount = Column(Numeric(15, 2), nullable=True)
+    rejection_penalty_charge = Column(Numeric(15, 2), nullable=True)
+    user_credits_charge = Column(Numeric(15, 2), nullable=True)
+    promo_recovery_adj = Column(Numeric(15, 2), nullable=True)
+    icecream_handling = Column(Numeric(15, 2), nullable=True)
+    icecream_deductions = Column(Numeric(15, 2), nullable=True)
+    order_support_cost = Column(Numeric(15, 2), nullable=True)
+    merchant_delivery_charge = Column(Numeric(15, 2), nullable=True)
+    
+    created_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_zomato_order_id', 'order_id'),
+        Index('ix_zomato_pos_order_id', 'pos_order_id'),
+        Index('ix_zomato_store_date', 'store_code', 'order_date'),
+    )
+    
+    @classmethod
+    async def get_by_date_range(cls, db: AsyncSession, start_date: str, end_date: str, store_codes: list = None):
+        """Get Zomato orders by date range and store codes"""
+        try:
+            query = select(cls).where(cls.order_date >= start_date).where(cls.order_date <= end_date)
+            if store_codes:
+                query = query.where(cls.store_code.in_(store_codes))
+            result = await db.execute(query)
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting zomato orders by date range: {e}")
+            return []
+
+
+class MprHdfc(Base):
+    """HDFC merchant payment report (card and UPI) model"""
+    __tablename__ = "mpr_hdfc"
+    
+    uid = Column(String(255), primary_key=True)
+    channel = Column(String(20), nullable=False)
+    store_code = Column(String(255), nullable=True)
+    mid = Column(String(128), nullable=True)
+    tid = Column(String(128), nullable=True)
+    rrn = Column(String(128), nullable=True)
+    auth_code = Column(String(128), nullable=True)
+    card_number = Column(String(128), nullable=True)
+    payment_mode = Column(String(128), nullable=True)
+    transaction_date = Column(Date, nullable=True)
+    settlement_date = Column(Date, nullable=True)
+    gross_amount = Column(Numeric(15, 2), nullable=True)
+    commission = Column(Numeric(15, 2), nullable=True)
+    gst = Column(Numeric(15, 2), nullable=True)
+    net_amount = Column(Numeric(15, 2), nullable=True)
+    
+    __table_args__ = (
+        Index('ix_mpr_hdfc_transaction_date', 'transaction_date'),
+        Index('ix_mpr_hdfc_tid', 'tid'),
+    )
+    
+    @classmethod
+    async def get_by_date_range(cls, db: AsyncSession, start_date: str, end_date: str, channel: str = None):
+        """Get MPR records by transaction date range"""
+        try:
+            query = select(cls).where(cls.transaction_date >= start_date).where(cls.transaction_date <= end_date)
+            if channel:
+                query = query.where(cls.channel == channel)
+            result = await db.execute(query)
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting MPR records by date range: {e}")
+            return []
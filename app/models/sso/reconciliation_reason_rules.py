@@ -0,0 +1,66 @@
+"""
+Reconciliation Reason Rules model for SSO database
+"""
+
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import Base
+from datetime import datetime
+from typing import Dict, List
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationReasonRules(Base):
+    """An organization's ordered reason rules, by sheet kind (see app.workers.reasons)"""
+    __tablename__ = "reconciliation_reason_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(BigInteger, nullable=False, unique=True)
+    rules = Column(Text, nullable=False)
+    updated_by = Column(String(255), nullable=True)
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_rules(self) -> Dict[str, List[dict]]:
+        return json.loads(self.rules)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "organization_id": self.organization_id,
+            "rules": self.get_rules(),
+            "updated_by": self.updated_by,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    @classmethod
+    async def get_by_organization(cls, db: AsyncSession, organization_id: int):
+        """Rules of an organization, None if it uses the defaults"""
+        try:
+            result = await db.execute(select(cls).where(cls.organization_id == organization_id))
+            return result.scalar_one_or_none()
+        except Exception as e:
+            logger.error(f"Error getting reconciliation reason rules: {e}")
+            raise
+
+    @classmethod
+    async def save(cls, db: AsyncSession, organization_id: int, rules: Dict[str, List[dict]],
+                   updated_by: str = None):
+        """Replace an organization's rules"""
+        try:
+            record = await cls.get_by_organization(db, organization_id)
+            if record is None:
+                record = cls(organization_id=organization_id)
+                db.add(record)
+            record.rules = json.dumps(rules)
+            record.updated_by = updated_by
+            record.updated_at = datetime.utcnow()
+            await db.commit()
+            await db.refresh(record)
+            return record
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error saving reconciliation reason rules: {e}")
+            raise
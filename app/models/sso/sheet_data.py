@@ -69,6 +69,7 @@ class ZomatoPosVs3poData(Base):
     reconciled_amount = Column(Numeric(15, 2), nullable=True)
     unreconciled_amount = Column(Numeric(15, 2), nullable=True)
     pos_vs_zomato_reason = Column(String(255), nullable=True)
+    match_confidence = Column(Numeric(5, 4), nullable=True)  # 1 for order ID matches
     order_status_pos = Column(String(255), nullable=True)
     
     # Timestamps
@@ -243,6 +244,7 @@ class Zomato3poVsPosData(Base):
     reconciled_amount = Column(Numeric(15, 2), nullable=True)
     unreconciled_amount = Column(Numeric(15, 2), nullable=True)
     zomato_vs_pos_reason = Column(String(255), nullable=True)
+    match_confidence = Column(Numeric(5, 4), nullable=True)  # 1 for order ID matches
     order_status_zomato = Column(String(255), nullable=True)
     
     # Timestamps
@@ -2,7 +2,7 @@
 Upload model
 """
 
-from sqlalchemy import Column, Integer, String, Text, BigInteger, DateTime, Index
+from sqlalchemy import Column, Integer, String, Text, BigInteger, DateTime, Index, UniqueConstraint
 from sqlalchemy.dialects.mysql import ENUM
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -28,6 +28,11 @@ class Upload(Base):
     message = Column(Text, nullable=True)
     processed_data = Column(Text, nullable=True, comment="Stores processed data and summary information")
     error_details = Column(Text, nullable=True, comment="Detailed error information if processing failed")
+    sha256 = Column(String(64), nullable=True, comment="SHA-256 of the file contents, used to detect duplicate uploads")
+    cache_path = Column(String(500), nullable=True, comment="Parquet cache of the parsed rows")
+    cache_version = Column(Integer, nullable=True, comment="Parser version that wrote the cache")
+    storage_key = Column(String(255), nullable=True, comment="Key of the compressed, content-addressed copy in upload storage")
+    purged_at = Column(DateTime, nullable=True, comment="When retention housekeeping removed the upload's files")
     created_at = Column(DateTime, nullable=True, default=datetime.utcnow)
     updated_at = Column(DateTime, nullable=True, default=datetime.utcnow)
     
@@ -35,6 +40,8 @@ class Upload(Base):
         Index('status', 'status'),
         Index('upload_type', 'upload_type'),
         Index('created_at', 'created_at'),
+        Index('ix_upload_logs_storage_key', 'storage_key'),
+        UniqueConstraint('upload_type', 'sha256', name='uq_upload_logs_type_sha256'),
     )
     
     @classmethod
@@ -0,0 +1,63 @@
+"""
+Zomato Rate Card model for SSO database
+"""
+
+from sqlalchemy import Column, BigInteger, Integer, String, Date, DateTime, Numeric, Index, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import Base
+from datetime import datetime
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ZomatoRateCard(Base):
+    """Commission, PG, GST-on-fee and TDS rates an organization pays Zomato from a date onwards
+
+    A card without a store applies to every store of the organization; a
+    store's own card takes precedence over it.
+    """
+    __tablename__ = "zomato_rate_cards"
+
+    id = Column(Integer, primary_key=True, index=True)
+    organization_id = Column(BigInteger, nullable=False)
+    store_code = Column(String(255), nullable=True)
+    effective_from = Column(Date, nullable=False)
+    commission_rate = Column(Numeric(7, 5), nullable=False)
+    pg_rate = Column(Numeric(7, 5), nullable=False)
+    fee_gst_rate = Column(Numeric(7, 5), nullable=False)
+    tds_rate = Column(Numeric(7, 5), nullable=False)
+    created_by = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ix_zomato_rate_cards_org_date', 'organization_id', 'effective_from'),
+    )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "organization_id": self.organization_id,
+            "store_code": self.store_code,
+            "effective_from": self.effective_from.isoformat() if self.effective_from else None,
+            "commission_rate": float(self.commission_rate),
+            "pg_rate": float(self.pg_rate),
+            "fee_gst_rate": float(self.fee_gst_rate),
+            "tds_rate": float(self.tds_rate),
+            "created_by": self.created_by,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    @classmethod
+    async def get_by_organization(cls, db: AsyncSession, organization_id: int, store_code: Optional[str] = None):
+        """Cards of an organization, oldest first; with store_code, only that store's and the default ones"""
+        try:
+            query = select(cls).where(cls.organization_id == organization_id)
+            if store_code:
+                query = query.where((cls.store_code == store_code) | cls.store_code.is_(None))
+            result = await db.execute(query.order_by(cls.effective_from, cls.id))
+            return result.scalars().all()
+        except Exception as e:
+            logger.error(f"Error getting Zomato rate cards: {e}")
+            raise
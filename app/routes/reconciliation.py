@@ -5,8 +5,11 @@ Reconciliation routes
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import get_sso_db
+from app.config.settings import settings
 from app.middleware.auth import get_current_user
 from app.models.sso.user_details import UserDetails
+from app.utils.excel import write_excel_report
+from app.workers.process_pool import process_pool
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
@@ -49,6 +52,29 @@ class StoresRequest(BaseModel):
     city_ids: List[int]
 
 
+class StoreDailyTotalsRequest(BaseModel):
+    source: str
+    start_date: str
+    end_date: str
+    store_codes: Optional[List[str]] = None
+    by_day: bool = False
+
+
+class ZomatoRateCardRequest(BaseModel):
+    effective_from: str
+    commission_rate: float
+    pg_rate: float
+    fee_gst_rate: float
+    tds_rate: float
+    store_code: Optional[str] = None  # omit for a card that applies to every store
+    organization_id: Optional[int] = None
+
+
+class ReasonRulesRequest(BaseModel):
+    rules: Dict[str, List[Dict[str, Any]]]  # sheet kind -> ordered rules; kinds left out keep the defaults
+    organization_id: Optional[int] = None
+
+
 @router.get("/populate-threepo-dashboard")
 async def check_reconciliation_status(
     db: AsyncSession = Depends(get_sso_db),
@@ -100,7 +126,6 @@ async def generate_reconciliation_excel(
     try:
         # Implement Excel generation logic
         from app.models.sso import ZomatoVsPosSummary, ThreepoDashboard
-        import pandas as pd
         import os
         
         # Generate job ID
@@ -111,21 +136,16 @@ async def generate_reconciliation_excel(
         dashboard_data = await ThreepoDashboard.get_all(db, limit=1000)
         
         # Create Excel file
-        reports_dir = "reports"
+        reports_dir = settings.reports_dir
         os.makedirs(reports_dir, exist_ok=True)
         filename = f"reconciliation_{job_id}.xlsx"
         filepath = os.path.join(reports_dir, filename)
         
-        with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-            # Write summary data
-            if summary_data:
-                summary_df = pd.DataFrame([record.to_dict() for record in summary_data])
-                summary_df.to_excel(writer, sheet_name='Summary', index=False)
-            
-            # Write dashboard data
-            if dashboard_data:
-                dashboard_df = pd.DataFrame([record.to_dict() for record in dashboard_data])
-                dashboard_df.to_excel(writer, sheet_name='Dashboard', index=False)
+        # Write the workbook in the process pool so the event loop stays responsive
+        await process_pool.run(write_excel_report, filepath, {
+            "Summary": [record.to_dict() for record in summary_data],
+            "Dashboard": [record.to_dict() for record in dashboard_data],
+        })
         
         # Store job info (in a real implementation, this would be stored in a jobs table)
         job_info = {
@@ -164,7 +184,6 @@ async def generate_receivable_receipt_excel(
     try:
         # Implement receivable receipt Excel generation
         from app.models.sso import ZomatoVsPosSummary
-        import pandas as pd
         import os
         
         job_id = f"receivable_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
@@ -173,14 +192,14 @@ async def generate_receivable_receipt_excel(
         receivable_data = await ZomatoVsPosSummary.get_receivable_data(db, limit=1000)
         
         # Create Excel file
-        reports_dir = "reports"
+        reports_dir = settings.reports_dir
         os.makedirs(reports_dir, exist_ok=True)
         filename = f"receivable_{job_id}.xlsx"
         filepath = os.path.join(reports_dir, filename)
         
-        if receivable_data:
-            df = pd.DataFrame([record.to_dict() for record in receivable_data])
-            df.to_excel(filepath, index=False)
+        await process_pool.run(write_excel_report, filepath, {
+            "Sheet1": [record.to_dict() for record in receivable_data],
+        })
         
         job_info = {
             "job_id": job_id,
@@ -341,6 +360,205 @@ async def get_instore_dashboard_data(
         )
 
 
+@router.post("/store-daily-totals")
+async def get_store_daily_totals(
+    request_data: StoreDailyTotalsRequest,
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Pre-summed per-store totals of an ingested source, read from the daily rollup"""
+    try:
+        from app.models.main.store_daily_rollup import StoreDailyRollup
+        from app.workers.ingestion import db_session_for
+        from app.workers.parsers import PARSERS
+
+        # The rollup lives in the database its source's parser loads into
+        parser = next(
+            (p for p in PARSERS.values() if p.rollup and p.rollup["source"] == request_data.source),
+            None
+        )
+        if parser is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown rollup source '{request_data.source}'"
+            )
+
+        try:
+            start_date = datetime.strptime(request_data.start_date, "%Y-%m-%d").date()
+            end_date = datetime.strptime(request_data.end_date, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Dates must be in YYYY-MM-DD format"
+            )
+
+        async with db_session_for(parser.database) as db:
+            if request_data.by_day:
+                rows = await StoreDailyRollup.get_daily_totals(
+                    db, request_data.source, start_date, end_date, request_data.store_codes
+                )
+                data = [row.to_dict() for row in rows]
+            else:
+                data = await StoreDailyRollup.get_totals_by_store(
+                    db, request_data.source, start_date, end_date, request_data.store_codes
+                )
+
+        return {
+            "success": True,
+            "data": data
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get store daily totals error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching store daily totals"
+        )
+
+
+@router.get("/zomato-rate-cards")
+async def get_zomato_rate_cards(
+    organization_id: Optional[int] = None,
+    store_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Zomato rate cards of an organization, oldest first"""
+    try:
+        from app.models.sso.zomato_rate_card import ZomatoRateCard
+
+        cards = await ZomatoRateCard.get_by_organization(
+            db, organization_id or settings.organization_id, store_code
+        )
+        return {
+            "success": True,
+            "data": [card.to_dict() for card in cards]
+        }
+
+    except Exception as e:
+        logger.error(f"Get Zomato rate cards error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching Zomato rate cards"
+        )
+
+
+@router.post("/zomato-rate-cards")
+async def create_zomato_rate_card(
+    request_data: ZomatoRateCardRequest,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Add a Zomato rate card; the store-days it affects are recomputed by the next incremental generation"""
+    try:
+        from app.workers.rates import RATE_FIELDS, save_rate_card
+
+        try:
+            effective_from = datetime.strptime(request_data.effective_from, "%Y-%m-%d").date()
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="effective_from must be in YYYY-MM-DD format"
+            )
+
+        rates = {name: getattr(request_data, name) for name in RATE_FIELDS}
+        invalid = [name for name, value in rates.items() if not 0 <= value < 1]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Rates must be fractions between 0 and 1: {', '.join(invalid)}"
+            )
+
+        card, dirty_store_days = await save_rate_card(
+            db, request_data.organization_id or settings.organization_id, effective_from, rates,
+            store_code=request_data.store_code or None, created_by=current_user.username
+        )
+        return {
+            "success": True,
+            "message": "Rate card saved",
+            "data": {**card.to_dict(), "dirty_store_days": dirty_store_days}
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Create Zomato rate card error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error saving Zomato rate card"
+        )
+
+
+@router.get("/reason-rules")
+async def get_reason_rules(
+    organization_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Reason rules in force for an organization, by sheet kind"""
+    try:
+        from app.models.sso.reconciliation_reason_rules import ReconciliationReasonRules
+        from app.workers.reasons import rules_with_defaults
+
+        record = await ReconciliationReasonRules.get_by_organization(
+            db, organization_id or settings.organization_id
+        )
+        return {
+            "success": True,
+            "data": {
+                "rules": rules_with_defaults(record.get_rules() if record else None),
+                "customized": sorted(record.get_rules()) if record else [],
+            }
+        }
+
+    except Exception as e:
+        logger.error(f"Get reason rules error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error fetching reason rules"
+        )
+
+
+@router.put("/reason-rules")
+async def save_reason_rules(
+    request_data: ReasonRulesRequest,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Replace an organization's reason rules; sheets generated afterwards use them"""
+    try:
+        from app.models.sso.reconciliation_reason_rules import ReconciliationReasonRules
+        from app.workers.reasons import rules_with_defaults, validate_rules
+
+        try:
+            rules = validate_rules(request_data.rules)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        record = await ReconciliationReasonRules.save(
+            db, request_data.organization_id or settings.organization_id, rules,
+            updated_by=current_user.username
+        )
+        return {
+            "success": True,
+            "message": "Reason rules saved",
+            "data": {**record.to_dict(), "rules": rules_with_defaults(rules)}
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Save reason rules error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error saving reason rules"
+        )
+
+
 @router.post("/generate-common-trm")
 async def generate_common_trm(
     request_data: GenerateCommonTrmRequest,
@@ -351,7 +569,6 @@ async def generate_common_trm(
     try:
         # Implement TRM generation logic
         from app.models.sso import Trm
-        import pandas as pd
         import os
         
         # Generate job ID
@@ -361,14 +578,14 @@ async def generate_common_trm(
         trm_data = await Trm.get_all(db, limit=1000)
         
         # Create Excel file
-        reports_dir = "reports"
+        reports_dir = settings.reports_dir
         os.makedirs(reports_dir, exist_ok=True)
         filename = f"trm_{job_id}.xlsx"
         filepath = os.path.join(reports_dir, filename)
         
-        if trm_data:
-            df = pd.DataFrame([record.to_dict() for record in trm_data])
-            df.to_excel(filepath, index=False)
+        await process_pool.run(write_excel_report, filepath, {
+            "Sheet1": [record.to_dict() for record in trm_data],
+        })
         
         job_info = {
             "job_id": job_id,
@@ -407,7 +624,7 @@ async def download_file(
         import os
         from fastapi.responses import FileResponse
         
-        file_path = f"reports/{filename}"
+        file_path = os.path.join(settings.reports_dir, filename)
         
         if not os.path.exists(file_path):
             raise HTTPException(
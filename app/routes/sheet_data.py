@@ -5,6 +5,7 @@ Sheet Data routes
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.config.database import get_sso_db
+from app.config.settings import settings
 from app.middleware.auth import get_current_user
 from app.models.sso.user_details import UserDetails
 from pydantic import BaseModel
@@ -21,6 +22,9 @@ class GenerateSheetDataRequest(BaseModel):
     start_date: str
     end_date: str
     store_codes: List[str]
+    mode: Optional[str] = None  # full (default) or incremental; defaults to SHEET_GENERATION_MODE
+    engine: Optional[str] = None  # python (default), or opt in to sql or auto; defaults to RECONCILIATION_ENGINE
+    organization_id: Optional[int] = None  # whose Zomato rate cards apply; defaults to ORGANIZATION_ID
 
 
 class SheetDataRequest(BaseModel):
@@ -43,23 +47,39 @@ async def generate_sheet_data(
             ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
             OrdersNotInPosData, OrdersNotIn3poData
         )
+        from app.workers.reconciliation import GENERATION_MODES, RECONCILIATION_ENGINES
         
-        # Truncate existing sheet data tables
-        await ZomatoPosVs3poData.truncate_table(db)
-        await Zomato3poVsPosData.truncate_table(db)
-        await Zomato3poVsPosRefundData.truncate_table(db)
-        await OrdersNotInPosData.truncate_table(db)
-        await OrdersNotIn3poData.truncate_table(db)
+        mode = request_data.mode or settings.sheet_generation_mode
+        if mode not in GENERATION_MODES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid mode '{mode}'. Must be one of: {', '.join(GENERATION_MODES)}"
+            )
+        request_data.mode = mode
+        
+        engine = request_data.engine or settings.reconciliation_engine
+        if engine not in RECONCILIATION_ENGINES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid engine '{engine}'. Must be one of: {', '.join(RECONCILIATION_ENGINES)}"
+            )
+        request_data.engine = engine
+        
+        if mode == "full":
+            # Truncate existing sheet data tables
+            await ZomatoPosVs3poData.truncate_table(db)
+            await Zomato3poVsPosData.truncate_table(db)
+            await Zomato3poVsPosRefundData.truncate_table(db)
+            await OrdersNotInPosData.truncate_table(db)
+            await OrdersNotIn3poData.truncate_table(db)
         
-        # Start background processing
-        import asyncio
-        from app.workers.tasks import process_sheet_data_generation
+        # Queue background processing on a worker
+        from app.workers.jobs import enqueue_sheet_data_generation
         
         # Generate job ID
         job_id = str(uuid.uuid4())
         
-        # Start background task
-        asyncio.create_task(process_sheet_data_generation(job_id, request_data))
+        await enqueue_sheet_data_generation(job_id, request_data.dict())
         
         return {
             "success": True,
@@ -67,6 +87,8 @@ async def generate_sheet_data(
             "data": {
                 "job_id": job_id,
                 "status": "processing",
+                "mode": mode,
+                "engine": engine,
                 "estimated_completion": "10-15 minutes",
                 "start_date": request_data.start_date,
                 "end_date": request_data.end_date,
@@ -74,6 +96,8 @@ async def generate_sheet_data(
             }
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Generate sheet data error: {e}")
         raise HTTPException(
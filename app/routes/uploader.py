@@ -2,14 +2,26 @@
 File uploader routes
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Header
+from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from app.config.database import get_sso_db
+from app.config.settings import settings
 from app.middleware.auth import get_current_user
 from app.models.main.upload_record import UploadRecord
+from app.models.main.upload_session import UploadSession, UploadSessionChunk
 from app.models.sso.user_details import UserDetails
+from app.utils.file_upload import (
+    save_upload_file, preallocate_file, write_stream_at_offset, file_sha256,
+    FileTooLargeError, ChunkLengthError
+)
+from app.utils.storage import get_blob_store
+from app.workers.validation import error_path_for
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import asyncio
+import math
 import os
 import uuid
 import logging
@@ -35,6 +47,10 @@ ALLOWED_EXTENSIONS = [".xlsx", ".xls", ".csv", ".tsv"]
 # Maximum file size (400MB)
 MAX_FILE_SIZE = 400 * 1024 * 1024
 
+# Chunk size bounds for resumable upload sessions
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
 
 class UploadResponse(BaseModel):
     id: int
@@ -43,6 +59,13 @@ class UploadResponse(BaseModel):
     message: str
 
 
+class CreateUploadSessionRequest(BaseModel):
+    type: str
+    filename: str
+    filesize: int
+    chunk_size: Optional[int] = None
+
+
 class UploadStatusResponse(BaseModel):
     id: int
     filename: str
@@ -56,14 +79,113 @@ class UploadStatusResponse(BaseModel):
     processed_data: Optional[str] = None
 
 
+async def register_upload(db: AsyncSession, filename: str, file_path: str, file_size: int,
+                          file_ext: str, upload_type: str, sha256: str,
+                          force: bool = False) -> Tuple[UploadRecord, str]:
+    """Create the upload record for a file saved to disk and queue processing
+
+    The file is moved into upload storage, compressed and stored once per
+    distinct content; the record's filepath is where workers unpack it for
+    processing. Returns the record and an outcome: "uploaded" for a new
+    file, "duplicate" when identical contents were already uploaded for this
+    type (the new copy is discarded), or "reprocessing" when force is set on
+    a duplicate and the existing record is queued again.
+    
+    Forcing a record that is still processing raises a 409 and leaves the
+    file where it is: a second job would share the first one's staging
+    table.
+    """
+    from app.workers.jobs import enqueue_upload_processing
+    
+    existing = await UploadRecord.get_by_hash(db, upload_type, sha256)
+    if existing is not None and not force:
+        await asyncio.to_thread(_remove_file, file_path)
+        return existing, "duplicate"
+    if existing is not None and existing.status == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Identical file {existing.filename} is still being processed, try again once it finishes"
+        )
+    
+    try:
+        storage_key = await asyncio.to_thread(get_blob_store().put, file_path, sha256)
+    finally:
+        await asyncio.to_thread(_remove_file, file_path)
+    
+    if existing is None:
+        try:
+            upload_record = await UploadRecord.create(db,
+                filename=filename,
+                filepath=file_path,
+                filesize=file_size,
+                filetype=file_ext,
+                upload_type=upload_type,
+                sha256=sha256,
+                storage_key=storage_key,
+                status="uploaded",
+                message="File uploaded successfully, processing in background"
+            )
+        except IntegrityError:
+            # The same file was registered concurrently; fall through to the duplicate path
+            existing = await UploadRecord.get_by_hash(db, upload_type, sha256)
+            if existing is None:
+                raise
+            if not force:
+                return existing, "duplicate"
+        else:
+            # Queue processing on a worker so it survives API restarts
+            await enqueue_upload_processing(upload_record.id, file_path, upload_type)
+            return upload_record, "uploaded"
+    
+    upload_record = await UploadRecord.update(db, existing.id,
+        storage_key=storage_key,
+        status="uploaded",
+        message="Reprocessing requested, processing in background",
+        processed_data=None
+    )
+    await enqueue_upload_processing(upload_record.id, upload_record.filepath, upload_type)
+    return upload_record, "reprocessing"
+
+
+def _remove_file(file_path: str):
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+
+
+def upload_result(upload_record: UploadRecord, filename: str, outcome: str) -> dict:
+    """Per-file response entry for a registered upload"""
+    if outcome == "duplicate":
+        return {
+            "id": upload_record.id,
+            "filename": filename,
+            "status": "duplicate",
+            "message": f"Identical file already uploaded as {upload_record.filename}",
+            "uploadStatus": upload_record.status,
+            "processed_data": upload_record.processed_data
+        }
+    return {
+        "id": upload_record.id,
+        "filename": filename,
+        "status": "uploaded",
+        "message": upload_record.message
+    }
+
+
 @router.post("/upload")
 async def upload_files(
     type: str = Form(...),
     files: List[UploadFile] = File(...),
+    force: bool = Form(False),
     db: AsyncSession = Depends(get_sso_db),
     current_user: UserDetails = Depends(get_current_user)
 ):
-    """Upload multiple files"""
+    """Upload multiple files
+
+    Files whose contents were already uploaded for the same type are not
+    processed again unless force is set.
+    """
     try:
         if not type:
             raise HTTPException(
@@ -88,7 +210,7 @@ async def upload_files(
         processing_jobs = []
         
         # Create uploads directory if it doesn't exist
-        upload_dir = "uploads"
+        upload_dir = settings.upload_dir
         os.makedirs(upload_dir, exist_ok=True)
         
         # Process each uploaded file
@@ -108,50 +230,38 @@ async def upload_files(
                     })
                     continue
                 
-                # Check file size
-                file_content = await file.read()
-                if len(file_content) > MAX_FILE_SIZE:
+                # Generate unique filename
+                unique_filename = f"{uuid.uuid4()}_{file.filename}"
+                file_path = os.path.join(upload_dir, unique_filename)
+                
+                # Stream file to disk, enforcing the size limit while copying
+                try:
+                    file_size, sha256 = await save_upload_file(file, file_path, MAX_FILE_SIZE)
+                except FileTooLargeError as size_error:
                     uploaded_files.append({
                         "filename": file.filename,
                         "status": "error",
-                        "message": f"File too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+                        "message": str(size_error)
                     })
                     continue
                 
-                # Generate unique filename
-                unique_filename = f"{uuid.uuid4()}_{file.filename}"
-                file_path = os.path.join(upload_dir, unique_filename)
-                
-                # Save file
-                with open(file_path, "wb") as f:
-                    f.write(file_content)
-                
-                # Create upload record in database
-                upload_record = await UploadRecord.create(db,
-                    filename=file.filename,
-                    filepath=file_path,
-                    filesize=len(file_content),
-                    filetype=file_ext,
-                    upload_type=type,
-                    status="uploaded",
-                    message="File uploaded successfully, processing in background"
-                )
-                
-                uploaded_files.append({
-                    "id": upload_record.id,
-                    "filename": file.filename,
-                    "status": "uploaded",
-                    "message": "File uploaded successfully, processing in background"
-                })
-                
-                processing_jobs.append(upload_record.id)
+                try:
+                    upload_record, outcome = await register_upload(
+                        db, file.filename, file_path, file_size, file_ext, type, sha256, force
+                    )
+                except HTTPException as conflict:
+                    await asyncio.to_thread(_remove_file, file_path)
+                    uploaded_files.append({
+                        "filename": file.filename,
+                        "status": "error",
+                        "message": conflict.detail
+                    })
+                    continue
                 
-                # Start background processing
-                import asyncio
-                from app.workers.tasks import process_upload_file
+                uploaded_files.append(upload_result(upload_record, file.filename, outcome))
                 
-                # Start background task
-                asyncio.create_task(process_upload_file(upload_record.id, file_path, type))
+                if outcome != "duplicate":
+                    processing_jobs.append(upload_record.id)
                 
             except Exception as file_error:
                 logger.error(f"Error processing file {file.filename}: {file_error}")
@@ -181,6 +291,268 @@ async def upload_files(
         )
 
 
+@router.post("/sessions")
+async def create_upload_session(
+    request_data: CreateUploadSessionRequest,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Start a resumable chunked upload"""
+    try:
+        if request_data.type not in VALID_TYPES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid type. Must be one of: {', '.join(VALID_TYPES)}"
+            )
+        
+        file_ext = os.path.splitext(request_data.filename)[1].lower()
+        if file_ext not in ALLOWED_EXTENSIONS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+            )
+        
+        if request_data.filesize <= 0 or request_data.filesize > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid file size. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
+            )
+        
+        chunk_size = request_data.chunk_size or settings.upload_session_chunk_size
+        if chunk_size < MIN_CHUNK_SIZE or chunk_size > MAX_CHUNK_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes"
+            )
+        
+        # Preallocate the target file so chunks can land at their offsets in any order
+        session_id = str(uuid.uuid4())
+        session_dir = os.path.join(settings.upload_dir, "sessions")
+        os.makedirs(session_dir, exist_ok=True)
+        file_path = os.path.join(session_dir, f"{session_id}.part")
+        await asyncio.to_thread(preallocate_file, file_path, request_data.filesize)
+        
+        total_chunks = math.ceil(request_data.filesize / chunk_size)
+        upload_session = await UploadSession.create(db,
+            id=session_id,
+            filename=request_data.filename,
+            filepath=file_path,
+            filetype=file_ext,
+            upload_type=request_data.type,
+            total_size=request_data.filesize,
+            chunk_size=chunk_size,
+            total_chunks=total_chunks,
+            status="pending",
+            created_by=current_user.username
+        )
+        
+        return {
+            "success": True,
+            "message": "Upload session created",
+            "data": {
+                "session_id": upload_session.id,
+                "chunk_size": upload_session.chunk_size,
+                "total_chunks": upload_session.total_chunks
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Create upload session error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+async def get_owned_session(db: AsyncSession, session_id: str, current_user: UserDetails) -> UploadSession:
+    """Upload session created by the current user; other users' sessions are reported as not found"""
+    upload_session = await UploadSession.get_by_id(db, session_id)
+    if not upload_session or upload_session.created_by != current_user.username:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload session not found"
+        )
+    return upload_session
+
+
+@router.put("/sessions/{session_id}/chunks/{chunk_index}")
+async def upload_session_chunk(
+    session_id: str,
+    chunk_index: int,
+    request: Request,
+    x_chunk_checksum: str = Header(..., description="SHA-256 hex digest of the chunk body"),
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Upload one numbered chunk of a resumable upload"""
+    try:
+        upload_session = await get_owned_session(db, session_id, current_user)
+        
+        if upload_session.status != "pending":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload session is {upload_session.status}"
+            )
+        
+        if chunk_index < 0 or chunk_index >= upload_session.total_chunks:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Chunk index must be between 0 and {upload_session.total_chunks - 1}"
+            )
+        
+        # The bytes at this offset are about to change, so the chunk is missing until verified
+        await UploadSessionChunk.invalidate(db, session_id, chunk_index)
+        
+        # Stream the body straight to the chunk's offset in the preallocated file
+        try:
+            checksum = await write_stream_at_offset(
+                request.stream(),
+                upload_session.filepath,
+                chunk_index * upload_session.chunk_size,
+                upload_session.chunk_length(chunk_index)
+            )
+        except ChunkLengthError as length_error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(length_error)
+            )
+        
+        if checksum != x_chunk_checksum.strip().lower():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Chunk checksum mismatch, please resend the chunk"
+            )
+        
+        await UploadSessionChunk.mark_received(
+            db, session_id, chunk_index, upload_session.chunk_length(chunk_index), checksum
+        )
+        
+        return {
+            "success": True,
+            "message": "Chunk received",
+            "data": {
+                "session_id": session_id,
+                "chunk_index": chunk_index,
+                "checksum": checksum
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Upload chunk error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+@router.get("/sessions/{session_id}")
+async def get_upload_session(
+    session_id: str,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Get resumable upload progress and the chunks still missing"""
+    try:
+        upload_session = await get_owned_session(db, session_id, current_user)
+        
+        received = await UploadSessionChunk.get_received_indexes(db, session_id)
+        received_set = set(received)
+        missing = [i for i in range(upload_session.total_chunks) if i not in received_set]
+        
+        return {
+            "success": True,
+            "data": {
+                "session_id": upload_session.id,
+                "filename": upload_session.filename,
+                "status": upload_session.status,
+                "chunk_size": upload_session.chunk_size,
+                "total_chunks": upload_session.total_chunks,
+                "received_chunks": received,
+                "missing_chunks": missing,
+                "upload_id": upload_session.upload_record_id
+            }
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Get upload session error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+@router.post("/sessions/{session_id}/complete")
+async def complete_upload_session(
+    session_id: str,
+    force: bool = Query(False),
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Finalize a resumable upload once every chunk has been received"""
+    try:
+        upload_session = await get_owned_session(db, session_id, current_user)
+        
+        if upload_session.status == "completed":
+            return {
+                "success": True,
+                "message": "Upload session already completed",
+                "data": {"id": upload_session.upload_record_id, "filename": upload_session.filename}
+            }
+        
+        received = set(await UploadSessionChunk.get_received_indexes(db, session_id))
+        missing = [i for i in range(upload_session.total_chunks) if i not in received]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload incomplete, {len(missing)} chunk(s) missing"
+            )
+        
+        # Move the assembled file next to regular uploads
+        unique_filename = f"{uuid.uuid4()}_{upload_session.filename}"
+        file_path = os.path.join(settings.upload_dir, unique_filename)
+        await asyncio.to_thread(os.replace, upload_session.filepath, file_path)
+        sha256 = await asyncio.to_thread(file_sha256, file_path)
+        
+        try:
+            upload_record, outcome = await register_upload(
+                db, upload_session.filename, file_path, upload_session.total_size,
+                upload_session.filetype, upload_session.upload_type, sha256, force
+            )
+        except HTTPException:
+            # Keep the assembled file with the session so completing it can be retried
+            await asyncio.to_thread(os.replace, file_path, upload_session.filepath)
+            raise
+        
+        await UploadSession.update(db, session_id,
+            status="completed",
+            filepath=upload_record.filepath,
+            upload_record_id=upload_record.id
+        )
+        await UploadSessionChunk.delete_for_session(db, session_id)
+        
+        result = upload_result(upload_record, upload_session.filename, outcome)
+        return {
+            "success": True,
+            "message": result["message"],
+            "data": result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Complete upload session error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
 @router.get("/status/{upload_id}")
 async def get_upload_status(
     upload_id: int,
@@ -223,6 +595,45 @@ async def get_upload_status(
         )
 
 
+@router.get("/errors/{upload_id}")
+async def download_upload_errors(
+    upload_id: int,
+    db: AsyncSession = Depends(get_sso_db),
+    current_user: UserDetails = Depends(get_current_user)
+):
+    """Download the rows of an upload that failed validation, as a gzip CSV"""
+    try:
+        upload_record = await UploadRecord.get_by_id(db, upload_id)
+
+        if not upload_record:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Upload record not found"
+            )
+
+        error_file = error_path_for(upload_record.filepath)
+        if not os.path.exists(error_file):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No invalid rows recorded for this upload"
+            )
+
+        return FileResponse(
+            error_file,
+            media_type="application/gzip",
+            filename=f"{upload_record.filename}.errors.csv.gz"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Download upload errors error: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
 @router.get("/uploads")
 async def get_all_uploads(
     page: int = Query(1, ge=1),
@@ -283,6 +694,8 @@ async def delete_upload(
     current_user: UserDetails = Depends(get_current_user)
 ):
     """Delete upload"""
+    from app.workers.jobs import enqueue_upload_cleanup
+    
     try:
         upload_record = await UploadRecord.get_by_id(db, upload_id)
         
@@ -292,16 +705,14 @@ async def delete_upload(
                 detail="Upload record not found"
             )
         
-        # Delete the physical file
-        if os.path.exists(upload_record.filepath):
-            try:
-                os.unlink(upload_record.filepath)
-            except OSError as e:
-                logger.warning(f"Could not delete file {upload_record.filepath}: {e}")
-        
         # Delete from database
         await UploadRecord.delete(db, upload_id)
         
+        # Stored files may be shared with other uploads; a worker removes them if not
+        await enqueue_upload_cleanup(
+            upload_record.storage_key, upload_record.filepath, upload_record.cache_path
+        )
+        
         return {
             "success": True,
             "message": "Upload deleted successfully"
@@ -0,0 +1,21 @@
+"""
+Excel report utilities
+"""
+
+from typing import Dict, List
+import pandas as pd
+
+
+def write_excel_report(filepath: str, sheets: Dict[str, List[dict]]) -> str:
+    """Write one sheet per non-empty list of rows; runs in the process pool
+
+    Returns the file path. If every sheet is empty, no file is written.
+    """
+    sheets = {name: rows for name, rows in sheets.items() if rows}
+    if not sheets:
+        return filepath
+
+    with pd.ExcelWriter(filepath, engine="openpyxl") as writer:
+        for name, rows in sheets.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=name, index=False)
+    return filepath
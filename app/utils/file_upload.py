@@ -0,0 +1,138 @@
+"""
+File upload utilities
+"""
+
+from fastapi import UploadFile
+from app.config.settings import settings
+from typing import AsyncIterator, BinaryIO, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload exceeds the maximum allowed size"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        super().__init__(f"File too large. Maximum size: {max_size // (1024*1024)}MB")
+
+
+class ChunkLengthError(Exception):
+    """Raised when an uploaded chunk does not match its expected length"""
+
+    def __init__(self, expected: int, received: int):
+        self.expected = expected
+        self.received = received
+        super().__init__(f"Chunk length mismatch: expected {expected} bytes, received {received}")
+
+
+def _remove_partial_file(file_path: str):
+    """Remove a partially written file, ignoring missing files"""
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not delete partial file {file_path}: {e}")
+
+
+def copy_stream_to_file(source: BinaryIO, file_path: str, max_size: int,
+                        chunk_size: Optional[int] = None, hasher=None) -> int:
+    """Copy a binary stream to disk in fixed-size chunks
+
+    Aborts as soon as more than max_size bytes have been read and deletes
+    the partial file. If a hashlib hasher is given it is fed every chunk.
+    Returns the number of bytes written.
+    """
+    chunk_size = chunk_size or settings.upload_chunk_size
+    bytes_written = 0
+
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+
+                bytes_written += len(chunk)
+                if bytes_written > max_size:
+                    raise FileTooLargeError(max_size)
+
+                f.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+    except BaseException:
+        _remove_partial_file(file_path)
+        raise
+
+    return bytes_written
+
+
+async def save_upload_file(file: UploadFile, file_path: str, max_size: int,
+                           chunk_size: Optional[int] = None) -> Tuple[int, str]:
+    """Stream an UploadFile to disk without loading it into memory
+
+    The copy runs in a worker thread so the event loop is never blocked
+    by disk I/O. Returns the number of bytes written and their SHA-256.
+    """
+    await file.seek(0)
+    hasher = hashlib.sha256()
+    size = await asyncio.to_thread(copy_stream_to_file, file.file, file_path, max_size, chunk_size, hasher)
+    return size, hasher.hexdigest()
+
+
+def file_sha256(file_path: str, chunk_size: Optional[int] = None) -> str:
+    """SHA-256 hex digest of a file on disk, read in chunks"""
+    chunk_size = chunk_size or settings.upload_chunk_size
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def preallocate_file(file_path: str, size: int):
+    """Create a file of the given size so chunks can be written at their offsets"""
+    with open(file_path, "wb") as f:
+        f.truncate(size)
+
+
+def _write_piece(f: BinaryIO, piece: bytes, hasher):
+    f.write(piece)
+    hasher.update(piece)
+
+
+async def write_stream_at_offset(stream: AsyncIterator[bytes], file_path: str, offset: int,
+                                 expected_length: int) -> str:
+    """Write an async byte stream into an existing file at the given offset
+
+    Each piece is written as it arrives, so nothing beyond the current piece
+    is held in memory. Returns the SHA-256 hex digest of the bytes written.
+    """
+    hasher = hashlib.sha256()
+    received = 0
+
+    f = await asyncio.to_thread(open, file_path, "r+b")
+    try:
+        await asyncio.to_thread(f.seek, offset)
+        async for piece in stream:
+            if not piece:
+                continue
+            received += len(piece)
+            if received > expected_length:
+                raise ChunkLengthError(expected_length, received)
+            await asyncio.to_thread(_write_piece, f, piece, hasher)
+    finally:
+        await asyncio.to_thread(f.close)
+
+    if received != expected_length:
+        raise ChunkLengthError(expected_length, received)
+
+    return hasher.hexdigest()
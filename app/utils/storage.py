@@ -0,0 +1,281 @@
+"""
+Content-addressed storage for uploaded files
+
+Each distinct file is stored once, under a key derived from its SHA-256,
+compressed on write (zstd by default) and decompressed as a stream on read.
+The compressed blobs live in a pluggable backend: a local directory or an
+S3-compatible bucket (AWS S3, MinIO). The key's suffix records how a blob
+was compressed, so changing ``storage_compression`` never strands older
+blobs.
+"""
+
+from abc import ABC, abstractmethod
+from app.config.settings import settings
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Optional, Tuple
+import gzip
+import os
+import shutil
+import tempfile
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd storage compression requires the zstandard package")
+    return zstandard
+
+
+def compression_for_key(key: str) -> str:
+    """Compression a blob was written with, from its key's suffix"""
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and key.endswith(suffix):
+            return compression
+    return "none"
+
+
+class StorageBackend(ABC):
+    """Where blobs live; keys are relative, slash-separated paths"""
+
+    @abstractmethod
+    def put_file(self, local_path: str, key: str):
+        """Move a local file into the store under key"""
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        """Readable binary stream of the stored blob"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether a blob is stored under key"""
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Remove the blob stored under key"""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Stored (compressed) size in bytes"""
+
+    @abstractmethod
+    def list(self) -> Iterator[Tuple[str, float]]:
+        """Every stored key with its last-modified timestamp"""
+
+
+class LocalBackend(StorageBackend):
+    """Blobs as files under a root directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def put_file(self, local_path: str, key: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Move next to the target first so the final rename is atomic
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        shutil.move(local_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self._path(key))
+
+    def list(self) -> Iterator[Tuple[str, float]]:
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                try:
+                    yield key, os.path.getmtime(path)
+                except FileNotFoundError:
+                    continue
+
+
+class S3Backend(StorageBackend):
+    """Blobs as objects in an S3-compatible bucket"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, access_key_id: Optional[str] = None,
+                 secret_access_key: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("The s3 storage backend requires the boto3 package")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    def put_file(self, local_path: str, key: str):
+        # upload_file switches to multipart uploads for large files
+        self.client.upload_file(local_path, self.bucket, self.prefix + key)
+        os.unlink(local_path)
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)["Body"]
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)["ContentLength"]
+
+    def list(self) -> Iterator[Tuple[str, float]]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                yield item["Key"][len(self.prefix):], item["LastModified"].timestamp()
+
+
+class BlobStore:
+    """Compressed, content-addressed files on top of a backend"""
+
+    def __init__(self, backend: StorageBackend, compression: str = "zstd", level: int = 3):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(
+                f"Invalid storage compression '{compression}'. "
+                f"Must be one of: {', '.join(COMPRESSION_SUFFIXES)}"
+            )
+        self.backend = backend
+        self.compression = compression
+        self.level = level
+
+    def key_for(self, sha256: str) -> str:
+        return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{COMPRESSION_SUFFIXES[self.compression]}"
+
+    def _compress(self, file_path: str) -> str:
+        spool_dir = os.path.join(settings.upload_dir, "tmp")
+        os.makedirs(spool_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".blob", dir=spool_dir)
+        try:
+            with open(file_path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                if self.compression == "zstd":
+                    compressor = _zstandard().ZstdCompressor(level=self.level)
+                    compressor.copy_stream(src, dst, size=os.path.getsize(file_path))
+                elif self.compression == "gzip":
+                    with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=self.level) as gz:
+                        shutil.copyfileobj(src, gz, settings.upload_chunk_size)
+                else:
+                    shutil.copyfileobj(src, dst, settings.upload_chunk_size)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return tmp_path
+
+    def put(self, file_path: str, sha256: str) -> str:
+        """Store a file's contents, unless already stored; returns the blob key
+
+        The file at file_path is left in place for the caller to remove.
+        """
+        key = self.key_for(sha256)
+        if self.backend.exists(key):
+            return key
+        tmp_path = self._compress(file_path)
+        try:
+            self.backend.put_file(tmp_path, key)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+        return key
+
+    @contextmanager
+    def open(self, key: str) -> Iterator[BinaryIO]:
+        """Stream a blob's original contents, decompressing as it is read"""
+        raw = self.backend.open(key)
+        try:
+            compression = compression_for_key(key)
+            if compression == "zstd":
+                with _zstandard().ZstdDecompressor().stream_reader(raw, closefd=False) as reader:
+                    yield reader
+            elif compression == "gzip":
+                with gzip.GzipFile(fileobj=raw, mode="rb") as reader:
+                    yield reader
+            else:
+                yield raw
+        finally:
+            raw.close()
+
+    def fetch(self, key: str, file_path: str):
+        """Write a blob's original contents to a local file"""
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        try:
+            with self.open(key) as src, open(file_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, settings.upload_chunk_size)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+            raise
+
+    def delete(self, key: str):
+        self.backend.delete(key)
+
+    def archive(self, key: str, file_path: str):
+        """Copy a blob, still compressed, to a local file"""
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        raw = self.backend.open(key)
+        try:
+            with open(file_path, "wb") as dst:
+                shutil.copyfileobj(raw, dst, settings.upload_chunk_size)
+        finally:
+            raw.close()
+
+    def list(self) -> Iterator[Tuple[str, float]]:
+        return self.backend.list()
+
+
+def get_blob_store() -> BlobStore:
+    """Blob store configured by the storage settings"""
+    if settings.storage_backend == "s3":
+        if not settings.s3_bucket:
+            raise RuntimeError("S3_BUCKET must be set for the s3 storage backend")
+        backend = S3Backend(
+            settings.s3_bucket,
+            prefix=settings.s3_prefix,
+            endpoint_url=settings.s3_endpoint_url,
+            region=settings.s3_region,
+            access_key_id=settings.s3_access_key_id,
+            secret_access_key=settings.s3_secret_access_key,
+        )
+    elif settings.storage_backend == "local":
+        backend = LocalBackend(settings.storage_root or os.path.join(settings.upload_dir, "store"))
+    else:
+        raise ValueError(f"Invalid storage backend '{settings.storage_backend}'. Must be one of: local, s3")
+    return BlobStore(backend, settings.storage_compression, settings.storage_compression_level)
@@ -0,0 +1,278 @@
+"""
+Bulk loading of ingested rows
+
+Rows are accumulated into batches and written with one statement and one
+commit per batch instead of one ORM round trip per row. Three modes are
+supported:
+
+- ``executemany``: a single INSERT executed with a list of parameter sets
+- ``multirow``: one INSERT ... VALUES (...), (...) statement per batch
+- ``load_data``: rows are spooled to a temp file and loaded with MySQL
+  ``LOAD DATA LOCAL INFILE`` (requires ``db_local_infile``)
+
+Without ``commit`` batches are written into the caller's transaction,
+which the caller commits.
+
+With ``ignore_duplicates`` a row whose unique key is already in the table
+is skipped instead of failing the batch (INSERT IGNORE / ON CONFLICT DO
+NOTHING).
+
+``UpsertLoader`` is the idempotent variant for tables with a natural key: it
+compares per-row content hashes with what is stored and only writes rows
+that are new or changed.
+"""
+
+from sqlalchemy import Table, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.settings import settings
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+import asyncio
+import os
+import tempfile
+import logging
+
+logger = logging.getLogger(__name__)
+
+BULK_LOAD_MODES = ("executemany", "multirow", "load_data")
+
+
+def _infile_value(value) -> str:
+    """Encode a value for a tab-separated LOAD DATA file"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, float):
+        return repr(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class BulkLoader:
+    """Batched writer for a single table"""
+
+    def __init__(self, db: AsyncSession, table: Table, mode: Optional[str] = None,
+                 batch_size: Optional[int] = None, ignore_duplicates: bool = False, commit: bool = True):
+        self.db = db
+        self.table = table
+        self.ignore_duplicates = ignore_duplicates
+        self.commit = commit
+        self.mode = mode or settings.bulk_load_mode
+        self.batch_size = batch_size or settings.bulk_load_batch_size
+        if self.mode not in BULK_LOAD_MODES:
+            raise ValueError(f"Invalid bulk load mode '{self.mode}'. Must be one of: {', '.join(BULK_LOAD_MODES)}")
+
+        self.rows_loaded = 0
+        self.batches_committed = 0
+        self._pending: List[dict] = []
+
+    async def add(self, records: Iterable[dict]):
+        """Queue rows, writing every full batch"""
+        self._pending.extend(records)
+        while len(self._pending) >= self.batch_size:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            await self._write(batch)
+
+    async def flush(self):
+        """Write any rows still queued"""
+        if self._pending:
+            batch, self._pending = self._pending, []
+            await self._write(batch)
+
+    async def _write(self, batch: List[dict]):
+        try:
+            stmt = (insert_ignore_statement(self.db.bind.dialect.name, self.table) if self.ignore_duplicates
+                    else insert(self.table))
+            if self.mode == "executemany":
+                await self.db.execute(stmt, batch)
+            elif self.mode == "multirow":
+                await self.db.execute(stmt.values(batch))
+            else:
+                await self._load_data(batch)
+            if self.commit:
+                await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+
+        self.rows_loaded += len(batch)
+        self.batches_committed += 1
+
+    def _with_defaults(self, batch: List[dict], columns: List[str]) -> List[dict]:
+        # LOAD DATA bypasses SQLAlchemy, so fill Python-side column defaults here
+        defaults = {}
+        for column in self.table.columns:
+            default = column.default
+            if column.name in columns or default is None:
+                continue
+            if default.is_callable:
+                defaults[column.name] = default.arg(None)
+            elif default.is_scalar:
+                defaults[column.name] = default.arg
+        if not defaults:
+            return batch
+        return [{**defaults, **record} for record in batch]
+
+    def _spool(self, batch: List[dict], columns: List[str]) -> str:
+        spool_dir = os.path.join(settings.upload_dir, "tmp")
+        os.makedirs(spool_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", dir=spool_dir, delete=False,
+                                         encoding="utf-8", newline="\n") as f:
+            for record in batch:
+                f.write("\t".join(_infile_value(record.get(name)) for name in columns))
+                f.write("\n")
+            return f.name
+
+    async def _load_data(self, batch: List[dict]):
+        batch = self._with_defaults(batch, list(batch[0]))
+        columns = list(batch[0])
+        spool_path = await asyncio.to_thread(self._spool, batch, columns)
+        try:
+            column_list = ", ".join(f"`{name}`" for name in columns)
+            escaped_path = spool_path.replace("\\", "\\\\").replace("'", "\\'")
+            await self.db.execute(text(
+                f"LOAD DATA LOCAL INFILE '{escaped_path}' {'IGNORE ' if self.ignore_duplicates else ''}"
+                f"INTO TABLE `{self.table.name}` "
+                f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' "
+                f"LINES TERMINATED BY '\\n' ({column_list})"
+            ))
+        finally:
+            await asyncio.to_thread(os.unlink, spool_path)
+
+
+_MISSING = object()
+
+
+def insert_ignore_statement(dialect: str, table: Table, columns: Optional[List[str]] = None, from_select=None):
+    """INSERT that skips rows whose unique key already exists
+
+    With from_select, rows come from that SELECT (whose columns match
+    ``columns``) instead of bound parameters.
+    """
+    if dialect == "mysql":
+        stmt = insert(table).prefix_with("IGNORE")
+    elif dialect in ("postgresql", "sqlite"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table).on_conflict_do_nothing()
+    else:
+        raise ValueError(f"Insert ignore is not supported for dialect '{dialect}'")
+    if from_select is not None:
+        stmt = stmt.from_select(columns, from_select)
+    return stmt
+
+
+def upsert_statement(dialect: str, table: Table, key: str, columns: List[str], from_select=None):
+    """INSERT that updates the given columns when the unique key already exists
+
+    With from_select, rows come from that SELECT (whose columns match
+    ``columns``) instead of bound parameters.
+    """
+    update_columns = [name for name in columns if name not in (key, "created_at")]
+    if "updated_at" in table.c and "updated_at" not in update_columns:
+        update_columns.append("updated_at")
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table)
+        if from_select is not None:
+            stmt = stmt.from_select(columns, from_select)
+        return stmt.on_duplicate_key_update({name: stmt.inserted[name] for name in update_columns})
+    if dialect in ("postgresql", "sqlite"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+        if from_select is not None:
+            stmt = stmt.from_select(columns, from_select)
+        return stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={name: stmt.excluded[name] for name in update_columns},
+        )
+    raise ValueError(f"Upsert is not supported for dialect '{dialect}'")
+
+
+class UpsertLoader(BulkLoader):
+    """Batched upsert keyed on a unique column, skipping unchanged rows
+
+    Each record must carry a content hash. Per batch, the stored hashes for
+    the batch's keys are fetched through the key index; new and changed rows
+    are written with a single INSERT ... ON DUPLICATE KEY UPDATE and
+    unchanged rows are not written at all.
+
+    A key repeated within a load is counted once as inserted; its later rows
+    count as updated or unchanged against the row before them, and only the
+    last row of a key in a batch is written. The hashes written by this load
+    are kept per key for that.
+
+    When loading into a staging table, pass the live table as lookup_table
+    so hashes are compared against what is already stored there.
+    """
+
+    def __init__(self, db: AsyncSession, table: Table, key: str, hash_column: str = "content_hash",
+                 batch_size: Optional[int] = None, lookup_table: Optional[Table] = None):
+        super().__init__(db, table, mode="executemany", batch_size=batch_size)
+        self.lookup_table = lookup_table if lookup_table is not None else table
+        self.key = key
+        self.hash_column = hash_column
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self._written: dict = {}
+
+    async def _existing_hashes(self, keys: List) -> dict:
+        key_column = self.lookup_table.c[self.key]
+        result = await self.db.execute(
+            select(key_column, self.lookup_table.c[self.hash_column]).where(key_column.in_(keys))
+        )
+        return dict(result.all())
+
+    async def _write(self, batch: List[dict]):
+        inserted = updated = unchanged = 0
+        try:
+            # Keys written earlier in this load may only be in the staging table
+            lookup = list({record[self.key] for record in batch if record[self.key] not in self._written})
+            known = await self._existing_hashes(lookup) if lookup else {}
+            known.update(self._written)
+            changed = {}
+            for record in batch:
+                key, content_hash = record[self.key], record[self.hash_column]
+                stored = known.get(key, _MISSING)
+                if stored is _MISSING:
+                    inserted += 1
+                elif stored != content_hash:
+                    updated += 1
+                else:
+                    unchanged += 1
+                    continue
+                known[key] = content_hash
+                changed[key] = record
+
+            if changed:
+                records = list(changed.values())
+                stmt = upsert_statement(self.db.bind.dialect.name, self.table, self.key, list(records[0]))
+                await self.db.execute(stmt, records)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+
+        self.rows_loaded += len(batch)
+        self.batches_committed += 1
+        self._written.update((key, record[self.hash_column]) for key, record in changed.items())
+        self.inserted += inserted
+        self.updated += updated
+        self.unchanged += unchanged
+
+
+def choose_bulk_load_mode(file_size: int) -> str:
+    """Pick LOAD DATA for the largest files when the server allows it"""
+    if settings.db_local_infile and file_size >= settings.bulk_load_infile_min_bytes:
+        return "load_data"
+    return settings.bulk_load_mode
@@ -0,0 +1,99 @@
+"""
+Celery application for durable background jobs
+
+Run the workers with:
+    celery -A app.workers.celery_app worker -Q uploads --loglevel=info
+    celery -A app.workers.celery_app worker -Q reconciliation --pool threads --concurrency 1 --loglevel=info
+
+Reconciliation needs a non-prefork pool: prefork children are daemonic and
+cannot start the process pool (see ``process_pool``), so every partition
+would be reconciled in a thread on one core. With ``--pool threads`` the
+job runs in the worker's main process, which spawns the pool's workers.
+
+and the scheduler for periodic housekeeping with:
+    celery -A app.workers.celery_app beat --loglevel=info
+
+The broker is selected with JOB_BROKER:
+- redis: Redis broker (default); unacknowledged jobs are redelivered after
+  JOB_VISIBILITY_TIMEOUT seconds if a worker dies
+- filesystem: messages are stored under JOB_QUEUE_DIR, for single-box installs
+- memory: jobs run inline in the calling process, for tests only; it is
+  refused in production and logged as a warning elsewhere
+"""
+
+from celery import Celery
+from celery.signals import worker_shutdown
+from app.config.settings import settings
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def get_broker_url() -> str:
+    """Broker URL for the configured job broker"""
+    if settings.job_broker == "filesystem":
+        return "filesystem://"
+    if settings.job_broker == "memory":
+        if settings.environment == "production":
+            raise RuntimeError("JOB_BROKER=memory runs jobs inside API requests and is for tests only; "
+                               "use redis or filesystem")
+        logger.warning("JOB_BROKER=memory: jobs run inline in the API process, with no queue "
+                       "and no upload scheduling; use it for tests only")
+        return "memory://"
+    if settings.job_broker_url:
+        return settings.job_broker_url
+    return f"redis://{settings.redis_host}:{settings.redis_port}/{settings.redis_db}"
+
+
+def get_broker_transport_options() -> dict:
+    """Transport options for the configured job broker"""
+    if settings.job_broker == "filesystem":
+        messages_dir = os.path.join(settings.job_queue_dir, "messages")
+        processed_dir = os.path.join(settings.job_queue_dir, "processed")
+        os.makedirs(messages_dir, exist_ok=True)
+        os.makedirs(processed_dir, exist_ok=True)
+        return {
+            "data_folder_in": messages_dir,
+            "data_folder_out": messages_dir,
+            "processed_folder": processed_dir,
+            "store_processed": False,
+        }
+    return {"visibility_timeout": settings.job_visibility_timeout}
+
+
+celery_app = Celery("reconcii", broker=get_broker_url(), include=["app.workers.jobs"])
+
+celery_app.conf.update(
+    task_serializer="json",
+    accept_content=["json"],
+    task_ignore_result=True,
+    # Acknowledge only after a job finishes so a crashed worker's job is redelivered
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    broker_transport_options=get_broker_transport_options(),
+    task_always_eager=settings.job_broker == "memory",
+    task_routes={
+        "uploads.*": {"queue": "uploads"},
+        "reconciliation.*": {"queue": "reconciliation"},
+    },
+    beat_schedule={
+        "upload-retention": {
+            "task": "uploads.run_housekeeping",
+            "schedule": settings.housekeeping_interval_hours * 3600,
+        },
+        "storage-garbage-collection": {
+            "task": "uploads.collect_storage_garbage",
+            "schedule": settings.housekeeping_interval_hours * 3600,
+        },
+    },
+)
+
+
+@worker_shutdown.connect
+def shutdown_process_pool(**kwargs):
+    """Stop the process pool's workers with the Celery worker"""
+    from app.workers.process_pool import process_pool
+
+    process_pool.shutdown()
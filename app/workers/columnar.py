@@ -0,0 +1,202 @@
+"""
+Columnar batch spooling between the process pool and the loader
+
+The parser runs in a pool process and writes each batch to a spool file as
+a dict of NumPy arrays, pickled with protocol 5. Numeric and datetime
+columns are pickled as whole buffers; string columns are object arrays, so
+each of their values is still pickled, and unpickled into a new str, on its
+own. The loader turns every row into a dict for the database driver anyway,
+so converting the strings to and from Arrow buffers would only move that
+per-value work, not remove it.
+
+The loader reads batches back as they appear, so parsing and loading
+overlap. Spool files, rather than a pipe or queue, are used because the
+parser runs as an ordinary ``process_pool`` task: a multiprocessing queue
+can only be shared with a pool worker when the worker starts, not passed to
+a task, and a manager queue would add a proxy process and another copy of
+every batch. The directory gives
+back-pressure (the parser waits while ``process_pool_spool_batches`` files
+are pending) and cancellation (removing it stops the parser). Both sides
+poll every POLL_INTERVAL, which is small next to the time it takes to parse
+or load a batch, and the short-lived files rarely leave the page cache.
+"""
+
+from app.config.settings import settings
+from typing import AsyncIterator, Dict, Optional
+import numpy as np
+import pandas as pd
+import asyncio
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05
+
+
+class SpoolClosedError(Exception):
+    """Raised in the parser process when the reader has gone away"""
+
+
+def frame_to_columns(frame: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Split a DataFrame into one NumPy array per column
+
+    String columns come out as object arrays of str.
+    """
+    return {name: frame[name].to_numpy() for name in frame.columns}
+
+
+def columns_to_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Rebuild a DataFrame from columnar arrays without copying"""
+    return pd.DataFrame(columns, copy=False)
+
+
+def batch_path(spool_dir: str, index: int) -> str:
+    return os.path.join(spool_dir, f"batch_{index:06d}.pkl")
+
+
+def write_batch(spool_dir: str, index: int, columns: Dict[str, np.ndarray],
+                progress: Optional[float] = None):
+    """Write a batch atomically so the reader never sees a partial file"""
+    path = batch_path(spool_dir, index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"columns": columns, "progress": progress}, f, protocol=5)
+    os.replace(tmp_path, path)
+
+
+def read_batch(path: str) -> pd.DataFrame:
+    """Load a spooled batch as a DataFrame and delete its file"""
+    with open(path, "rb") as f:
+        payload = pickle.load(f)
+    os.unlink(path)
+    frame = columns_to_frame(payload["columns"])
+    frame.attrs["progress"] = payload["progress"]
+    return frame
+
+
+def _wait_for_room(spool_dir: str, max_pending: int):
+    while True:
+        if not os.path.isdir(spool_dir):
+            raise SpoolClosedError(spool_dir)
+        pending = sum(1 for name in os.listdir(spool_dir) if name.endswith(".pkl"))
+        if pending < max_pending:
+            return
+        time.sleep(POLL_INTERVAL)
+
+
+def spool_batches(upload_type: str, file_path: str, filetype: Optional[str], batch_size: int,
+                  spool_dir: str, max_pending: int, read_cache: Optional[str] = None,
+                  write_cache: Optional[str] = None, error_file: Optional[str] = None,
+                  known_mappings: Optional[dict] = None) -> dict:
+    """Parse a file and spool its batches; runs in a pool process
+
+    With read_cache, batches come from a parse cache instead of the file.
+    With write_cache, parsed batches are also written to a new parse cache;
+    a failure there is logged and does not stop the parse. With error_file,
+    rows rejected by validation are written to that sidecar. known_mappings
+    are header mappings learned from earlier files (see ``columns_for``).
+    Returns the number of batches written, the validation summary, the
+    header mapping used and a data profile of the batches (see ``profiling``).
+    """
+    from app.workers.parsers import get_parser
+    from app.workers.parse_cache import CacheWriter, read_cache_batches
+    from app.workers.profiling import UploadProfile
+    from app.workers.validation import ErrorSidecarWriter
+
+    parser = get_parser(upload_type)
+    error_writer = ErrorSidecarWriter(error_file) if error_file else None
+    header_mapping = {}
+
+    def on_mapping(signature, headers, mapping, learned):
+        header_mapping.update(signature=signature, headers=headers, mapping=mapping, learned=learned)
+
+    if read_cache:
+        frames = read_cache_batches(read_cache, batch_size)
+    else:
+        on_rejected = error_writer.write if error_writer is not None else None
+        frames = parser.iter_batches(file_path, batch_size, filetype, on_rejected=on_rejected,
+                                     known_mappings=known_mappings, on_mapping=on_mapping)
+    cache_writer = CacheWriter(write_cache, parser.columns) if write_cache else None
+    profile = UploadProfile(parser.columns)
+
+    count = 0
+    try:
+        for frame in frames:
+            _wait_for_room(spool_dir, max_pending)
+            write_batch(spool_dir, count, frame_to_columns(frame), frame.attrs.get("progress"))
+            count += 1
+            profile.update(frame)
+            if cache_writer is not None:
+                try:
+                    cache_writer.write(frame)
+                except Exception as e:
+                    logger.warning(f"Could not write parse cache {write_cache}: {e}")
+                    cache_writer.abort()
+                    cache_writer = None
+    except BaseException:
+        if cache_writer is not None:
+            cache_writer.abort()
+        if error_writer is not None:
+            error_writer.abort()
+        raise
+
+    if cache_writer is not None:
+        cache_writer.close()
+    result = {"batches": count, "header_mapping": header_mapping or None, "profile": profile.to_dict()}
+    if error_writer is not None:
+        result["error_file"] = error_writer.close()
+        result.update(error_writer.summary())
+    return result
+
+
+async def iter_parsed_batches(upload_type: str, file_path: str, filetype: Optional[str],
+                              batch_size: int, read_cache: Optional[str] = None,
+                              write_cache: Optional[str] = None, error_file: Optional[str] = None,
+                              known_mappings: Optional[dict] = None, result: Optional[dict] = None) -> AsyncIterator[pd.DataFrame]:
+    """Parse a file in the process pool and yield its batches as DataFrames
+
+    Batches keep the parser's ``attrs["progress"]`` estimate. Once every
+    batch has been yielded, the parser's summary (see ``spool_batches``) is
+    copied into result, if given.
+    """
+    from app.workers.process_pool import process_pool
+
+    tmp_root = os.path.join(settings.upload_dir, "tmp")
+    os.makedirs(tmp_root, exist_ok=True)
+    spool_dir = tempfile.mkdtemp(prefix="parse_", dir=tmp_root)
+    future = process_pool.submit(
+        spool_batches, upload_type, file_path, filetype, batch_size,
+        spool_dir, settings.process_pool_spool_batches, read_cache, write_cache, error_file,
+        known_mappings,
+    )
+
+    index = 0
+    try:
+        while True:
+            path = batch_path(spool_dir, index)
+            if os.path.exists(path):
+                yield await asyncio.to_thread(read_batch, path)
+                index += 1
+                continue
+            if future.done():
+                # Batches are written before the parser returns, so re-check once more
+                summary = future.result()
+                if index >= summary["batches"]:
+                    if result is not None:
+                        result.update(summary)
+                    break
+                continue
+            await asyncio.wait([future], timeout=POLL_INTERVAL)
+    finally:
+        # Removing the spool directory also tells a still-running parser to stop
+        await asyncio.to_thread(shutil.rmtree, spool_dir, True)
+        if not future.done():
+            try:
+                await future
+            except Exception:
+                pass
@@ -0,0 +1,152 @@
+"""
+Retention housekeeping for uploaded files and generated reports
+
+Run periodically by celery beat (see ``celery_app``). The raw files of
+completed uploads, with their parse caches and error files, and report
+workbooks are removed once older than their retention period, or moved
+under ``retention_archive_dir`` when that is set. Uploads are handled in
+batches of ``retention_batch_size`` records and every file operation runs
+in a thread, so the job never holds an event loop.
+"""
+
+from app.config.database import sso_db_session
+from app.config.settings import settings
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _release_local(path: Optional[str], archive_subdir: str) -> int:
+    """Delete or archive a local file; returns the bytes freed"""
+    if not path or not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    if settings.retention_archive_dir:
+        destination = os.path.join(settings.retention_archive_dir, archive_subdir, os.path.basename(path))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.move(path, destination)
+    else:
+        os.unlink(path)
+    return size
+
+
+def _release_blob(store, key: str) -> int:
+    """Delete or archive a stored upload file; returns the bytes freed"""
+    if not store.backend.exists(key):
+        return 0
+    size = store.backend.size(key)
+    if settings.retention_archive_dir:
+        store.archive(key, os.path.join(settings.retention_archive_dir, "uploads", *key.split("/")))
+    store.delete(key)
+    return size
+
+
+def report_type(filename: str) -> str:
+    """Report type of a generated workbook, from its filename prefix"""
+    return filename.split("_", 1)[0]
+
+
+def expired_reports(now: datetime) -> List[str]:
+    """Report files older than their type's retention period"""
+    if not os.path.isdir(settings.reports_dir):
+        return []
+    expired = []
+    with os.scandir(settings.reports_dir) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            days = settings.retention_report_type_days.get(
+                report_type(entry.name), settings.retention_report_days
+            )
+            if datetime.utcfromtimestamp(entry.stat().st_mtime) < now - timedelta(days=days):
+                expired.append(entry.path)
+    return sorted(expired)
+
+
+async def expire_reports(now: datetime) -> Dict[str, int]:
+    """Remove expired report files in batches"""
+    paths = await asyncio.to_thread(expired_reports, now)
+    stats = {"files": 0, "bytes": 0}
+    batch_size = settings.retention_batch_size
+
+    def release(batch: List[str]) -> int:
+        return sum(_release_local(path, "reports") for path in batch)
+
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        stats["bytes"] += await asyncio.to_thread(release, batch)
+        stats["files"] += len(batch)
+    return stats
+
+
+async def expire_uploads(now: datetime) -> Dict[str, int]:
+    """Purge the files of completed uploads older than their type's retention period
+
+    Records are marked purged before their files are removed, so no record
+    ever points at a missing file. Stored files shared with uploads that
+    are still retained are kept.
+    """
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+    from app.workers.validation import error_path_for
+
+    store = get_blob_store()
+    overrides = settings.retention_upload_type_days
+    # One pass per type with its own retention, then one for all other types
+    passes = [(now - timedelta(days=days), [upload_type], None) for upload_type, days in overrides.items()]
+    passes.append((now - timedelta(days=settings.retention_upload_days), None, list(overrides) or None))
+
+    stats = {"records": 0, "files": 0, "bytes": 0}
+    for cutoff, upload_types, exclude_types in passes:
+        while True:
+            async with sso_db_session() as db:
+                records = await UploadRecord.get_expired(
+                    db, cutoff, settings.retention_batch_size, upload_types, exclude_types
+                )
+                if not records:
+                    break
+                # Read the paths before the update, which expires the loaded records
+                files = [(record.id, record.filepath, record.cache_path, record.storage_key) for record in records]
+                await UploadRecord.mark_files_purged(db, [upload_id for upload_id, *_ in files], now)
+                released_keys = []
+                for key in {storage_key for *_, storage_key in files if storage_key}:
+                    if not await UploadRecord.is_stored_file_referenced(db, key):
+                        released_keys.append(key)
+
+            def release() -> List[int]:
+                freed = []
+                for _, filepath, cache_path, storage_key in files:
+                    freed.append(_release_local(cache_path, "cache"))
+                    freed.append(_release_local(error_path_for(filepath), "errors"))
+                    if not storage_key:
+                        # Uploads made before content-addressed storage kept a plain local file
+                        freed.append(_release_local(filepath, "uploads"))
+                for key in released_keys:
+                    freed.append(_release_blob(store, key))
+                return freed
+
+            freed = await asyncio.to_thread(release)
+            stats["records"] += len(files)
+            stats["files"] += sum(1 for size in freed if size)
+            stats["bytes"] += sum(freed)
+    return stats
+
+
+async def run_housekeeping(now: Optional[datetime] = None) -> dict:
+    """Apply the retention rules to uploads and reports; returns what was reclaimed"""
+    now = now or datetime.utcnow()
+    uploads = await expire_uploads(now)
+    reports = await expire_reports(now)
+    result = {
+        "uploads": uploads,
+        "reports": reports,
+        "bytes_reclaimed": uploads["bytes"] + reports["bytes"],
+        "archived": bool(settings.retention_archive_dir),
+    }
+    logger.info(f"Housekeeping finished: {result}")
+    return result
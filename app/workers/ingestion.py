@@ -0,0 +1,215 @@
+"""
+Upload ingestion pipeline
+"""
+
+from app.config.database import sso_db_session, main_db_session
+from app.config.settings import settings
+from app.models.main.header_mapping import HeaderMapping
+from app.workers.bulk_loader import BulkLoader, UpsertLoader, choose_bulk_load_mode
+from app.workers.columnar import iter_parsed_batches
+from app.workers.parse_cache import cache_path_for, is_cache_valid, remove_cache
+from app.workers.parsers import get_parser, frame_to_records
+from app.workers.rollup import apply_rollup
+from app.workers.staging import staging_table, validate_staging, merge_staging, natural_key
+from app.workers.validation import error_path_for, read_error_summary
+from contextlib import aclosing
+from typing import Awaitable, Callable, Optional
+import asyncio
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def db_session_for(database: str):
+    """Session context manager for the database a parser targets"""
+    return main_db_session() if database == "main" else sso_db_session()
+
+
+class IngestProgress:
+    """Rows parsed and loaded so far, reported at most once per interval"""
+
+    def __init__(self, callback: Optional[Callable[[dict], Awaitable]], interval: Optional[float] = None):
+        self.callback = callback
+        self.interval = settings.upload_progress_interval if interval is None else interval
+        self.started = time.perf_counter()
+        self._last_report = None
+
+    def snapshot(self, rows_parsed: int, rows_loaded: int, fraction: Optional[float]) -> dict:
+        elapsed = time.perf_counter() - self.started
+        estimated_total = rows_parsed / fraction if fraction else None
+        percent = eta = None
+        if estimated_total:
+            percent = round(min(100.0 * rows_loaded / estimated_total, 100.0), 1)
+            if rows_loaded:
+                eta = round(max(elapsed * (estimated_total - rows_loaded) / rows_loaded, 0.0), 1)
+        return {
+            "rows_parsed": rows_parsed,
+            "rows_loaded": rows_loaded,
+            "percent": percent,
+            "eta_seconds": eta,
+            "elapsed_seconds": round(elapsed, 1),
+        }
+
+    async def report(self, rows_parsed: int, rows_loaded: int, fraction: Optional[float]):
+        if self.callback is None:
+            return
+        now = time.perf_counter()
+        if self._last_report is not None and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        try:
+            await self.callback(self.snapshot(rows_parsed, rows_loaded, fraction))
+        except Exception as e:
+            # Progress is informational; never fail the load over it
+            logger.warning(f"Could not report ingest progress: {e}")
+
+
+async def ingest_upload(upload_id: int, file_path: str, upload_type: str,
+                        filetype: Optional[str] = None, cache_path: Optional[str] = None,
+                        cache_version: Optional[int] = None,
+                        progress_callback: Optional[Callable[[dict], Awaitable]] = None) -> dict:
+    """Stream an uploaded file through its parser into the target table
+
+    The file is parsed in the process pool, which hands back columnar
+    batches while the bulk loader writes earlier ones, so memory stays
+    bounded by a few batches and the event loop is never held by parsing.
+
+    If the upload's recorded parse cache matches the current parser version
+    it is read instead of the file; otherwise a new cache is written during
+    the parse. The summary reports the cache in use.
+
+    Rows failing validation are skipped and written to an error sidecar;
+    the summary reports their count by reason and the sidecar's path.
+
+    Header rows are mapped to columns through the header mapping registry:
+    a layout seen before reuses its stored mapping, and a new one is
+    resolved (with fuzzy matching) and stored for later uploads.
+
+    The summary also carries a profile of the loaded rows (null counts,
+    min/max, totals and distinct-count estimates per column), computed by
+    the parser as the batches stream past.
+
+    progress_callback, if given, is awaited with rows parsed/loaded, percent
+    and ETA at most every ``upload_progress_interval`` seconds.
+
+    With ``ingest_use_staging`` the rows are loaded into a per-job staging
+    table and merged into the live table only after they validate, so a
+    failed upload leaves no partial rows behind. The parser's per-store,
+    per-day rollup is updated in the merge transaction (see ``rollup``).
+    Types keyed on a row hash skip rows whose key repeats within the file or
+    is already stored, and report them as ``duplicate_rows``.
+    """
+    parser = get_parser(upload_type)
+    table = parser.model.__table__
+    if is_cache_valid(cache_path, cache_version, parser.version):
+        read_cache, write_cache = cache_path, None
+    else:
+        read_cache, write_cache = None, cache_path_for(file_path, parser.version)
+    mode = "upsert" if parser.upsert_key else choose_bulk_load_mode(os.path.getsize(file_path))
+    # Row-hash keys repeat when exports overlap; such rows are skipped rather than failing the upload
+    skip_duplicates = not parser.upsert_key and natural_key(table) is not None
+
+    started = time.perf_counter()
+    progress = IngestProgress(progress_callback)
+    error_file = error_path_for(file_path)
+    parse_result = {}
+
+    known_mappings = None
+    if not read_cache:
+        async with db_session_for("sso") as db:
+            known_mappings = await HeaderMapping.get_mappings(db, upload_type, parser.version)
+
+    async def load(db, target):
+        if parser.upsert_key:
+            loader = UpsertLoader(db, target, key=parser.upsert_key, lookup_table=table)
+        else:
+            loader = BulkLoader(db, target, mode=mode, ignore_duplicates=skip_duplicates)
+        batches = iter_parsed_batches(upload_type, file_path, filetype, settings.ingest_batch_size,
+                                      read_cache=read_cache, write_cache=write_cache,
+                                      error_file=None if read_cache else error_file,
+                                      known_mappings=known_mappings, result=parse_result)
+        async with aclosing(batches):
+            rows_parsed = 0
+            async for frame in batches:
+                rows_parsed += len(frame)
+                await loader.add(frame_to_records(frame, parser.columns))
+                await progress.report(rows_parsed, loader.rows_loaded, frame.attrs.get("progress"))
+        await loader.flush()
+        return loader
+
+    staged_rows = duplicates = None
+    async with db_session_for(parser.database) as db:
+        if settings.ingest_use_staging:
+            async with staging_table(db, table, upload_id) as staging:
+                loader = await load(db, staging)
+                # Upserts may stage fewer rows than were read (unchanged rows are skipped),
+                # as may loads that skip keys repeated within the file
+                expected = None if parser.upsert_key or skip_duplicates else loader.rows_loaded
+                staged_rows = await validate_staging(db, staging, parser.required, expected)
+
+                async def update_rollup(db):
+                    await apply_rollup(db, parser.rollup, staging, table, parser.upsert_key)
+
+                existing = await merge_staging(db, staging, table, upsert_key=parser.upsert_key,
+                                               before_merge=update_rollup if parser.rollup else None)
+                if skip_duplicates:
+                    duplicates = loader.rows_loaded - staged_rows + existing
+        else:
+            loader = await load(db, table)
+            if parser.rollup:
+                logger.warning(f"Staging is disabled; store daily rollups not updated for upload {upload_id}")
+
+    if write_cache:
+        if os.path.exists(write_cache):
+            if cache_path and cache_path != write_cache:
+                await asyncio.to_thread(remove_cache, cache_path)
+            cache_path = write_cache
+        else:
+            cache_path = None
+
+    header_mapping = parse_result.get("header_mapping")
+    if header_mapping:
+        try:
+            async with db_session_for("sso") as db:
+                await HeaderMapping.record_use(db, upload_type, parser.version, header_mapping["signature"],
+                                               header_mapping["headers"], header_mapping["mapping"])
+        except Exception as e:
+            # The rows are loaded; the mapping is only reused to speed up later files
+            logger.warning(f"Could not store header mapping for upload {upload_id}: {e}")
+
+    if read_cache:
+        # Cached batches were validated on the first parse; report that run's rejects
+        validation = await asyncio.to_thread(read_error_summary, error_file)
+        validation["error_file"] = error_file if validation["invalid_rows"] else None
+    else:
+        validation = {key: parse_result.get(key) for key in ("invalid_rows", "errors", "error_file")}
+
+    total_rows = loader.rows_loaded
+    elapsed = time.perf_counter() - started
+    summary = {
+        "upload_type": upload_type,
+        "rows": total_rows,
+        "batches": loader.batches_committed,
+        "load_mode": mode,
+        "staged_rows": staged_rows,
+        "duplicate_rows": duplicates,
+        "rollup": parser.rollup["source"] if parser.rollup and staged_rows is not None else None,
+        "invalid_rows": validation["invalid_rows"] or 0,
+        "errors": validation["errors"] or {},
+        "error_file": validation["error_file"],
+        "profile": parse_result.get("profile"),
+        "source": "cache" if read_cache else "file",
+        "header_mapping": (
+            None if not header_mapping else "learned" if header_mapping["learned"] else "reused"
+        ),
+        "cache_path": cache_path,
+        "parser_version": parser.version,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(total_rows / elapsed, 1) if elapsed > 0 else None,
+    }
+    if parser.upsert_key:
+        summary.update(inserted=loader.inserted, updated=loader.updated, unchanged=loader.unchanged)
+    logger.info(f"Ingested upload {upload_id}: {summary}")
+    return summary
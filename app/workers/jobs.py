@@ -0,0 +1,157 @@
+"""
+Background job definitions
+
+Each job runs its coroutine on a long-lived event loop owned by the thread
+running it, with database engines of that thread's own (see
+``use_thread_engines``), so engines created by one job are reused by the
+next in the same thread. Inline (eager) jobs run in threads of the API
+process, possibly several at once, and never touch the API's loop or its
+engines.
+
+Transient failures (lost database connections, timeouts) are retried with
+exponential backoff; the job is marked failed only after the last attempt.
+"""
+
+from celery.utils.time import get_exponential_backoff_interval
+from sqlalchemy.exc import OperationalError, InterfaceError
+from app.config.database import use_thread_engines
+from app.config.settings import settings
+from app.workers.celery_app import celery_app
+from typing import Optional
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying; anything else (bad file, missing columns) fails immediately
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, ConnectionError, asyncio.TimeoutError)
+
+_job_thread = threading.local()
+
+
+def run_async(coro):
+    """Run a coroutine on the calling thread's job event loop"""
+    loop = getattr(_job_thread, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _job_thread.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        use_thread_engines()
+    return loop.run_until_complete(coro)
+
+
+def retry_countdown(retries: int) -> int:
+    """Seconds to wait before the next attempt"""
+    return get_exponential_backoff_interval(
+        factor=settings.job_retry_backoff,
+        retries=retries,
+        maximum=settings.job_retry_backoff_max,
+        full_jitter=True,
+    )
+
+
+@celery_app.task(bind=True, name="uploads.process_upload_file", max_retries=settings.job_max_retries)
+def process_upload_file_job(self, upload_id: int, file_path: str, upload_type: str):
+    """Parse and load an uploaded file once the scheduler grants it a slot"""
+    from app.workers.scheduler import upload_scheduler, CLAIMED, WAIT
+    from app.workers.tasks import process_upload_file
+
+    # Only queued jobs are scheduled: an inline (eager) job told to wait would be re-run at
+    # once, recursively. Inline jobs are for tests (JOB_BROKER=memory) and are not capped.
+    if not self.request.is_eager:
+        try:
+            decision = run_async(upload_scheduler.claim(upload_id, upload_type))
+        except TRANSIENT_ERRORS as exc:
+            raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+        if decision == WAIT:
+            # Re-queue as a fresh message so waiting does not use up the retry budget
+            process_upload_file_job.apply_async(
+                kwargs={"upload_id": upload_id, "file_path": file_path, "upload_type": upload_type},
+                countdown=settings.upload_schedule_retry_seconds,
+            )
+            return
+        if decision != CLAIMED:
+            logger.info(f"Upload {upload_id} no longer needs processing, skipping")
+            return
+
+    final_attempt = self.request.retries >= self.max_retries
+    try:
+        run_async(process_upload_file(upload_id, file_path, upload_type, final_attempt=final_attempt))
+    except TRANSIENT_ERRORS as exc:
+        logger.warning(f"Upload {upload_id} failed with a transient error, retrying: {exc}")
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+@celery_app.task(bind=True, name="reconciliation.generate_sheet_data", max_retries=settings.job_max_retries)
+def generate_sheet_data_job(self, job_id: str, request_data: dict):
+    """Generate the reconciliation sheet tables"""
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.tasks import process_sheet_data_generation
+
+    final_attempt = self.request.retries >= self.max_retries
+    try:
+        run_async(process_sheet_data_generation(
+            job_id, GenerateSheetDataRequest(**request_data), final_attempt=final_attempt
+        ))
+    except TRANSIENT_ERRORS as exc:
+        logger.warning(f"Sheet data job {job_id} failed with a transient error, retrying: {exc}")
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+@celery_app.task(bind=True, name="uploads.cleanup_upload_files", max_retries=settings.job_max_retries)
+def cleanup_upload_files_job(self, storage_key: Optional[str], filepath: str, cache_path: Optional[str] = None):
+    """Remove a deleted upload's stored file, parse cache and error sidecar"""
+    from app.workers.tasks import cleanup_upload_files
+
+    try:
+        run_async(cleanup_upload_files(storage_key, filepath, cache_path))
+    except TRANSIENT_ERRORS as exc:
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+@celery_app.task(bind=True, name="uploads.collect_storage_garbage", max_retries=settings.job_max_retries)
+def collect_storage_garbage_job(self):
+    """Delete stored files that no upload references any more"""
+    from app.workers.tasks import collect_storage_garbage
+
+    try:
+        return run_async(collect_storage_garbage())
+    except TRANSIENT_ERRORS as exc:
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+@celery_app.task(bind=True, name="uploads.run_housekeeping", max_retries=settings.job_max_retries)
+def run_housekeeping_job(self):
+    """Apply the retention rules to uploaded files and generated reports"""
+    from app.workers.housekeeping import run_housekeeping
+
+    try:
+        return run_async(run_housekeeping())
+    except TRANSIENT_ERRORS as exc:
+        raise self.retry(exc=exc, countdown=retry_countdown(self.request.retries))
+
+
+async def enqueue_upload_processing(upload_id: int, file_path: str, upload_type: str):
+    """Queue an uploaded file for processing by a worker"""
+    # Publishing talks to the broker, so keep it off the event loop
+    await asyncio.to_thread(
+        process_upload_file_job.apply_async,
+        kwargs={"upload_id": upload_id, "file_path": file_path, "upload_type": upload_type},
+    )
+
+
+async def enqueue_sheet_data_generation(job_id: str, request_data: dict):
+    """Queue a sheet data generation job"""
+    await asyncio.to_thread(
+        generate_sheet_data_job.apply_async,
+        kwargs={"job_id": job_id, "request_data": request_data},
+        task_id=job_id,
+    )
+
+
+async def enqueue_upload_cleanup(storage_key: Optional[str], filepath: str, cache_path: Optional[str] = None):
+    """Queue removal of a deleted upload's files"""
+    await asyncio.to_thread(
+        cleanup_upload_files_job.apply_async,
+        kwargs={"storage_key": storage_key, "filepath": filepath, "cache_path": cache_path},
+    )
@@ -0,0 +1,105 @@
+"""
+Columnar cache of parsed uploads
+
+The first parse of an upload writes its normalized, typed batches to a
+Parquet file under ``{upload_dir}/cache``. Reprocessing reads that file
+(memory-mapped) instead of parsing the original spreadsheet again. Each
+cache is tagged with the parser version that produced it, and a cache from
+another version is ignored and rewritten.
+"""
+
+from app.config.settings import settings
+from typing import Dict, Iterator, Optional
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pandas as pd
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARROW_TYPES = {
+    "string": pa.string(),
+    "float": pa.float64(),
+    "datetime": pa.timestamp("ns"),
+    "date": pa.timestamp("ns"),
+}
+
+
+def cache_path_for(file_path: str, parser_version: int) -> str:
+    """Cache location for an uploaded file"""
+    name = os.path.basename(file_path)
+    return os.path.join(settings.upload_dir, "cache", f"{name}.v{parser_version}.parquet")
+
+
+def is_cache_valid(cache_path: Optional[str], cache_version: Optional[int], parser_version: int) -> bool:
+    """Whether a recorded cache can be used with the current parser"""
+    return bool(cache_path) and cache_version == parser_version and os.path.exists(cache_path)
+
+
+def remove_cache(cache_path: Optional[str]):
+    """Delete a cache file, ignoring missing files"""
+    if not cache_path:
+        return
+    try:
+        os.unlink(cache_path)
+    except FileNotFoundError:
+        pass
+
+
+def schema_for(frame: pd.DataFrame, column_types: Dict[str, str]) -> pa.Schema:
+    """Arrow schema for a parsed batch; derived columns are stored as strings"""
+    return pa.schema([
+        (name, ARROW_TYPES[column_types.get(name, "string")]) for name in frame.columns
+    ])
+
+
+class CacheWriter:
+    """Writes parsed batches to a Parquet file, published atomically on close"""
+
+    def __init__(self, cache_path: str, column_types: Dict[str, str]):
+        self.cache_path = cache_path
+        self.column_types = column_types
+        self._tmp_path = cache_path + ".tmp"
+        self._writer: Optional[pq.ParquetWriter] = None
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    def write(self, frame: pd.DataFrame):
+        if self._writer is None:
+            self._schema = schema_for(frame, self.column_types)
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression="snappy")
+        table = pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self) -> Optional[str]:
+        """Publish the cache; returns its path, or None if nothing was written"""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        os.replace(self._tmp_path, self.cache_path)
+        return self.cache_path
+
+    def abort(self):
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        remove_cache(self._tmp_path)
+
+
+def read_cache_batches(cache_path: str, batch_size: int) -> Iterator[pd.DataFrame]:
+    """Stream a cached upload as DataFrames of at most batch_size rows"""
+    parquet_file = pq.ParquetFile(cache_path, memory_map=True)
+    total_rows = parquet_file.metadata.num_rows or 1
+    rows_read = 0
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        rows_read += batch.num_rows
+        frame = batch.to_pandas()
+        frame.attrs["progress"] = rows_read / total_rows
+        yield frame
+
+
+def read_cache(cache_path: str) -> pd.DataFrame:
+    """Load a whole cached upload, for reports and reconciliation runs"""
+    return pq.read_table(cache_path, memory_map=True).to_pandas()
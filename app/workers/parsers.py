@@ -0,0 +1,689 @@
+"""
+Streaming parsers for uploaded files
+
+Every upload type registers a parser that maps the file's header row to
+canonical column names and yields typed pandas DataFrames of at most
+``batch_size`` rows. CSV/TSV files are read with pandas' chunked reader and
+XLSX files with openpyxl's read-only mode, so memory use depends on the
+batch size and not on the size of the file.
+"""
+
+from typing import Callable, Dict, Iterator, List, Optional
+import difflib
+import hashlib
+import math
+import os
+import re
+import warnings
+import logging
+
+import pandas as pd
+
+from app.workers.validation import check_batch, split_invalid
+
+logger = logging.getLogger(__name__)
+
+# Registry of parsers keyed by upload type
+PARSERS: Dict[str, "UploadParser"] = {}
+
+# Minimum similarity for a header to be fuzzy-matched to an alias
+FUZZY_HEADER_CUTOFF = 0.85
+
+
+class UnsupportedFileError(Exception):
+    """Raised when a file format cannot be parsed"""
+
+
+class MissingColumnsError(Exception):
+    """Raised when a file is missing columns its upload type requires"""
+
+    def __init__(self, upload_type: str, missing: List[str]):
+        self.upload_type = upload_type
+        self.missing = missing
+        super().__init__(f"Missing required columns for {upload_type}: {', '.join(missing)}")
+
+    def __reduce__(self):
+        # Parsers run in the process pool, so the error must survive pickling
+        return (self.__class__, (self.upload_type, self.missing))
+
+
+def normalize_header(value) -> str:
+    """Normalize a header cell to lowercase snake_case"""
+    if value is None:
+        return ""
+    return re.sub(r"[^a-z0-9]+", "_", str(value).strip().lower()).strip("_")
+
+
+def header_signature(headers: List) -> str:
+    """Hash of a normalized header row, identifying one export layout"""
+    normalized = "\x1f".join(normalize_header(header) for header in headers)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def register_parser(*upload_types: str):
+    """Class decorator registering a parser for one or more upload types"""
+    def decorator(cls):
+        for upload_type in upload_types:
+            PARSERS[upload_type] = cls(upload_type)
+        return cls
+    return decorator
+
+
+def get_parser(upload_type: str) -> "UploadParser":
+    """Get the parser registered for an upload type"""
+    try:
+        return PARSERS[upload_type]
+    except KeyError:
+        raise ValueError(f"No parser registered for upload type '{upload_type}'")
+
+
+# Column coercion
+
+def _cell_to_string(value) -> Optional[str]:
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store numeric IDs as floats
+        return str(int(value))
+    text = str(value).strip()
+    return text or None
+
+
+def to_string(series: pd.Series) -> pd.Series:
+    return series.map(_cell_to_string).astype(object)
+
+
+def to_float(series: pd.Series) -> pd.Series:
+    if series.dtype == object:
+        cleaned = series.astype("string").str.replace(r"[,\s₹]", "", regex=True)
+        return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+    return pd.to_numeric(series, errors="coerce").astype("float64")
+
+
+def to_datetime(series: pd.Series) -> pd.Series:
+    # Fast path infers one format for the whole batch; anything it could not
+    # parse gets a second, per-value attempt
+    with warnings.catch_warnings():
+        # ISO dates are still parsed correctly; pandas only warns that dayfirst was ignored
+        warnings.simplefilter("ignore", UserWarning)
+        parsed = pd.to_datetime(series, errors="coerce", dayfirst=True)
+        retry = parsed.isna() & series.notna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(series[retry], errors="coerce", dayfirst=True, format="mixed")
+    return parsed
+
+
+def to_date(series: pd.Series) -> pd.Series:
+    return to_datetime(series).dt.normalize()
+
+
+COERCERS = {
+    "string": to_string,
+    "float": to_float,
+    "datetime": to_datetime,
+    "date": to_date,
+}
+
+
+def row_hash(frame: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """Deterministic 64-bit hex hash of the given columns for each row"""
+    hashed = pd.util.hash_pandas_object(frame[columns], index=False)
+    return hashed.map("{:016x}".format)
+
+
+def frame_to_records(frame: pd.DataFrame, column_types: Dict[str, str]) -> List[dict]:
+    """Convert a typed batch into plain Python dicts suitable for the database driver"""
+    converted = {}
+    for name in frame.columns:
+        kind = column_types.get(name)
+        series = frame[name]
+        if kind == "date":
+            values = [value.date() if value is not pd.NaT else None for value in series.dt.to_pydatetime()]
+        elif kind == "datetime":
+            values = [value if value is not pd.NaT else None for value in series.dt.to_pydatetime()]
+        elif kind == "float":
+            values = [None if math.isnan(value) else value for value in series.tolist()]
+        else:
+            values = series.tolist()
+        converted[name] = values
+    names = list(converted)
+    return [dict(zip(names, row)) for row in zip(*converted.values())]
+
+
+class UploadParser:
+    """Base class for upload parsers
+
+    Subclasses declare the target ``model``, which database it lives in,
+    the canonical ``columns`` with their types and the header ``aliases``
+    vendors use for each canonical column.
+    """
+
+    model = None
+    database = "sso"
+    columns: Dict[str, str] = {}
+    aliases: Dict[str, List[str]] = {}
+    required: List[str] = []
+    # Set to a unique column to load with upserts keyed on it instead of plain inserts
+    upsert_key: Optional[str] = None
+    # Bump whenever parsed output changes so cached parses are rebuilt
+    version: int = 2
+    # Per-store, per-day totals kept in store_daily_rollup: the rollup source
+    # name, the store and date columns, and the column summed for each measure
+    rollup: Optional[Dict] = None
+
+    def __init__(self, upload_type: str):
+        self.upload_type = upload_type
+        self._lookup = {}
+        for canonical in self.columns:
+            for alias in [canonical] + self.aliases.get(canonical, []):
+                self._lookup.setdefault(normalize_header(alias), canonical)
+
+    def resolve_columns(self, headers: List) -> Dict[int, str]:
+        """Map header positions to canonical column names
+
+        Headers are matched exactly against the canonical names and their
+        aliases first; any left over are then fuzzy-matched against the
+        aliases of canonical columns not yet taken.
+        """
+        normalized = [normalize_header(header) for header in headers]
+        mapping = {}
+        unmatched = []
+        for position, name in enumerate(normalized):
+            canonical = self._lookup.get(name)
+            if canonical is None:
+                if name:
+                    unmatched.append(position)
+            elif canonical not in mapping.values():
+                mapping[position] = canonical
+
+        if unmatched:
+            candidates = {alias: canonical for alias, canonical in self._lookup.items()
+                          if canonical not in mapping.values()}
+            for position in unmatched:
+                match = difflib.get_close_matches(normalized[position], list(candidates), n=1,
+                                                  cutoff=FUZZY_HEADER_CUTOFF)
+                if match:
+                    canonical = candidates[match[0]]
+                    mapping[position] = canonical
+                    candidates = {alias: name for alias, name in candidates.items() if name != canonical}
+
+        missing = [name for name in self.required if name not in mapping.values()]
+        if missing:
+            raise MissingColumnsError(self.upload_type, missing)
+        return dict(sorted(mapping.items()))
+
+    def columns_for(self, headers: List, known: Optional[Dict[str, Dict[int, str]]] = None,
+                    on_mapping: Optional[Callable[[str, List, Dict[int, str], bool], None]] = None) -> Dict[int, str]:
+        """Column mapping for a header row, reusing a known mapping for its signature
+
+        known maps header signatures to mappings resolved for earlier files.
+        on_mapping, if given, receives the signature, the headers, the mapping
+        and whether it was newly resolved.
+        """
+        signature = header_signature(headers)
+        mapping = (known or {}).get(signature)
+        learned = mapping is None or any(name not in mapping.values() for name in self.required)
+        if learned:
+            mapping = self.resolve_columns(headers)
+        if on_mapping is not None:
+            on_mapping(signature, [_cell_to_string(header) for header in headers], mapping, learned)
+        return mapping
+
+    def coerce(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Coerce raw columns to their declared types, adding missing ones as nulls"""
+        typed = {}
+        for name, kind in self.columns.items():
+            if name in frame:
+                raw = frame[name]
+            else:
+                raw = pd.Series([None] * len(frame), index=frame.index, dtype=object)
+            typed[name] = COERCERS[kind](raw)
+        return pd.DataFrame(typed, index=frame.index)
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Hook for derived columns, applied after coercion"""
+        return frame
+
+    def validate(self, raw: pd.DataFrame, typed: pd.DataFrame) -> Dict[str, pd.Series]:
+        """Masks of rows failing each check; extend to add per-type rules"""
+        return check_batch(raw, typed, self.columns, self.required)
+
+    def iter_batches(self, file_path: str, batch_size: int, filetype: Optional[str] = None,
+                     on_rejected: Optional[Callable[[pd.DataFrame], None]] = None,
+                     known_mappings: Optional[Dict[str, Dict[int, str]]] = None,
+                     on_mapping: Optional[Callable] = None) -> Iterator[pd.DataFrame]:
+        """Stream the file as typed batches of at most batch_size rows
+
+        Rows failing validation are removed; on_rejected, if given, receives
+        a report of them per batch (source row number, reasons, raw values).
+        The header row is mapped with ``columns_for``, passing known_mappings
+        and on_mapping through.
+        Each batch carries ``attrs["progress"]``, the approximate fraction
+        of the file read so far (None when it cannot be estimated).
+        """
+        file_ext = (filetype or os.path.splitext(file_path)[1]).lower()
+
+        def map_columns(headers):
+            return self.columns_for(headers, known_mappings, on_mapping)
+
+        if file_ext == ".csv":
+            raw_batches = self._iter_delimited(file_path, batch_size, ",", map_columns)
+        elif file_ext == ".tsv":
+            raw_batches = self._iter_delimited(file_path, batch_size, "\t", map_columns)
+        elif file_ext == ".xlsx":
+            raw_batches = self._iter_xlsx(file_path, batch_size, map_columns)
+        elif file_ext == ".xls":
+            raw_batches = self._iter_xls(file_path, batch_size, map_columns)
+        else:
+            raise UnsupportedFileError(f"Unsupported file type: {file_ext}")
+
+        for frame in raw_batches:
+            if frame.empty:
+                continue
+            typed = self.coerce(frame)
+            typed, rejected = split_invalid(frame, typed, self.validate(frame, typed))
+            if rejected is not None and on_rejected is not None:
+                on_rejected(rejected)
+            if typed.empty:
+                continue
+            batch = self.transform(typed)
+            # Fraction of the input consumed so far, for progress reporting
+            batch.attrs["progress"] = frame.attrs.get("progress")
+            yield batch
+
+    def _select(self, frame: pd.DataFrame, mapping: Dict[int, str]) -> pd.DataFrame:
+        selected = frame.iloc[:, list(mapping)]
+        selected.columns = list(mapping.values())
+        return selected
+
+    def _iter_delimited(self, file_path: str, batch_size: int, sep: str,
+                        map_columns: Callable[[List], Dict[int, str]]) -> Iterator[pd.DataFrame]:
+        file_size = os.path.getsize(file_path) or 1
+        handle = open(file_path, "rb")
+        reader = pd.read_csv(
+            handle,
+            sep=sep,
+            dtype=str,
+            chunksize=batch_size,
+            keep_default_na=False,
+            na_values=[""],
+            skip_blank_lines=True,
+            encoding_errors="replace",
+        )
+        mapping = None
+        with handle, reader:
+            for chunk in reader:
+                if mapping is None:
+                    mapping = map_columns(list(chunk.columns))
+                selected = self._select(chunk, mapping)
+                # Index by source line so rejected rows can be traced back
+                selected.index = selected.index + 2
+                # The reader buffers ahead, so this slightly overestimates
+                selected.attrs["progress"] = min(handle.tell() / file_size, 1.0)
+                yield selected
+
+    def _iter_xlsx(self, file_path: str, batch_size: int,
+                   map_columns: Callable[[List], Dict[int, str]]) -> Iterator[pd.DataFrame]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            # max_row comes from the sheet's dimension record, which some writers omit
+            total_rows = sheet.max_row or None
+            rows = sheet.iter_rows(values_only=True)
+
+            mapping = None
+            rows_read = 0
+            for row in rows:
+                rows_read += 1
+                if any(value not in (None, "") for value in row):
+                    mapping = map_columns(list(row))
+                    break
+            if mapping is None:
+                return
+
+            positions = list(mapping)
+            names = list(mapping.values())
+
+            def make_frame(batch, row_numbers, rows_read):
+                frame = pd.DataFrame(batch, columns=names, index=row_numbers, dtype=object)
+                frame.attrs["progress"] = min(rows_read / total_rows, 1.0) if total_rows else None
+                return frame
+
+            batch = []
+            row_numbers = []
+            for row in rows:
+                rows_read += 1
+                if not any(value not in (None, "") for value in row):
+                    continue
+                batch.append([row[p] if p < len(row) else None for p in positions])
+                row_numbers.append(rows_read)
+                if len(batch) >= batch_size:
+                    yield make_frame(batch, row_numbers, rows_read)
+                    batch = []
+                    row_numbers = []
+            if batch:
+                yield make_frame(batch, row_numbers, rows_read)
+        finally:
+            workbook.close()
+
+    def _iter_xls(self, file_path: str, batch_size: int,
+                  map_columns: Callable[[List], Dict[int, str]]) -> Iterator[pd.DataFrame]:
+        # Legacy .xls sheets are capped at 65,536 rows, so reading the sheet
+        # in one go is bounded; it is then emitted in batches like the others
+        frame = pd.read_excel(file_path, dtype=object)
+        mapping = map_columns(list(frame.columns))
+        frame = self._select(frame, mapping)
+        frame.index = frame.index + 2
+        for start in range(0, len(frame), batch_size):
+            batch = frame.iloc[start:start + batch_size]
+            batch.attrs["progress"] = min(start + batch_size, len(frame)) / len(frame)
+            yield batch
+
+
+# Order parsers
+
+ORDER_COLUMNS = {
+    "order_id": "string",
+    "store_code": "string",
+    "customer_name": "string",
+    "order_amount": "float",
+    "tax_amount": "float",
+    "order_date": "datetime",
+    "status": "string",
+    "payment_method": "string",
+}
+
+
+@register_parser("orders")
+class OrdersParser(UploadParser):
+    """POS order export"""
+
+    database = "main"
+    columns = ORDER_COLUMNS
+    aliases = {
+        "order_id": ["order_no", "order_number", "bill_no", "bill_number", "invoice_no", "pos_order_id"],
+        "store_code": ["store", "store_id", "outlet_code", "branch_code"],
+        "customer_name": ["customer", "name"],
+        "order_amount": ["amount", "net_amount", "total", "bill_amount", "sub_total"],
+        "tax_amount": ["tax", "gst", "total_tax"],
+        "order_date": ["date", "order_datetime", "bill_date", "business_date", "created_at"],
+        "status": ["order_status"],
+        "payment_method": ["payment_mode", "payment_type", "tender", "tender_name"],
+    }
+    required = ["order_id"]
+    upsert_key = "order_id"
+    rollup = {
+        "source": "pos",
+        "store": "store_code",
+        "date": "order_date",
+        "measures": {"gross_amount": "order_amount", "tax_amount": "tax_amount"},
+    }
+
+    @property
+    def model(self):
+        from app.models.main.orders import Orders
+        return Orders
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        # Overlapping exports repeat orders; keep the last copy of each
+        frame = frame.drop_duplicates("order_id", keep="last").copy()
+        frame["content_hash"] = row_hash(frame, list(ORDER_COLUMNS))
+        return frame
+
+
+@register_parser("pizzahut_orders")
+class PizzahutOrdersParser(OrdersParser):
+    """Pizza Hut POS order export"""
+
+    aliases = {
+        "order_id": ["order_no", "ph_order_id", "transaction_id", "check_number", "receipt_no"],
+        "store_code": ["store_number", "restaurant_code", "outlet", "store"],
+        "customer_name": ["customer", "guest_name"],
+        "order_amount": ["net_sales", "net_amount", "gross_sales", "total_amount"],
+        "tax_amount": ["tax", "gst"],
+        "order_date": ["business_date", "order_date_time", "date"],
+        "status": ["order_status", "check_status"],
+        "payment_method": ["payment_type", "tender_type"],
+    }
+
+
+# Card terminal transaction parsers
+
+@register_parser("trm", "transactions")
+class TrmParser(UploadParser):
+    """Terminal transaction report"""
+
+    columns = {
+        "uid": "string",
+        "zone": "string",
+        "store_name": "string",
+        "city": "string",
+        "pos": "string",
+        "hardware_model": "string",
+        "hardware_id": "string",
+        "acquirer": "string",
+        "tid": "string",
+        "mid": "string",
+        "batch_no": "string",
+        "transaction_date": "date",
+        "transaction_time": "string",
+        "card_number": "string",
+        "transaction_type": "string",
+        "amount": "float",
+        "currency": "string",
+        "auth_code": "string",
+        "rrn": "string",
+        "status": "string",
+    }
+    aliases = {
+        "store_name": ["store", "store_code", "outlet"],
+        "pos": ["pos_id", "pos_name"],
+        "hardware_model": ["device_model"],
+        "hardware_id": ["device_id", "serial_number"],
+        "tid": ["terminal_id"],
+        "mid": ["merchant_id"],
+        "batch_no": ["batch", "batch_number"],
+        "transaction_date": ["txn_date", "date", "transaction_date_time"],
+        "transaction_time": ["txn_time", "time"],
+        "card_number": ["card_no", "masked_card_number", "pan"],
+        "transaction_type": ["txn_type", "type"],
+        "amount": ["txn_amount", "transaction_amount"],
+        "auth_code": ["approval_code", "auth_id"],
+        "rrn": ["reference_no", "retrieval_reference_number"],
+        "status": ["txn_status", "transaction_status"],
+    }
+    required = ["transaction_date", "amount"]
+    key_columns = ["tid", "batch_no", "rrn", "auth_code", "transaction_date", "transaction_time", "amount"]
+    rollup = {
+        "source": "trm",
+        "store": "store_name",
+        "date": "transaction_date",
+        "measures": {"gross_amount": "amount"},
+    }
+
+    @property
+    def model(self):
+        from app.models.sso.reconciliation import Trm
+        return Trm
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        derived = row_hash(frame, self.key_columns)
+        frame["uid"] = frame["uid"].where(frame["uid"].notna(), derived)
+        return frame
+
+
+# HDFC merchant payment report parsers
+
+MPR_COLUMNS = {
+    "uid": "string",
+    "channel": "string",
+    "store_code": "string",
+    "mid": "string",
+    "tid": "string",
+    "rrn": "string",
+    "auth_code": "string",
+    "card_number": "string",
+    "payment_mode": "string",
+    "transaction_date": "date",
+    "settlement_date": "date",
+    "gross_amount": "float",
+    "commission": "float",
+    "gst": "float",
+    "net_amount": "float",
+}
+
+
+@register_parser("mpr_hdfc_card")
+class MprHdfcCardParser(UploadParser):
+    """HDFC card merchant payment report"""
+
+    channel = "card"
+    columns = MPR_COLUMNS
+    aliases = {
+        "store_code": ["store", "outlet_code"],
+        "mid": ["merchant_id", "me_code", "merchant_code"],
+        "tid": ["terminal_id", "tid_no"],
+        "rrn": ["rrn_no", "arn", "reference_no"],
+        "auth_code": ["approval_code", "app_code", "auth_id"],
+        "card_number": ["card_no", "masked_card_no"],
+        "payment_mode": ["card_type", "network", "card_network"],
+        "transaction_date": ["txn_date", "tran_date", "transaction_dt"],
+        "settlement_date": ["sett_date", "settle_date", "payment_date"],
+        "gross_amount": ["amount", "txn_amount", "transaction_amount"],
+        "commission": ["mdr", "msf", "commission_amount", "comm"],
+        "gst": ["gst_amount", "service_tax", "igst"],
+        "net_amount": ["net_amt", "settlement_amount", "payout_amount"],
+    }
+    required = ["transaction_date", "gross_amount"]
+    key_columns = ["channel", "mid", "tid", "rrn", "auth_code", "transaction_date", "gross_amount"]
+    rollup = {
+        "source": "mpr_card",
+        "store": "store_code",
+        "date": "transaction_date",
+        "measures": {
+            "gross_amount": "gross_amount",
+            "net_amount": "net_amount",
+            "tax_amount": "gst",
+            "commission": "commission",
+        },
+    }
+
+    @property
+    def model(self):
+        from app.models.sso.reconciliation import MprHdfc
+        return MprHdfc
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        frame["channel"] = self.channel
+        derived = row_hash(frame, self.key_columns)
+        frame["uid"] = frame["uid"].where(frame["uid"].notna(), derived)
+        return frame
+
+
+@register_parser("mpr_hdfc_upi")
+class MprHdfcUpiParser(MprHdfcCardParser):
+    """HDFC UPI merchant payment report"""
+
+    channel = "upi"
+    rollup = {**MprHdfcCardParser.rollup, "source": "mpr_upi"}
+    aliases = {
+        "store_code": ["store", "outlet_code"],
+        "mid": ["merchant_id", "external_mid"],
+        "tid": ["terminal_id", "external_tid"],
+        "rrn": ["upi_transaction_id", "utr", "utr_no", "txn_ref_no"],
+        "auth_code": ["approval_code"],
+        "card_number": ["payer_vpa", "vpa", "customer_vpa"],
+        "payment_mode": ["payment_type", "transaction_type"],
+        "transaction_date": ["txn_date", "transaction_req_date", "transaction_datetime"],
+        "settlement_date": ["sett_date", "settled_on"],
+        "gross_amount": ["transaction_amount", "amount", "txn_amount"],
+        "commission": ["msf_amount", "mdr", "commission_amount"],
+        "gst": ["gst_amount", "cgst_sgst"],
+        "net_amount": ["settled_amount", "net_amt"],
+    }
+
+
+# Zomato settlement parser
+
+@register_parser("reconciliation")
+class ZomatoSettlementParser(UploadParser):
+    """Zomato (3PO) settlement report used for POS reconciliation"""
+
+    columns = {
+        "id": "string",
+        "order_id": "string",
+        "pos_order_id": "string",
+        "store_code": "string",
+        "order_date": "datetime",
+        "action": "string",
+        "order_status": "string",
+        "net_amount": "float",
+        "tax_paid_by_customer": "float",
+        "commission_value": "float",
+        "pg_applied_on": "float",
+        "pg_charge": "float",
+        "taxes_zomato_fee": "float",
+        "tds_amount": "float",
+        "final_amount": "float",
+        "credit_note_amount": "float",
+        "pro_discount_passthrough": "float",
+        "customer_discount": "float",
+        "rejection_penalty_charge": "float",
+        "user_credits_charge": "float",
+        "promo_recovery_adj": "float",
+        "icecream_handling": "float",
+        "icecream_deductions": "float",
+        "order_support_cost": "float",
+        "merchant_delivery_charge": "float",
+    }
+    aliases = {
+        "order_id": ["zomato_order_id", "order_no"],
+        "pos_order_id": ["merchant_order_id", "restaurant_order_id"],
+        "store_code": ["res_id", "restaurant_id", "store", "outlet_code"],
+        "order_date": ["order_datetime", "date", "order_placed_at"],
+        "action": ["type", "order_type"],
+        "order_status": ["status"],
+        "net_amount": ["bill_subtotal", "subtotal", "order_value", "net_bill_value"],
+        "tax_paid_by_customer": ["taxes", "gst_paid_by_customer", "tax"],
+        "commission_value": ["commission", "service_fee"],
+        "pg_applied_on": ["payment_gateway_applied_on", "pg_base"],
+        "pg_charge": ["payment_gateway_fee", "pg_fee", "payment_mechanism_fee"],
+        "taxes_zomato_fee": ["tax_on_service_fee", "gst_on_zomato_fee", "taxes_on_zomato_fees"],
+        "tds_amount": ["tds", "tds_194o"],
+        "final_amount": ["net_payout", "payout", "order_level_payout", "settlement_amount"],
+        "credit_note_amount": ["credit_note"],
+        "pro_discount_passthrough": ["pro_discount"],
+        "customer_discount": ["restaurant_discount", "merchant_discount"],
+        "rejection_penalty_charge": ["rejection_penalty"],
+        "user_credits_charge": ["user_credits"],
+        "promo_recovery_adj": ["promo_recovery"],
+        "order_support_cost": ["support_cost"],
+        "merchant_delivery_charge": ["delivery_charge"],
+    }
+    required = ["order_id"]
+    rollup = {
+        "source": "zomato",
+        "store": "store_code",
+        "date": "order_date",
+        "measures": {
+            "gross_amount": "net_amount",
+            "net_amount": "final_amount",
+            "tax_amount": "tax_paid_by_customer",
+            "commission": "commission_value",
+            "pg_charge": "pg_charge",
+            "tds_amount": "tds_amount",
+        },
+    }
+
+    @property
+    def model(self):
+        from app.models.sso.reconciliation import ZomatoOrder
+        return ZomatoOrder
+
+    def transform(self, frame: pd.DataFrame) -> pd.DataFrame:
+        frame["action"] = frame["action"].fillna("sale").str.lower()
+        derived = row_hash(frame, ["order_id", "action"])
+        frame["id"] = frame["id"].where(frame["id"].notna(), derived)
+        return frame
@@ -0,0 +1,109 @@
+"""
+Process pool for CPU-bound work
+
+Parsing spreadsheets, building DataFrames and writing Excel reports hold the
+GIL, so running them on the event loop (or in a thread) stalls every other
+request. ``process_pool.run`` executes a picklable function in a separate
+process and awaits the result without blocking the loop.
+
+Inside daemonic processes (Celery prefork workers) child processes cannot be
+created; there the work runs in a thread instead. That is fine for uploads,
+which prefork already spreads across processes, but it leaves sheet
+generation on one core, so the reconciliation queue is served by a
+``--pool threads`` worker (see ``celery_app``), whose main process can
+start the pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app.config.settings import settings
+from typing import Callable, Optional
+import asyncio
+import multiprocessing
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def warmup() -> int:
+    """Import the heavy modules once so the first real task starts quickly"""
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    import app.workers.parsers  # noqa: F401
+    import app.workers.columnar  # noqa: F401
+    return multiprocessing.current_process().pid
+
+
+class ProcessPoolManager:
+    """Lazily created, restartable ProcessPoolExecutor"""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = 0
+        self._warned_daemon = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._executor is not None
+
+    def start(self, workers: Optional[int] = None):
+        """Create the executor; does nothing if it is already running or disabled"""
+        if self._executor is not None:
+            return
+        workers = settings.process_pool_workers if workers is None else workers
+        if workers <= 0:
+            logger.info("Process pool disabled, CPU-bound work will run in threads")
+            return
+        if multiprocessing.current_process().daemon:
+            if self._warned_daemon:
+                return
+            self._warned_daemon = True
+            logger.warning("Process pool unavailable in a daemonic process (a Celery prefork child), "
+                           "CPU-bound work will run in threads; serve CPU-heavy queues with --pool threads")
+            return
+
+        # spawn avoids forking a process that holds an event loop and DB connections
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=settings.process_pool_max_tasks_per_child or None,
+        )
+        self._workers = workers
+        logger.info(f"Process pool started with {workers} workers")
+
+    async def warmup(self):
+        """Start every worker process and pre-import parsing libraries"""
+        self.start()
+        if self._executor is None:
+            return
+        pids = await asyncio.gather(*(self.run(warmup) for _ in range(self._workers)))
+        logger.info(f"Process pool warmed up ({len(set(pids))} processes)")
+
+    def submit(self, fn: Callable, *args) -> asyncio.Future:
+        """Schedule fn(*args) and return an awaitable future"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            return asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        return loop.run_in_executor(self._executor, fn, *args)
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) in the pool and return its result"""
+        try:
+            return await self.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next caller
+            logger.error("Process pool broken, restarting")
+            self.shutdown(wait=False)
+            raise
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes"""
+        if self._executor is None:
+            return
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=wait, cancel_futures=True)
+        logger.info("Process pool shut down")
+
+
+process_pool = ProcessPoolManager()
@@ -0,0 +1,158 @@
+"""
+Per-organization Zomato rate cards for the expected-amount formulas
+
+Each organization has rate cards (``ZomatoRateCard``) that take effect on
+a date, optionally for a single store. A ``RateTable`` holds one
+organization's cards and resolves the card in force for every order of a
+partition at once: ``lookup`` returns one rate array per field, which
+``expected_charges`` broadcasts against the amount arrays, so a whole
+month of ``calculated_zomato_*`` and ``pos_*`` columns is a handful of
+NumPy operations. The SQL engine gets the same resolution as correlated
+subqueries (``rate_columns``).
+
+Saving a card marks every Zomato store-day it can affect as dirty, so the
+next incremental sheet generation recomputes them with the new rates.
+"""
+
+from sqlalchemy import DateTime, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.settings import settings
+from datetime import date, datetime
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATE_FIELDS = ["commission_rate", "pg_rate", "fee_gst_rate", "tds_rate"]
+
+# Rollup source of the Zomato store-days a rate change invalidates
+RATED_SOURCE = "zomato"
+
+
+def default_rates() -> Dict[str, float]:
+    """Zomato charge rates from settings"""
+    return {
+        "commission_rate": settings.zomato_commission_rate,
+        "pg_rate": settings.zomato_pg_rate,
+        "fee_gst_rate": settings.zomato_fee_gst_rate,
+        "tds_rate": settings.zomato_tds_rate,
+    }
+
+
+class RateTable:
+    """One organization's rate cards, resolved for many orders at once
+
+    cards has a ``store_code`` (None for organization-wide cards), an
+    ``effective_from`` date and the RATE_FIELDS; orders no card covers get
+    the defaults.
+    """
+
+    def __init__(self, organization_id: int, cards: pd.DataFrame, defaults: Dict[str, float]):
+        self.organization_id = organization_id
+        self.defaults = defaults
+        cards = cards.assign(effective_from=pd.to_datetime(cards["effective_from"]).astype("datetime64[ns]"))
+        cards = cards.sort_values("effective_from", kind="stable")
+        self.wide = cards[cards["store_code"].isna()]
+        self.by_store = cards[cards["store_code"].notna()]
+
+    def __len__(self):
+        return len(self.wide) + len(self.by_store)
+
+    def lookup(self, store_codes: np.ndarray, order_times: np.ndarray) -> Dict[str, np.ndarray]:
+        """Rates in force for each order, as one array per field"""
+        rates = {name: np.full(len(store_codes), value, dtype=np.float64) for name, value in self.defaults.items()}
+        if not len(self) or not len(store_codes):
+            return rates
+        orders = pd.DataFrame({
+            "store_code": pd.Series(store_codes, dtype=object).fillna(""),
+            "day": pd.to_datetime(order_times).normalize().astype("datetime64[ns]"),
+            "row": np.arange(len(store_codes)),
+        }).dropna(subset=["day"]).sort_values("day", kind="stable")
+        # Organization-wide cards first, so that a store's own card overrides them
+        for cards, by in ((self.wide, None), (self.by_store, "store_code")):
+            if cards.empty:
+                continue
+            merged = pd.merge_asof(
+                orders, cards.drop(columns=[] if by else ["store_code"]),
+                left_on="day", right_on="effective_from", by=by, direction="backward",
+            ).dropna(subset=["effective_from"])
+            rows = merged["row"].to_numpy()
+            for name in RATE_FIELDS:
+                rates[name][rows] = merged[name].to_numpy(dtype=np.float64)
+        return rates
+
+
+async def load_rate_table(db: AsyncSession, organization_id: Optional[int] = None) -> RateTable:
+    """Rate table of an organization, the configured one by default"""
+    from app.models.sso.zomato_rate_card import ZomatoRateCard
+
+    organization_id = organization_id or settings.organization_id
+    cards = await ZomatoRateCard.get_by_organization(db, organization_id)
+    frame = pd.DataFrame(
+        [[card.store_code, card.effective_from, *[float(getattr(card, name)) for name in RATE_FIELDS]]
+         for card in cards],
+        columns=["store_code", "effective_from"] + RATE_FIELDS,
+    )
+    return RateTable(organization_id, frame, default_rates())
+
+
+def rate_columns(table: RateTable, store_column, day_column) -> Dict[str, object]:
+    """SQL expressions for the rates in force for a row, like ``RateTable.lookup``"""
+    from app.models.sso.zomato_rate_card import ZomatoRateCard
+
+    if not len(table):
+        return {name: literal(value) for name, value in table.defaults.items()}
+    columns = {}
+    for name in RATE_FIELDS:
+        in_force = (
+            select(getattr(ZomatoRateCard, name))
+            .where(
+                ZomatoRateCard.organization_id == table.organization_id,
+                (ZomatoRateCard.store_code == store_column) | ZomatoRateCard.store_code.is_(None),
+                ZomatoRateCard.effective_from <= day_column,
+            )
+            # A store's own card before the organization's, then the latest
+            .order_by(ZomatoRateCard.store_code.is_(None), ZomatoRateCard.effective_from.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        columns[name] = func.coalesce(in_force, literal(table.defaults[name]))
+    return columns
+
+
+async def save_rate_card(db: AsyncSession, organization_id: int, effective_from: date,
+                         rates: Dict[str, float], store_code: Optional[str] = None,
+                         created_by: Optional[str] = None):
+    """Add a rate card and mark the Zomato store-days it affects dirty; returns (card, days marked)"""
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.models.sso.zomato_rate_card import ZomatoRateCard
+    from app.workers.rollup import mark_dirty_statement
+
+    try:
+        card = ZomatoRateCard(organization_id=organization_id, store_code=store_code,
+                              effective_from=effective_from, created_by=created_by, **rates)
+        db.add(card)
+
+        # Every ingested store-day from the card's date on, even ones a later card still governs
+        affected = select(
+            StoreDailyRollup.source, StoreDailyRollup.store_code, StoreDailyRollup.business_date,
+            literal(datetime.utcnow(), DateTime).label("marked_at"),
+        ).where(
+            StoreDailyRollup.source == RATED_SOURCE,
+            StoreDailyRollup.business_date >= effective_from,
+        )
+        if store_code:
+            affected = affected.where(StoreDailyRollup.store_code == store_code)
+        result = await db.execute(mark_dirty_statement(db.bind.dialect.name, DirtyPartition.__table__, affected))
+        await db.commit()
+        await db.refresh(card)
+        logger.info(f"Rate card {card.id} for organization {organization_id} marked {result.rowcount} store-days")
+        return card, max(result.rowcount, 0)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error saving Zomato rate card: {e}")
+        raise
+
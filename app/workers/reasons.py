@@ -0,0 +1,230 @@
+"""
+Rule-based reasons for reconciliation differences
+
+Each sheet kind has an ordered list of rules. A rule names a reason, the
+``reconciled_status`` it implies and a list of conditions that must all
+hold; every row gets the first rule it satisfies, or
+``FALLBACK_REASON`` (unreconciled) if none does. Rules are data, so the
+same list is evaluated two ways: ``classify`` turns each rule into a
+boolean mask over whole NumPy arrays and picks the first match with
+``np.select``, and ``classify_sql`` turns it into a ``CASE`` expression
+for the SQL engine.
+
+A condition is ``[field, operator, value]``. For matched orders the fields
+are the AMOUNT_FIELDS, meaning the POS minus Zomato delta of that amount;
+``"*"`` stands for all of them and ``"others"`` for those not named
+elsewhere in the rule, except ``final_amount``, which any difference
+flows into. Refund rows have the ``net_amount`` delta (refunded minus
+POS order value) and ``pos_order_id``. Numeric operators are ``abs<=``,
+``abs>``, ``<``, ``<=``, ``>``, ``>=``, ``==`` and ``!=``; the value is a
+number or ``"tolerance"`` (``reconciliation_tolerance``). ``missing`` and
+``present`` take no value.
+
+Organizations can replace the rules of any sheet kind
+(``ReconciliationReasonRules``); kinds they leave out keep the defaults.
+"""
+
+from sqlalchemy import and_, case, func, literal, null, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.settings import settings
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+RECONCILED = "reconciled"
+UNRECONCILED = "unreconciled"
+
+# Settlement amounts compared field by field, in sheet column order
+AMOUNT_FIELDS = [
+    "net_amount",
+    "tax_paid_by_customer",
+    "commission_value",
+    "pg_applied_on",
+    "pg_charge",
+    "taxes_zomato_fee",
+    "tds_amount",
+    "final_amount",
+]
+
+# Fields the rules of each sheet kind may test
+SHEET_FIELDS = {
+    "matched": AMOUNT_FIELDS,
+    "refund": ["net_amount", "pos_order_id"],
+    "not_in_pos": [],
+    "not_in_3po": [],
+}
+
+NUMERIC_OPERATORS = ("abs<=", "abs>", "<", "<=", ">", ">=", "==", "!=")
+PRESENCE_OPERATORS = ("missing", "present")
+
+FALLBACK_REASON = "Unexplained difference"
+
+DEFAULT_REASON_RULES = {
+    "matched": [
+        {"reason": None, "status": RECONCILED, "when": [["*", "abs<=", 0]]},
+        {"reason": "TDS rounding within 1 rupee", "status": RECONCILED,
+         "when": [["tds_amount", "abs>", 0], ["tds_amount", "abs<=", 1], ["final_amount", "abs<=", 1],
+                  ["others", "abs<=", 0]]},
+        {"reason": "Within tolerance", "status": RECONCILED, "when": [["final_amount", "abs<=", "tolerance"]]},
+        {"reason": "Commission delta only", "status": UNRECONCILED,
+         "when": [["commission_value", "abs>", 0], ["others", "abs<=", 0]]},
+        {"reason": "Order value differs", "status": UNRECONCILED, "when": [["net_amount", "abs>", 0]]},
+        {"reason": "Customer tax differs", "status": UNRECONCILED, "when": [["tax_paid_by_customer", "abs>", 0]]},
+        {"reason": "Commission differs", "status": UNRECONCILED, "when": [["commission_value", "abs>", 0]]},
+        {"reason": "PG charge differs", "status": UNRECONCILED, "when": [["pg_charge", "abs>", 0]]},
+        {"reason": "Taxes on Zomato fee differ", "status": UNRECONCILED,
+         "when": [["taxes_zomato_fee", "abs>", 0]]},
+        {"reason": "TDS differs", "status": UNRECONCILED, "when": [["tds_amount", "abs>", 0]]},
+        {"reason": "Short payment", "status": UNRECONCILED, "when": [["final_amount", ">", 0]]},
+        {"reason": "Excess payment", "status": UNRECONCILED, "when": [["final_amount", "<", 0]]},
+    ],
+    "refund": [
+        {"reason": "Refund not in POS", "status": UNRECONCILED, "when": [["pos_order_id", "missing"]]},
+        {"reason": "Full refund", "status": RECONCILED, "when": [["net_amount", "abs<=", "tolerance"]]},
+        {"reason": "Partial refund", "status": UNRECONCILED, "when": [["net_amount", "<", 0]]},
+        {"reason": "Refund exceeds order value", "status": UNRECONCILED, "when": [["net_amount", ">", 0]]},
+    ],
+    "not_in_pos": [
+        {"reason": "Order not in POS", "status": UNRECONCILED, "when": []},
+    ],
+    "not_in_3po": [
+        {"reason": "Order not in Zomato", "status": UNRECONCILED, "when": []},
+    ],
+}
+
+
+def validate_rules(rules: Dict[str, List[dict]]) -> Dict[str, List[dict]]:
+    """Check an organization's rules; raises ValueError naming the first problem"""
+    if not isinstance(rules, dict):
+        raise ValueError("Rules must map sheet kinds to lists of rules")
+    for kind, kind_rules in rules.items():
+        if kind not in SHEET_FIELDS:
+            raise ValueError(f"Unknown sheet kind '{kind}'. Must be one of: {', '.join(SHEET_FIELDS)}")
+        if not isinstance(kind_rules, list):
+            raise ValueError(f"Rules for '{kind}' must be a list")
+        fields = set(SHEET_FIELDS[kind]) | ({"*", "others"} if kind == "matched" else set())
+        for position, rule in enumerate(kind_rules, 1):
+            where = f"{kind} rule {position}"
+            if not isinstance(rule, dict) or rule.get("status") not in (RECONCILED, UNRECONCILED):
+                raise ValueError(f"{where} needs a status of '{RECONCILED}' or '{UNRECONCILED}'")
+            if rule.get("reason") is not None and not isinstance(rule["reason"], str):
+                raise ValueError(f"{where} has a reason that is not text")
+            for condition in rule.get("when", []):
+                if not isinstance(condition, list) or not condition or condition[0] not in fields:
+                    raise ValueError(f"{where} tests an unknown field: {condition}")
+                field, operator, *value = condition
+                if operator in PRESENCE_OPERATORS:
+                    if value:
+                        raise ValueError(f"{where}: '{operator}' takes no value")
+                elif operator in NUMERIC_OPERATORS:
+                    if field == "pos_order_id" or len(value) != 1 or not (
+                            value[0] == "tolerance" or isinstance(value[0], (int, float))):
+                        raise ValueError(f"{where}: '{operator}' needs an amount field and a number")
+                else:
+                    raise ValueError(f"{where} has an unknown operator '{operator}'")
+    return rules
+
+
+def rules_with_defaults(rules: Optional[Dict[str, List[dict]]]) -> Dict[str, List[dict]]:
+    """An organization's rules, with the defaults for kinds it does not override"""
+    return {**DEFAULT_REASON_RULES, **(rules or {})}
+
+
+class _NumpyOps:
+    abs = staticmethod(np.abs)
+    missing = staticmethod(pd.isna)
+    present = staticmethod(pd.notna)
+
+    @staticmethod
+    def all(masks, rows):
+        return np.logical_and.reduce(masks) if masks else np.ones(rows, dtype=bool)
+
+
+class _SqlOps:
+    abs = staticmethod(func.abs)
+
+    @staticmethod
+    def missing(column):
+        return column.is_(None)
+
+    @staticmethod
+    def present(column):
+        return column.isnot(None)
+
+    @staticmethod
+    def all(masks, rows):
+        return and_(*masks) if masks else true()
+
+
+def _condition(ops, column, operator: str, value, tolerance: float):
+    if operator in PRESENCE_OPERATORS:
+        return getattr(ops, operator)(column)
+    value = tolerance if value == "tolerance" else value
+    if operator == "abs<=":
+        return ops.abs(column) <= value
+    if operator == "abs>":
+        return ops.abs(column) > value
+    return {
+        "<": column.__lt__, "<=": column.__le__, ">": column.__gt__,
+        ">=": column.__ge__, "==": column.__eq__, "!=": column.__ne__,
+    }[operator](value)
+
+
+def _rule_matches(ops, rule: dict, columns: Dict[str, object], tolerance: float, rows: int = 0):
+    conditions = rule.get("when", [])
+    named = {condition[0] for condition in conditions}
+    masks = []
+    for field, operator, *value in conditions:
+        if field in ("*", "others"):
+            targets = AMOUNT_FIELDS if field == "*" else [
+                name for name in AMOUNT_FIELDS if name not in named and name != "final_amount"
+            ]
+        else:
+            targets = [field]
+        masks.extend(_condition(ops, columns[name], operator, value[0] if value else None, tolerance)
+                     for name in targets)
+    return ops.all(masks, rows)
+
+
+def classify(columns: Dict[str, np.ndarray], rules: List[dict], tolerance: Optional[float] = None,
+             rows: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Reason and whether each row is reconciled, from the first rule it satisfies
+
+    rows is needed only when there are no columns, as for the not-in sheets.
+    """
+    tolerance = settings.reconciliation_tolerance if tolerance is None else tolerance
+    if rows is None:
+        rows = len(next(iter(columns.values()))) if columns else 0
+    masks = [_rule_matches(_NumpyOps, rule, columns, tolerance, rows) for rule in rules]
+    first = np.select(masks, np.arange(len(rules)), default=len(rules)) if rules else np.zeros(rows, dtype=int)
+    reasons = np.array([rule.get("reason") for rule in rules] + [FALLBACK_REASON], dtype=object)
+    reconciled = np.array([rule["status"] == RECONCILED for rule in rules] + [False])
+    return reasons[first], reconciled[first]
+
+
+def _reason_literal(reason: Optional[str]):
+    return null() if reason is None else literal(reason)
+
+
+def classify_sql(columns: Dict[str, object], rules: List[dict], tolerance: Optional[float] = None):
+    """CASE expressions for the reason and the reconciled_status, like ``classify``"""
+    tolerance = settings.reconciliation_tolerance if tolerance is None else tolerance
+    if not rules:
+        return literal(FALLBACK_REASON), literal(UNRECONCILED)
+    matches = [_rule_matches(_SqlOps, rule, columns, tolerance) for rule in rules]
+    reason = case(*[(match, _reason_literal(rule.get("reason"))) for match, rule in zip(matches, rules)],
+                  else_=literal(FALLBACK_REASON))
+    status = case(*[(match, literal(rule["status"])) for match, rule in zip(matches, rules)],
+                  else_=literal(UNRECONCILED))
+    return reason, status
+
+
+async def load_reason_rules(db: AsyncSession, organization_id: Optional[int] = None) -> Dict[str, List[dict]]:
+    """Reason rules of an organization, the configured one by default"""
+    from app.models.sso.reconciliation_reason_rules import ReconciliationReasonRules
+
+    record = await ReconciliationReasonRules.get_by_organization(db, organization_id or settings.organization_id)
+    return rules_with_defaults(record.get_rules() if record else None)
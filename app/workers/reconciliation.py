@@ -0,0 +1,870 @@
+"""
+Vectorized POS vs Zomato reconciliation
+
+POS orders (main database) and Zomato settlement rows (sso database) for
+the requested period are loaded as plain columns, not ORM objects, and
+matched with a hash lookup on the POS order ID; rows left without a match
+are then paired on store, time and amount (``fuzzy_match_orders``). The
+charges Zomato should have deducted are derived from the POS amounts, at
+the rates of the organization's rate cards (see ``rates``), and every
+``*_delta`` column is computed with NumPy over whole arrays, as are the
+reason and status of each order (see ``reasons``); the matching and
+arithmetic run in the process pool. The results are written
+to the sheet tables with the bulk loader.
+
+The period is split into partitions of stores and date buckets, sized from
+per-store, per-day row counts so that each fits
+``reconciliation_memory_budget_mb``. Partitions are loaded, matched and
+written one at a time, so peak memory depends on the partition size, not on
+the length of the period. Orders are matched within their store.
+
+Partitions cover disjoint stores or dates, so up to
+``reconciliation_workers`` of them are loaded and reconciled at once, each
+in its own process pool worker. The caller consumes the results one by one
+and is the single writer, which keeps at most that many partitions in
+memory and never has two writers competing for the sheet tables.
+
+In ``incremental`` mode only the store-days that ingestion marked dirty
+(see ``rollup``) for POS or Zomato are rebuilt: their sheet rows are
+deleted and written again, and the marks are cleared afterwards. ``full``
+mode rebuilds the whole period.
+"""
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import main_db_session, sso_db_session
+from app.config.settings import settings
+from app.workers.bulk_loader import BulkLoader
+from app.workers.parsers import frame_to_records
+from app.workers.process_pool import process_pool
+from app.workers.rates import RateTable, default_rates, load_rate_table
+from app.workers.reasons import (
+    AMOUNT_FIELDS, RECONCILED, UNRECONCILED, classify, load_reason_rules, rules_with_defaults,
+)
+from app.workers.rollup import business_date
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+import asyncio
+import math
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Zomato-only adjustments, copied to the fixed_* sheet columns
+ADJUSTMENT_FIELDS = [
+    "credit_note_amount",
+    "pro_discount_passthrough",
+    "customer_discount",
+    "rejection_penalty_charge",
+    "user_credits_charge",
+    "promo_recovery_adj",
+    "icecream_handling",
+    "icecream_deductions",
+    "order_support_cost",
+    "merchant_delivery_charge",
+]
+
+# Rough memory per order while a partition is reconciled: the POS and Zomato
+# input rows, both output frames and one batch of records being written
+ESTIMATED_ROW_BYTES = 4096
+
+GENERATION_MODES = ("incremental", "full")
+
+# "sql" runs the matching inside the database (see ``sql_reconciliation``) without the
+# fuzzy pass; it and "auto" are opt-in, "python" is the default
+RECONCILIATION_ENGINES = ("auto", "python", "sql")
+
+# Rollup sources whose changes invalidate the Zomato sheets, with their databases
+DIRTY_SOURCES = {"pos": "main", "zomato": "sso"}
+
+
+def fuzzy_options() -> Optional[Dict[str, float]]:
+    """Time window and amount tolerance of the fuzzy matching pass, if enabled"""
+    if not settings.reconciliation_fuzzy_match:
+        return None
+    return {
+        "window_minutes": settings.reconciliation_fuzzy_window_minutes,
+        "amount_tolerance": settings.reconciliation_fuzzy_amount_tolerance,
+        "nearest": settings.reconciliation_fuzzy_candidates,
+    }
+
+
+def parse_period(start_date: str, end_date: str) -> Tuple[datetime, datetime]:
+    """Start and exclusive end of an inclusive YYYY-MM-DD date range"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    return start, end
+
+
+def expected_charges(net: np.ndarray, tax: np.ndarray, rates: Dict[str, object]) -> Dict[str, np.ndarray]:
+    """Settlement amounts Zomato should report for orders of the given value
+
+    Each rate is a number or an array with one rate per order.
+    """
+    commission = net * rates["commission_rate"]
+    pg_applied_on = net + tax
+    pg_charge = pg_applied_on * rates["pg_rate"]
+    taxes_zomato_fee = (commission + pg_charge) * rates["fee_gst_rate"]
+    tds = net * rates["tds_rate"]
+    # Zomato remits the customer's GST itself, so only the net amount is paid out
+    final = net - commission - pg_charge - taxes_zomato_fee - tds
+    amounts = {
+        "net_amount": net,
+        "tax_paid_by_customer": tax,
+        "commission_value": commission,
+        "pg_applied_on": pg_applied_on,
+        "pg_charge": pg_charge,
+        "taxes_zomato_fee": taxes_zomato_fee,
+        "tds_amount": tds,
+        "final_amount": final,
+    }
+    return {name: np.round(values, 2) for name, values in amounts.items()}
+
+
+def match_orders(pos: pd.DataFrame, zomato: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Row positions of POS and Zomato orders that share an order ID
+
+    Zomato rows are keyed by the merchant order ID they carry, falling back
+    to Zomato's own order ID. The POS IDs go into a hash index that every
+    Zomato key is looked up in once.
+    """
+    keys = zomato["pos_order_id"].where(zomato["pos_order_id"].notna() & (zomato["pos_order_id"] != ""),
+                                        zomato["order_id"])
+    pos_ids = pos["order_id"].drop_duplicates(keep="last")
+    positions = pd.Index(pos_ids).get_indexer(keys)
+    zomato_rows = np.flatnonzero(positions >= 0)
+    pos_rows = pos_ids.index.to_numpy()[positions[zomato_rows]]
+    return pos_rows, zomato_rows
+
+
+def _unmatched_orders(frame: pd.DataFrame, matched: np.ndarray, time_column: str,
+                      amount_column: str) -> pd.DataFrame:
+    """Rows not yet matched that have a time and an amount to compare"""
+    rows = np.setdiff1d(np.arange(len(frame)), matched)
+    left = pd.DataFrame({
+        "row": rows,
+        "store": frame["store_code"].to_numpy()[rows],
+        "time": pd.to_datetime(frame[time_column].to_numpy()[rows]),
+        "amount": frame[amount_column].to_numpy(dtype=np.float64)[rows],
+    })
+    left["store"] = left["store"].fillna("")
+    return left[left["time"].notna() & left["amount"].notna()]
+
+
+def _window_candidates(zomato_left: pd.DataFrame, pos_left: pd.DataFrame, window: pd.Timedelta,
+                       nearest: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Every (Zomato, POS) pair of leftovers in the same store at most window apart
+
+    POS leftovers are sorted on one int64 key, the store's code times a
+    span wider than the period plus its time in microseconds, so each
+    Zomato row's candidates are the contiguous run between two
+    searchsorted bounds, narrowed to the nearest orders on either side when
+    nearest is set. Returns positions into zomato_left and pos_left.
+    """
+    codes, _ = pd.factorize(pd.concat([zomato_left["store"], pos_left["store"]], ignore_index=True))
+    zomato_code, pos_code = codes[:len(zomato_left)], codes[len(zomato_left):]
+    zomato_time = zomato_left["time"].to_numpy(dtype="datetime64[us]").astype(np.int64)
+    pos_time = pos_left["time"].to_numpy(dtype="datetime64[us]").astype(np.int64)
+    origin = min(zomato_time.min(), pos_time.min())
+    reach = window // pd.Timedelta(microseconds=1)
+    span = max(zomato_time.max(), pos_time.max()) - origin + 2 * reach + 1
+    zomato_key = zomato_code * span + (zomato_time - origin)
+    pos_key = pos_code * span + (pos_time - origin)
+
+    order = np.argsort(pos_key, kind="stable")
+    sorted_keys = pos_key[order]
+    low = np.searchsorted(sorted_keys, zomato_key - reach, side="left")
+    high = np.searchsorted(sorted_keys, zomato_key + reach, side="right")
+    if nearest:
+        middle = np.searchsorted(sorted_keys, zomato_key)
+        low = np.maximum(low, middle - nearest)
+        high = np.minimum(high, middle + nearest)
+    counts = high - low
+    zomato_at = np.repeat(np.arange(len(zomato_left)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return zomato_at, order[np.repeat(low, counts) + offsets]
+
+
+def _greedy_pairs(rows: np.ndarray, pos_rows: np.ndarray) -> np.ndarray:
+    """Positions of the candidates a greedy pairing keeps; candidates are ranked best first
+
+    A candidate is kept unless its Zomato row or POS order was already
+    paired, so a row whose first choice went elsewhere still gets its next
+    best. This is inherently sequential; the candidate lists are bounded,
+    which keeps it to one pass over a few candidates per row.
+    """
+    paired_rows, paired_pos, kept = set(), set(), []
+    for position, (row, pos_row) in enumerate(zip(rows.tolist(), pos_rows.tolist())):
+        if row in paired_rows or pos_row in paired_pos:
+            continue
+        paired_rows.add(row)
+        paired_pos.add(pos_row)
+        kept.append(position)
+    return np.array(kept, dtype=np.intp)
+
+
+def fuzzy_match_orders(pos: pd.DataFrame, zomato: pd.DataFrame, pos_rows: np.ndarray,
+                       zomato_rows: np.ndarray, window_minutes: float, amount_tolerance: float,
+                       nearest: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Pair orders left over by the ID match on store, time and amount
+
+    Every POS order of the same store within the time window is a
+    candidate for a Zomato row (``_window_candidates``, a sort and two
+    binary searches), up to the ``nearest`` in time on either side if set,
+    and candidates outside the amount tolerance are dropped. A candidate's confidence falls linearly from 1 for the same
+    time and amount to 0 at the edges of the window and tolerance. Pairs
+    are then taken greedily, most confident first, so every order is used
+    once. Returns POS rows, Zomato rows and confidences.
+    """
+    empty = (np.array([], dtype=np.intp), np.array([], dtype=np.intp), np.array([], dtype=np.float64))
+    zomato_left = _unmatched_orders(zomato, zomato_rows, "order_date", "net_amount")
+    pos_left = _unmatched_orders(pos, pos_rows, "order_date", "order_amount")
+    if zomato_left.empty or pos_left.empty:
+        return empty
+
+    window = pd.Timedelta(minutes=window_minutes)
+    zomato_at, pos_at = _window_candidates(zomato_left, pos_left, window, nearest)
+    time_gap = np.abs(zomato_left["time"].to_numpy()[zomato_at] - pos_left["time"].to_numpy()[pos_at])
+    time_gap = time_gap / window.to_timedelta64() if window else (time_gap > np.timedelta64(0)) * 2.0
+    amount_gap = np.abs(zomato_left["amount"].to_numpy()[zomato_at] - pos_left["amount"].to_numpy()[pos_at])
+    amount_gap = amount_gap / amount_tolerance if amount_tolerance else (amount_gap > 0) * 2.0
+    within = (time_gap <= 1) & (amount_gap <= 1)
+    rows = zomato_left["row"].to_numpy()[zomato_at[within]]
+    pos_rows_left = pos_left["row"].to_numpy()[pos_at[within]]
+    confidence = 1 - (time_gap[within] + amount_gap[within]) / 2
+
+    # Most confident first; ties go to the closer time, then to the earlier rows
+    rank = np.lexsort((rows, pos_rows_left, time_gap[within], -confidence))
+    rows, pos_rows_left, confidence = rows[rank], pos_rows_left[rank], confidence[rank]
+    paired = _greedy_pairs(rows, pos_rows_left)
+    return (
+        pos_rows_left[paired].astype(np.intp),
+        rows[paired].astype(np.intp),
+        np.round(confidence[paired].astype(np.float64), 4),
+    )
+
+
+def _amounts(frame: pd.DataFrame, name: str, rows: np.ndarray) -> np.ndarray:
+    return np.nan_to_num(frame[name].to_numpy(dtype=np.float64)[rows])
+
+
+def _in_period(times: pd.Series, period: Optional[Tuple[datetime, datetime]]) -> np.ndarray:
+    if period is None:
+        return np.ones(len(times), dtype=bool)
+    times = pd.to_datetime(times)
+    return ((times >= period[0]) & (times < period[1])).to_numpy()
+
+
+def _rates_for(rates: Union[Dict[str, float], RateTable], store_codes: np.ndarray,
+               order_times: np.ndarray) -> Dict[str, object]:
+    return rates.lookup(store_codes, order_times) if isinstance(rates, RateTable) else rates
+
+
+def _status_columns(reconciled: np.ndarray, settled: np.ndarray, gap: np.ndarray) -> Dict[str, np.ndarray]:
+    return {
+        "reconciled_status": np.where(reconciled, RECONCILED, UNRECONCILED),
+        "reconciled_amount": np.where(reconciled, settled, 0.0),
+        "unreconciled_amount": np.where(reconciled, 0.0, gap),
+    }
+
+
+def refund_sheet(pos: pd.DataFrame, refunds: pd.DataFrame, tolerance: float,
+                 rules: List[dict]) -> pd.DataFrame:
+    """Refund rows with the POS order they reverse, if any, classified by the ``refund`` rules
+
+    Refunds may be reported as negative amounts; a full refund equals the
+    POS order value.
+    """
+    refunds = refunds.reset_index(drop=True)
+    pos_rows, refund_rows = match_orders(pos, refunds)
+    pos_order_id = np.full(len(refunds), None, dtype=object)
+    pos_order_id[refund_rows] = pos["order_id"].to_numpy()[pos_rows]
+    pos_net = np.full(len(refunds), np.nan)
+    pos_net[refund_rows] = pos["order_amount"].to_numpy(dtype=np.float64)[pos_rows]
+
+    rows = np.arange(len(refunds))
+    refunded = np.abs(_amounts(refunds, "net_amount", rows))
+    delta = np.round(refunded - np.nan_to_num(pos_net), 2)
+    reasons, reconciled = classify({"net_amount": delta, "pos_order_id": pos_order_id}, rules, tolerance)
+    return pd.DataFrame({
+        "id": refunds["id"].to_numpy(),
+        "zomato_order_id": refunds["order_id"].to_numpy(),
+        "pos_order_id": pos_order_id,
+        "order_date": pd.to_datetime(refunds["order_date"].to_numpy()).normalize(),
+        "store_name": refunds["store_code"].to_numpy(),
+        "zomato_net_amount": refunds["net_amount"].to_numpy(dtype=np.float64),
+        "pos_net_amount": pos_net,
+        "zomato_vs_pos_net_amount_delta": delta,
+        **_status_columns(reconciled, refunded, np.abs(delta)),
+        "zomato_vs_pos_reason": reasons,
+        "order_status_zomato": refunds["order_status"].to_numpy(),
+    })
+
+
+def not_in_pos_sheet(zomato: pd.DataFrame, rows: np.ndarray, rates: Union[Dict[str, float], RateTable],
+                     tolerance: float, rules: List[dict]) -> pd.DataFrame:
+    """Zomato sales at the given rows, which no POS order matched, classified by the ``not_in_pos`` rules
+
+    The ``calculated_zomato_*`` columns price Zomato's own order value at
+    the rates in force for each sale's store and date.
+    """
+    order_dates = zomato["order_date"].to_numpy()[rows]
+    store_codes = zomato["store_code"].to_numpy()[rows]
+    reported = {name: _amounts(zomato, name, rows) for name in AMOUNT_FIELDS}
+    calculated = expected_charges(reported["net_amount"], reported["tax_paid_by_customer"],
+                                  _rates_for(rates, store_codes, order_dates))
+    reasons, reconciled = classify({}, rules, tolerance, rows=len(rows))
+    columns = {
+        "id": zomato["id"].to_numpy()[rows],
+        "zomato_order_id": zomato["order_id"].to_numpy()[rows],
+        "order_date": pd.to_datetime(order_dates).normalize(),
+        "store_name": store_codes,
+        **{f"zomato_{name}": reported[name] for name in AMOUNT_FIELDS},
+        **{f"calculated_zomato_{name}": calculated[name] for name in AMOUNT_FIELDS},
+        **{f"fixed_{name}": _amounts(zomato, name, rows) for name in ADJUSTMENT_FIELDS},
+        **_status_columns(reconciled, reported["final_amount"], np.abs(reported["final_amount"])),
+        "zomato_vs_pos_reason": reasons,
+        "order_status_zomato": zomato["order_status"].to_numpy()[rows],
+    }
+    return pd.DataFrame(columns)
+
+
+def not_in_3po_sheet(pos: pd.DataFrame, rows: np.ndarray, rates: Union[Dict[str, float], RateTable],
+                     tolerance: float, rules: List[dict]) -> pd.DataFrame:
+    """POS orders at the given rows, which no Zomato sale matched, priced at their store's rates
+
+    Reasons and statuses come from the ``not_in_3po`` rules.
+    """
+    order_dates = pos["order_date"].to_numpy()[rows]
+    store_codes = pos["store_code"].to_numpy()[rows]
+    from_pos = expected_charges(_amounts(pos, "order_amount", rows), _amounts(pos, "tax_amount", rows),
+                                _rates_for(rates, store_codes, order_dates))
+    reasons, reconciled = classify({}, rules, tolerance, rows=len(rows))
+    columns = {
+        "id": pos["order_id"].to_numpy()[rows],
+        "pos_order_id": pos["order_id"].to_numpy()[rows],
+        "order_date": pd.to_datetime(order_dates).normalize(),
+        "store_name": store_codes,
+        **{f"pos_{name}": from_pos[name] for name in AMOUNT_FIELDS},
+        **_status_columns(reconciled, from_pos["final_amount"], np.abs(from_pos["final_amount"])),
+        "pos_vs_zomato_reason": reasons,
+        "order_status_pos": pos["status"].to_numpy()[rows],
+    }
+    return pd.DataFrame(columns)
+
+
+def reconcile_frames(pos: pd.DataFrame, zomato: pd.DataFrame, rates: Union[Dict[str, float], RateTable],
+                     tolerance: float, fuzzy: Optional[Dict[str, float]] = None,
+                     rules: Optional[Dict[str, List[dict]]] = None, refunds: Optional[pd.DataFrame] = None,
+                     period: Optional[Tuple[datetime, datetime]] = None) -> Dict[str, pd.DataFrame]:
+    """The five sheet frames of a set of POS orders and Zomato sales
+
+    ``pos_vs_3po`` and ``3po_vs_pos`` hold the matched orders,
+    ``not_in_pos`` the sales no POS order matched, ``not_in_3po`` the POS
+    orders no sale matched and ``refund`` the refund rows, if given.
+
+    rates is one set of rates or a RateTable, which is looked up by the
+    store and date of each Zomato row. fuzzy holds ``window_minutes``,
+    ``amount_tolerance`` and optionally ``nearest`` for a second pass over orders the ID match left
+    unpaired; without it only IDs match. The reason and status of each
+    row come from the reason rules of its sheet (see ``reasons``), the
+    defaults unless rules are given. period is the [start, end) the sheets
+    are for: orders outside it, loaded for the match slack, still claim
+    the orders they match but are left to the neighbouring partition's
+    sheets, and are never fuzzy candidates, so two partitions cannot both
+    pair the same order. Without it every order is in the period.
+    """
+    pos = pos.reset_index(drop=True)
+    zomato = zomato.reset_index(drop=True)
+    rules = rules_with_defaults(rules)
+    pos_in_period = _in_period(pos["order_date"], period)
+    zomato_in_period = _in_period(zomato["order_date"], period)
+    pos_rows, zomato_rows = match_orders(pos, zomato)
+    claimed = pos_rows
+    in_period = zomato_in_period[zomato_rows]
+    pos_rows, zomato_rows = pos_rows[in_period], zomato_rows[in_period]
+    confidence = np.ones(len(zomato_rows))
+    if fuzzy:
+        fuzzy_pos, fuzzy_zomato, fuzzy_confidence = fuzzy_match_orders(
+            pos, zomato, np.union1d(claimed, np.flatnonzero(~pos_in_period)),
+            np.union1d(zomato_rows, np.flatnonzero(~zomato_in_period)),
+            fuzzy["window_minutes"], fuzzy["amount_tolerance"], fuzzy.get("nearest", 0)
+        )
+        pos_rows = np.concatenate([pos_rows, fuzzy_pos])
+        zomato_rows = np.concatenate([zomato_rows, fuzzy_zomato])
+        confidence = np.concatenate([confidence, fuzzy_confidence])
+
+    # Rows take the date and store of their Zomato row, which decides the partition they belong to
+    order_dates = zomato["order_date"].to_numpy()[zomato_rows]
+    store_codes = zomato["store_code"].to_numpy()[zomato_rows]
+    rates_by_row = _rates_for(rates, store_codes, order_dates)
+
+    pos_net = _amounts(pos, "order_amount", pos_rows)
+    pos_tax = _amounts(pos, "tax_amount", pos_rows)
+    from_pos = expected_charges(pos_net, pos_tax, rates_by_row)
+    reported = {name: _amounts(zomato, name, zomato_rows) for name in AMOUNT_FIELDS}
+    # What Zomato's own order value implies, to check its arithmetic independently of POS
+    calculated = expected_charges(reported["net_amount"], reported["tax_paid_by_customer"], rates_by_row)
+
+    deltas = {name: np.round(from_pos[name] - reported[name], 2) for name in AMOUNT_FIELDS}
+    reasons, reconciled = classify(deltas, rules["matched"], tolerance)
+
+    common = {
+        "id": zomato["id"].to_numpy()[zomato_rows],
+        "pos_order_id": pos["order_id"].to_numpy()[pos_rows],
+        "zomato_order_id": zomato["order_id"].to_numpy()[zomato_rows],
+        "order_date": pd.to_datetime(order_dates).normalize(),
+        "store_name": store_codes,
+        **_status_columns(reconciled, reported["final_amount"], np.abs(deltas["final_amount"])),
+        "match_confidence": confidence,
+    }
+
+    pos_vs_3po = dict(common)
+    three_po_vs_pos = dict(common)
+    for name in AMOUNT_FIELDS:
+        pos_vs_3po[f"pos_{name}"] = from_pos[name]
+        pos_vs_3po[f"zomato_{name}"] = reported[name]
+        pos_vs_3po[f"pos_vs_zomato_{name}_delta"] = deltas[name]
+        three_po_vs_pos[f"zomato_{name}"] = reported[name]
+        three_po_vs_pos[f"pos_{name}"] = from_pos[name]
+        three_po_vs_pos[f"zomato_vs_pos_{name}_delta"] = np.round(reported[name] - from_pos[name], 2)
+        three_po_vs_pos[f"calculated_zomato_{name}"] = calculated[name]
+    for name in ADJUSTMENT_FIELDS:
+        three_po_vs_pos[f"fixed_{name}"] = _amounts(zomato, name, zomato_rows)
+    pos_vs_3po["pos_vs_zomato_reason"] = reasons
+    three_po_vs_pos["zomato_vs_pos_reason"] = reasons
+    pos_vs_3po["order_status_pos"] = pos["status"].to_numpy()[pos_rows]
+    three_po_vs_pos["order_status_zomato"] = zomato["order_status"].to_numpy()[zomato_rows]
+
+    unmatched_zomato = np.setdiff1d(np.flatnonzero(zomato_in_period), zomato_rows)
+    unmatched_pos = np.setdiff1d(np.flatnonzero(pos_in_period), np.union1d(claimed, pos_rows))
+    return {
+        "pos_vs_3po": pd.DataFrame(pos_vs_3po),
+        "3po_vs_pos": pd.DataFrame(three_po_vs_pos),
+        "refund": refund_sheet(pos, refunds, tolerance, rules["refund"]) if refunds is not None else pd.DataFrame(),
+        "not_in_pos": not_in_pos_sheet(zomato, unmatched_zomato, rates, tolerance, rules["not_in_pos"]),
+        "not_in_3po": not_in_3po_sheet(pos, unmatched_pos, rates, tolerance, rules["not_in_3po"]),
+    }
+
+
+async def _select_frame(db: AsyncSession, query) -> pd.DataFrame:
+    result = await db.execute(query)
+    return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+
+def _numeric(frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    # Numeric columns arrive as Decimal; the engine works in float64
+    for name in columns:
+        frame[name] = pd.to_numeric(frame[name], errors="coerce").astype(np.float64)
+    return frame
+
+
+class Partition:
+    """Stores reconciled together over one date range; end is exclusive"""
+
+    def __init__(self, store_codes: List[str], start: datetime, end: datetime, rows: int = 0):
+        self.store_codes = store_codes
+        self.start = start
+        self.end = end
+        self.rows = rows
+
+    def __repr__(self):
+        return (f"Partition({len(self.store_codes)} stores, {self.start:%Y-%m-%d} to "
+                f"{self.end:%Y-%m-%d}, ~{self.rows} rows)")
+
+
+def max_partition_rows() -> int:
+    """Orders per partition allowed by the memory budget"""
+    budget = settings.reconciliation_memory_budget_mb * 1024 * 1024
+    return max(1, int(budget // ESTIMATED_ROW_BYTES))
+
+
+def reconciliation_workers() -> int:
+    """Partitions reconciled concurrently"""
+    return max(1, settings.reconciliation_workers or settings.process_pool_workers)
+
+
+def shard_rows(counts: Dict[Tuple[str, date], int], workers: int) -> int:
+    """Partition size that fits the memory budget and gives every worker a share"""
+    total = sum(counts.values())
+    return max(1, min(max_partition_rows(), math.ceil(total / workers)))
+
+
+async def bounded_as_completed(items: Iterable, fn: Callable[..., Awaitable], limit: int, *args):
+    """Yield fn(item, *args) results as they finish, running at most limit at a time
+
+    A new item is only started once a finished result has been handed to
+    the consumer, so no more than limit results are ever held at once.
+    """
+    items = iter(items)
+    pending = set()
+
+    def launch():
+        while len(pending) < limit:
+            item = next(items, None)
+            if item is None:
+                return
+            pending.add(asyncio.ensure_future(fn(item, *args)))
+
+    launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                yield task.result()
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _as_date(value) -> date:
+    # DATE() comes back as a string from SQLite and as a date elsewhere
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _split_by_day(store: str, days: Dict[date, int], max_rows: int) -> List[Partition]:
+    """Runs of consecutive days of one store, each within max_rows"""
+    partitions, first, last, rows = [], None, None, 0
+    for day in sorted(days):
+        if first is not None and rows + days[day] > max_rows:
+            partitions.append(Partition([store], first, last + timedelta(days=1), rows))
+            first, rows = None, 0
+        if first is None:
+            first = day
+        last, rows = day, rows + days[day]
+    if first is not None:
+        partitions.append(Partition([store], first, last + timedelta(days=1), rows))
+    return partitions
+
+
+def plan_partitions(counts: Dict[Tuple[str, date], int], start: date, end: date,
+                    bucket_days: int, max_rows: int) -> List[Partition]:
+    """Group per-store, per-day row counts into partitions of at most max_rows
+
+    The period is cut into buckets of bucket_days. Within a bucket, stores
+    are packed together until the next one would exceed max_rows; a store
+    that alone exceeds it is split into runs of days. A single store-day
+    larger than max_rows still becomes one partition.
+    """
+    buckets = defaultdict(lambda: defaultdict(dict))
+    for (store, day), rows in counts.items():
+        buckets[(day - start).days // bucket_days][store][day] = rows
+
+    partitions = []
+    for index in sorted(buckets):
+        bucket_start = start + timedelta(days=index * bucket_days)
+        bucket_end = min(bucket_start + timedelta(days=bucket_days), end)
+        group, group_rows = [], 0
+        for store in sorted(buckets[index]):
+            days = buckets[index][store]
+            rows = sum(days.values())
+            if rows > max_rows:
+                partitions.extend(_split_by_day(store, days, max_rows))
+                continue
+            if group and group_rows + rows > max_rows:
+                partitions.append(Partition(group, bucket_start, bucket_end, group_rows))
+                group, group_rows = [], 0
+            group.append(store)
+            group_rows += rows
+        if group:
+            partitions.append(Partition(group, bucket_start, bucket_end, group_rows))
+
+    for partition in partitions:
+        partition.start = datetime.combine(partition.start, datetime.min.time())
+        partition.end = datetime.combine(partition.end, datetime.min.time())
+    return partitions
+
+
+def _store_filter(column, store_codes: List[str]):
+    # Orders without a store are counted under ""
+    condition = column.in_(store_codes)
+    if "" in store_codes:
+        condition = or_(condition, column.is_(None))
+    return condition
+
+
+async def count_orders(db: AsyncSession, store_column, date_column, start: datetime, end: datetime,
+                       store_codes: Optional[List[str]] = None, *criteria) -> Dict[Tuple[str, date], int]:
+    """Rows per store and day of one order table"""
+    store = func.coalesce(store_column, "")
+    day = business_date(date_column, db.bind.dialect.name)
+    query = select(store, day, func.count()).where(
+        date_column >= start, date_column < end, *criteria
+    ).group_by(store, day)
+    if store_codes:
+        query = query.where(store_column.in_(store_codes))
+    result = await db.execute(query)
+    return {(store_code, _as_date(value)): rows for store_code, value, rows in result.all()}
+
+
+async def _order_counts(start: datetime, end: datetime,
+                        store_codes: Optional[List[str]]) -> Dict[Tuple[str, date], int]:
+    """POS plus Zomato rows per store and day"""
+    from app.models.main.orders import Orders
+    from app.models.sso.reconciliation import ZomatoOrder
+
+    async with main_db_session() as main_db:
+        counts = await count_orders(main_db, Orders.store_code, Orders.order_date, start, end, store_codes)
+    async with sso_db_session() as sso_db:
+        zomato_counts = await count_orders(
+            sso_db, ZomatoOrder.store_code, ZomatoOrder.order_date, start, end, store_codes,
+            ZomatoOrder.action.in_(("sale", "refund")),
+        )
+    for key, rows in zomato_counts.items():
+        counts[key] = counts.get(key, 0) + rows
+    return counts
+
+
+async def plan_zomato_partitions(request_data) -> List[Partition]:
+    """Partitions covering a sheet generation request"""
+    start, end = parse_period(request_data.start_date, request_data.end_date)
+    counts = await _order_counts(start, end, request_data.store_codes or None)
+    return plan_partitions(
+        counts, start.date(), end.date(), settings.reconciliation_bucket_days,
+        shard_rows(counts, reconciliation_workers())
+    )
+
+
+async def choose_engine(request_data, partitions: Optional[List[Partition]] = None) -> str:
+    """Engine for a request whose engine is ``auto``, from its estimated row count
+
+    Small ranges stay in Python, where the fuzzy pass also runs; very large
+    ones too, as the partitioned engine keeps every transaction small.
+    Only requests or deployments that opt into ``auto`` get here: the SQL
+    engine has no fuzzy pass, so the result then depends on the volume.
+    """
+    if partitions is not None:
+        rows = sum(partition.rows for partition in partitions)
+    else:
+        start, end = parse_period(request_data.start_date, request_data.end_date)
+        rows = sum((await _order_counts(start, end, request_data.store_codes or None)).values())
+    if settings.reconciliation_sql_min_rows <= rows <= settings.reconciliation_sql_max_rows:
+        return "sql"
+    return "python"
+
+
+async def dirty_keys(request_data, marked_before: datetime) -> Set[Tuple[str, date]]:
+    """Store-days of the request whose POS or Zomato rows changed since they were last reconciled"""
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.workers.ingestion import db_session_for
+
+    start, end = parse_period(request_data.start_date, request_data.end_date)
+    last_day = (end - timedelta(days=1)).date()
+    # A changed order can be matched by a row of the other source timestamped on a neighbouring day
+    slack = 1 if settings.reconciliation_match_slack_minutes else 0
+    keys = set()
+    for source, database in DIRTY_SOURCES.items():
+        async with db_session_for(database) as db:
+            marked = await DirtyPartition.get_keys(
+                db, [source], start.date() - timedelta(days=slack), last_day + timedelta(days=slack),
+                request_data.store_codes or None, marked_before
+            )
+        marked = {(store, day + timedelta(days=shift))
+                  for store, day in marked for shift in range(-slack, slack + 1)}
+        keys |= {(store, day) for store, day in marked if start.date() <= day <= last_day}
+    return keys
+
+
+async def plan_dirty_partitions(request_data, marked_before: datetime) -> List[Partition]:
+    """Partitions covering only the dirty store-days of a request, one day per partition"""
+    keys = await dirty_keys(request_data, marked_before)
+    if not keys:
+        return []
+    start, end = parse_period(request_data.start_date, request_data.end_date)
+    stores = sorted({store for store, _ in keys})
+    counts = await _order_counts(start, end, stores)
+    # Dirty store-days without any rows left still need their sheet rows removed
+    dirty_counts = {key: counts.get(key, 0) for key in keys}
+    return plan_partitions(dirty_counts, start.date(), end.date(), 1,
+                           shard_rows(dirty_counts, reconciliation_workers()))
+
+
+async def clear_dirty_partitions(request_data, marked_before: datetime) -> int:
+    """Drop the marks of a request's store-days that are now reconciled"""
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.workers.ingestion import db_session_for
+
+    start, end = parse_period(request_data.start_date, request_data.end_date)
+    cleared = 0
+    for source, database in DIRTY_SOURCES.items():
+        async with db_session_for(database) as db:
+            cleared += await DirtyPartition.clear(
+                db, [source], start.date(), (end - timedelta(days=1)).date(),
+                request_data.store_codes or None, marked_before
+            )
+    return cleared
+
+
+async def load_pos_orders(db: AsyncSession, start: datetime, end: datetime,
+                          store_codes: Optional[List[str]] = None) -> pd.DataFrame:
+    """POS orders placed in [start, end) as columns"""
+    from app.models.main.orders import Orders
+
+    query = select(
+        Orders.order_id, Orders.store_code, Orders.order_date,
+        Orders.order_amount, Orders.tax_amount, Orders.status,
+    ).where(Orders.order_date >= start, Orders.order_date < end)
+    if store_codes:
+        query = query.where(_store_filter(Orders.store_code, store_codes))
+    return _numeric(await _select_frame(db, query), ["order_amount", "tax_amount"])
+
+
+async def load_zomato_orders(db: AsyncSession, start: datetime, end: datetime,
+                             store_codes: Optional[List[str]] = None, action: str = "sale") -> pd.DataFrame:
+    """Zomato rows of an action (sale or refund) for orders placed in [start, end) as columns"""
+    from app.models.sso.reconciliation import ZomatoOrder
+
+    columns = ["id", "order_id", "pos_order_id", "store_code", "order_date", "order_status"]
+    query = select(
+        *[getattr(ZomatoOrder, name) for name in columns + AMOUNT_FIELDS + ADJUSTMENT_FIELDS]
+    ).where(
+        ZomatoOrder.order_date >= start,
+        ZomatoOrder.order_date < end,
+        ZomatoOrder.action == action,
+    )
+    if store_codes:
+        query = query.where(_store_filter(ZomatoOrder.store_code, store_codes))
+    return _numeric(await _select_frame(db, query), AMOUNT_FIELDS + ADJUSTMENT_FIELDS)
+
+
+async def reconcile_partition(partition: Partition, rates: Union[Dict[str, float], RateTable],
+                              rules: Optional[Dict[str, List[dict]]] = None
+                              ) -> Tuple[Partition, Dict[str, pd.DataFrame]]:
+    """Load and reconcile the orders of one partition
+
+    Each order belongs to exactly one partition. POS orders and Zomato
+    sales are loaded with ``reconciliation_match_slack_minutes`` on either
+    side of the partition's range, so an order timestamped just across a
+    bucket boundary on one side still finds its match and is not reported
+    missing; only orders inside the range are written.
+    """
+    slack = timedelta(minutes=settings.reconciliation_match_slack_minutes)
+    async with main_db_session() as main_db:
+        pos = await load_pos_orders(main_db, partition.start - slack, partition.end + slack,
+                                    partition.store_codes)
+    async with sso_db_session() as sso_db:
+        zomato = await load_zomato_orders(sso_db, partition.start - slack, partition.end + slack,
+                                          partition.store_codes)
+        refunds = await load_zomato_orders(sso_db, partition.start, partition.end, partition.store_codes,
+                                           action="refund")
+    period = (partition.start, partition.end)
+    if zomato.empty and pos.empty and refunds.empty:
+        return partition, reconcile_frames(pos, zomato, rates, settings.reconciliation_tolerance,
+                                           rules=rules, refunds=refunds, period=period)
+    return partition, await process_pool.run(
+        reconcile_frames, pos, zomato, rates, settings.reconciliation_tolerance, fuzzy_options(), rules,
+        refunds, period
+    )
+
+
+async def iter_reconciled_partitions(request_data, rates: Union[Dict[str, float], RateTable, None] = None,
+                                     partitions: Optional[List[Partition]] = None,
+                                     rules: Optional[Dict[str, List[dict]]] = None
+                                     ) -> AsyncIterator[Tuple[Partition, Dict[str, pd.DataFrame]]]:
+    """Each partition of a sheet generation request with its sheet frames
+
+    Without partitions, the whole requested period is covered. Without
+    rates or rules, the request organization's rate cards and reason rules
+    are used. Partitions are reconciled concurrently and yielded as they
+    finish, not in order.
+    """
+    if rates is None or rules is None:
+        async with sso_db_session() as sso_db:
+            if rates is None:
+                rates = await load_rate_table(sso_db, request_data.organization_id)
+            if rules is None:
+                rules = await load_reason_rules(sso_db, request_data.organization_id)
+    if partitions is None:
+        partitions = await plan_zomato_partitions(request_data)
+    workers = reconciliation_workers()
+    logger.info(f"Reconciling {len(partitions)} partitions with {workers} workers")
+
+    started = datetime.utcnow()
+    matched = 0
+    async for partition, sheets in bounded_as_completed(partitions, reconcile_partition, workers, rates, rules):
+        matched += len(sheets["pos_vs_3po"])
+        logger.debug(f"{partition}: {len(sheets['pos_vs_3po'])} matches")
+        yield partition, sheets
+    logger.info(
+        f"Reconciled {len(partitions)} partitions into {matched} matches "
+        f"in {(datetime.utcnow() - started).total_seconds():.2f}s"
+    )
+
+
+async def delete_sheet_rows(db: AsyncSession, model, partition: Partition, commit: bool = True) -> int:
+    """Remove a sheet's rows for a partition before it is written again"""
+    table = model.__table__
+    try:
+        result = await db.execute(delete(table).where(
+            _store_filter(table.c.store_name, partition.store_codes),
+            table.c.order_date >= partition.start.date(),
+            table.c.order_date < partition.end.date(),
+        ))
+        if commit:
+            await db.commit()
+        return result.rowcount
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def write_sheet(db: AsyncSession, model, frame: pd.DataFrame, commit: bool = True) -> int:
+    """Bulk insert a reconciliation frame into a sheet table; returns the rows written
+
+    Without commit the rows are left in the caller's transaction.
+    """
+    if frame.empty:
+        return 0
+    now = datetime.utcnow()
+    column_types = {
+        name: "date" if name == "order_date" else "float"
+        for name in frame.columns
+        if name == "order_date" or frame[name].dtype.kind == "f"
+    }
+    loader = BulkLoader(db, model.__table__, commit=commit)
+    for start in range(0, len(frame), loader.batch_size):
+        records = frame_to_records(frame.iloc[start:start + loader.batch_size], column_types)
+        await loader.add({**record, "created_at": now, "updated_at": now} for record in records)
+    await loader.flush()
+    return loader.rows_loaded
+
+
+async def write_partition_sheets(db: AsyncSession, sheets: Dict[str, pd.DataFrame],
+                                 replace: Optional[Partition] = None) -> Dict[str, int]:
+    """Write one reconciled partition into the five sheet tables; returns the rows written per table
+
+    replace is that partition when its existing rows must go first. The
+    partition is deleted and written in one transaction, so readers never
+    see it missing or half written.
+    """
+    from app.models.sso import (
+        ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+        OrdersNotInPosData, OrdersNotIn3poData
+    )
+
+    written = {}
+    try:
+        for model, key in (
+            (ZomatoPosVs3poData, "pos_vs_3po"),
+            (Zomato3poVsPosData, "3po_vs_pos"),
+            (Zomato3poVsPosRefundData, "refund"),
+            (OrdersNotInPosData, "not_in_pos"),
+            (OrdersNotIn3poData, "not_in_3po"),
+        ):
+            if replace is not None:
+                await delete_sheet_rows(db, model, replace, commit=False)
+            written[model.__tablename__] = await write_sheet(db, model, sheets[key], commit=False)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return written
@@ -0,0 +1,119 @@
+"""
+Per-store, per-day rollups maintained during ingestion
+
+Parsers that declare a ``rollup`` spec have their staged rows summed by
+store and business date just before the staging table is merged, in the
+same transaction. The sums are applied to ``store_daily_rollup`` with an
+additive upsert (``column = column + delta``). For upserted tables the
+stored values of rows about to be replaced are subtracted first, so
+reloading a changed order moves its totals instead of counting it twice.
+
+Every store-day the upload changed, including the ones updated rows moved
+away from, is also marked in ``reconciliation_dirty_partitions`` so that
+incremental sheet generation knows what to rebuild.
+"""
+
+from sqlalchemy import Table, Date, DateTime, cast, func, literal, select, true, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.main.dirty_partition import DirtyPartition
+from app.models.main.store_daily_rollup import StoreDailyRollup, ROLLUP_MEASURES
+from datetime import datetime
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_KEY = ["source", "store_code", "business_date"]
+ROLLUP_SUMS = ["txn_count"] + ROLLUP_MEASURES
+
+
+def business_date(column, dialect: str):
+    """Calendar date of a date or datetime column"""
+    if isinstance(column.type, Date):
+        return column
+    if dialect == "postgresql":
+        return cast(column, Date)
+    return func.date(column)
+
+
+def _grouped(spec: Dict, table: Table, dialect: str, sign: int, join_on=None):
+    """Signed per-store, per-day sums of a table's rows"""
+    store = func.coalesce(table.c[spec["store"]], "")
+    day = business_date(table.c[spec["date"]], dialect)
+    sums = [(sign * func.count()).label("txn_count")]
+    for measure in ROLLUP_MEASURES:
+        column = spec["measures"].get(measure)
+        total = func.coalesce(func.sum(table.c[column]), 0) if column else literal(0)
+        sums.append((sign * total).label(measure))
+
+    query = select(store.label("store_code"), day.label("business_date"), *sums)
+    if join_on is not None:
+        query = query.select_from(join_on)
+    return query.where(table.c[spec["date"]].isnot(None)).group_by(store, day)
+
+
+def rollup_delta(spec: Dict, staging: Table, target: Table, dialect: str,
+                 upsert_key: Optional[str] = None):
+    """SELECT of the rollup changes a staged upload will make, one row per store-day"""
+    parts = [_grouped(spec, staging, dialect, 1)]
+    if upsert_key:
+        # Rows the merge will overwrite: take their stored values back out
+        joined = target.join(staging, target.c[upsert_key] == staging.c[upsert_key])
+        parts.append(_grouped(spec, target, dialect, -1, join_on=joined))
+
+    combined = union_all(*parts).subquery()
+    return select(
+        literal(spec["source"]).label("source"),
+        combined.c.store_code,
+        combined.c.business_date,
+        *[func.sum(combined.c[name]).label(name) for name in ROLLUP_SUMS],
+    ).group_by(combined.c.store_code, combined.c.business_date)
+
+
+def additive_upsert_statement(dialect: str, table: Table, from_select):
+    """INSERT ... SELECT that adds to the sums of rollup rows that already exist"""
+    columns = ROLLUP_KEY + ROLLUP_SUMS
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).from_select(columns, from_select)
+        return stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in ROLLUP_SUMS})
+    if dialect in ("postgresql", "sqlite"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table).from_select(columns, from_select)
+        return stmt.on_conflict_do_update(
+            index_elements=ROLLUP_KEY,
+            set_={name: table.c[name] + stmt.excluded[name] for name in ROLLUP_SUMS},
+        )
+    raise ValueError(f"Rollups are not supported for dialect '{dialect}'")
+
+
+def mark_dirty_statement(dialect: str, table: Table, from_select):
+    """INSERT ... SELECT of dirty marks that refreshes marked_at of existing ones"""
+    columns = ROLLUP_KEY + ["marked_at"]
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).from_select(columns, from_select)
+        return stmt.on_duplicate_key_update({"marked_at": stmt.inserted.marked_at})
+    if dialect in ("postgresql", "sqlite"):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table).from_select(columns, from_select)
+        return stmt.on_conflict_do_update(index_elements=ROLLUP_KEY, set_={"marked_at": stmt.excluded.marked_at})
+    raise ValueError(f"Dirty partitions are not supported for dialect '{dialect}'")
+
+
+async def apply_rollup(db: AsyncSession, spec: Dict, staging: Table, target: Table,
+                       upsert_key: Optional[str] = None):
+    """Add a staged upload's totals to the rollup and mark its store-days dirty; the caller commits"""
+    dialect = db.bind.dialect.name
+    delta = rollup_delta(spec, staging, target, dialect, upsert_key).subquery()
+    # The WHERE clauses keep SQLite's INSERT ... SELECT ... ON CONFLICT unambiguous
+    await db.execute(additive_upsert_statement(
+        dialect, StoreDailyRollup.__table__, select(delta).where(true())
+    ))
+    touched = select(
+        delta.c.source, delta.c.store_code, delta.c.business_date,
+        literal(datetime.utcnow(), DateTime).label("marked_at"),
+    ).where(true())
+    await db.execute(mark_dirty_statement(dialect, DirtyPartition.__table__, touched))
@@ -0,0 +1,139 @@
+"""
+Upload processing scheduler
+
+Caps how many uploads are processed at once, globally and per upload type,
+across every worker process. Queued uploads are those with status
+"uploaded"; an upload job first tries to claim a slot, and if none is free
+it is re-queued to try again shortly. Among uploads that could run, the
+oldest goes first.
+
+Slots are tracked through ``upload_logs`` itself: an upload holds a slot
+while its status is "processing". Processing uploads refresh ``updated_at``
+as they report progress, and waiting uploads refresh it on every attempt,
+so rows left behind by a crashed worker or a lost job stop counting after
+``upload_slot_stale_seconds``.
+"""
+
+from sqlalchemy import select, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.database import sso_db_session
+from app.config.settings import settings
+from app.models.main.upload_record import UploadRecord
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLAIMED = "claimed"
+WAIT = "wait"
+SKIP = "skip"
+
+LOCK_NAME = "upload_scheduler"
+
+
+class UploadScheduler:
+    """Global and per-type concurrency limits for upload processing"""
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_per_type: Optional[int] = None,
+                 type_limits: Optional[Dict[str, int]] = None):
+        self.max_concurrent = max_concurrent or settings.upload_max_concurrent
+        self.max_per_type = max_per_type or settings.upload_max_concurrent_per_type
+        self.type_limits = settings.upload_type_limits if type_limits is None else type_limits
+
+    def limit_for(self, upload_type: str) -> int:
+        return self.type_limits.get(upload_type, self.max_per_type)
+
+    async def claim(self, upload_id: int, upload_type: str) -> str:
+        """Try to start processing an upload
+
+        Returns CLAIMED when the upload may run now (its status is set to
+        "processing"), WAIT when it has to wait for a slot, and SKIP when it
+        no longer needs processing.
+        """
+        async with sso_db_session() as db:
+            return await self.claim_with_session(db, upload_id, upload_type)
+
+    async def claim_with_session(self, db: AsyncSession, upload_id: int, upload_type: str) -> str:
+        async with scheduler_lock(db):
+            decision, ahead = await self._decide(db, upload_id, upload_type)
+            if decision == CLAIMED:
+                await UploadRecord.update(db, upload_id, status="processing", message="Processing started")
+            elif decision == WAIT:
+                # Also serves as the heartbeat that keeps this upload's place in line
+                await UploadRecord.update(db, upload_id,
+                    message=f"Waiting for a processing slot ({ahead} ahead)")
+            return decision
+
+    async def _decide(self, db: AsyncSession, upload_id: int, upload_type: str):
+        record = await UploadRecord.get_by_id(db, upload_id)
+        if record is None or record.status in ("completed", "failed"):
+            return SKIP, 0
+        if record.status == "processing":
+            # Redelivered after a worker died; the upload already holds its slot
+            return CLAIMED, 0
+
+        fresh_since = datetime.utcnow() - timedelta(seconds=settings.upload_slot_stale_seconds)
+        result = await db.execute(
+            select(UploadRecord.upload_type, func.count(UploadRecord.id))
+            .where(UploadRecord.status == "processing", UploadRecord.updated_at >= fresh_since)
+            .group_by(UploadRecord.upload_type)
+        )
+        running = dict(result.all())
+
+        if sum(running.values()) >= self.max_concurrent:
+            return WAIT, await self._count_ahead(db, upload_id, fresh_since)
+        if running.get(upload_type, 0) >= self.limit_for(upload_type):
+            return WAIT, await self._count_ahead(db, upload_id, fresh_since)
+
+        # FIFO: an older waiting upload whose type has room goes first
+        result = await db.execute(
+            select(UploadRecord.upload_type)
+            .where(
+                UploadRecord.status == "uploaded",
+                UploadRecord.id < upload_id,
+                UploadRecord.updated_at >= fresh_since,
+            )
+            .order_by(UploadRecord.id)
+        )
+        for (waiting_type,) in result.all():
+            if running.get(waiting_type, 0) < self.limit_for(waiting_type):
+                return WAIT, await self._count_ahead(db, upload_id, fresh_since)
+
+        return CLAIMED, 0
+
+    async def _count_ahead(self, db: AsyncSession, upload_id: int, fresh_since: datetime) -> int:
+        result = await db.execute(
+            select(func.count(UploadRecord.id)).where(
+                UploadRecord.status == "uploaded",
+                UploadRecord.id < upload_id,
+                UploadRecord.updated_at >= fresh_since,
+            )
+        )
+        return result.scalar() or 0
+
+
+@asynccontextmanager
+async def scheduler_lock(db: AsyncSession):
+    """Serialize claims across worker processes
+
+    The MySQL named lock is held on its own connection, since the session
+    returns its connection to the pool on every commit. Other dialects
+    (tests) rely on their own write locking.
+    """
+    if db.bind.dialect.name != "mysql":
+        yield
+        return
+
+    async with db.bind.connect() as lock_conn:
+        result = await lock_conn.execute(text("SELECT GET_LOCK(:name, 10)"), {"name": LOCK_NAME})
+        if result.scalar() != 1:
+            raise TimeoutError("Timed out waiting for the upload scheduler lock")
+        try:
+            yield
+        finally:
+            await lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": LOCK_NAME})
+
+
+upload_scheduler = UploadScheduler()
@@ -0,0 +1,378 @@
+"""
+Set-based reconciliation inside the database
+
+The in-process engine (``reconciliation``) copies every POS and Zomato row
+of a period into Python to join them. This engine instead sends one
+``INSERT ... SELECT`` per sheet table and lets MySQL do the joins: matched
+orders go to the two Zomato POS vs 3PO sheets, refunds are joined back to
+their POS orders, and anti-joins (``NOT EXISTS``) find the orders missing on
+either side. Only the statements travel over the connection.
+
+POS orders live in the main database, so it must be on the same server as
+the sso database; its tables are addressed by schema name
+(``reconciliation_main_schema``). Orders are matched on the merchant order
+ID (falling back to Zomato's own ID), within the same stores and with the
+same ``reconciliation_match_slack_minutes`` window as the in-process engine.
+There is no fuzzy pass: orders without a shared ID land in the "not in"
+sheets. The charge formulas mirror ``expected_charges``, with each row's
+rates looked up in the organization's rate cards (``rates.rate_columns``).
+
+Once a partition's rows are in, one ``UPDATE`` per sheet table sets the
+reason, ``reconciled_status`` and the reconciled and unreconciled amounts
+from the stored delta columns, with the organization's reason rules
+compiled to ``CASE`` expressions (``reasons.classify_sql``).
+"""
+
+from sqlalchemy import MetaData, Table, and_, case, exists, func, insert, literal, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config.settings import settings
+from app.workers.rates import RateTable, load_rate_table, rate_columns
+from app.workers.reasons import classify_sql, load_reason_rules, rules_with_defaults
+from app.workers.reconciliation import (
+    ADJUSTMENT_FIELDS, AMOUNT_FIELDS, RECONCILED, Partition,
+    _store_filter, delete_sheet_rows, parse_period,
+)
+from app.workers.rollup import business_date
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+_pos_tables: Dict[str, Table] = {}
+
+
+def main_schema() -> str:
+    """Name of the main database as a schema on the sso connection"""
+    if settings.reconciliation_main_schema:
+        return settings.reconciliation_main_schema
+    if settings.environment == "production":
+        return settings.production_main_db_name
+    return settings.main_db_name
+
+
+def pos_orders_table() -> Table:
+    """The POS orders table qualified with the main database's schema"""
+    from app.models.main.orders import Orders
+
+    schema = main_schema()
+    if schema not in _pos_tables:
+        _pos_tables[schema] = Orders.__table__.to_metadata(MetaData(), schema=schema)
+    return _pos_tables[schema]
+
+
+def _rate(value):
+    return literal(value) if isinstance(value, (int, float)) else value
+
+
+def charge_columns(net, tax, rates: Dict[str, object]) -> Dict[str, object]:
+    """SQL expressions for ``expected_charges``; rates are numbers or SQL expressions"""
+    commission = net * _rate(rates["commission_rate"])
+    pg_applied_on = net + tax
+    pg_charge = pg_applied_on * _rate(rates["pg_rate"])
+    taxes_zomato_fee = (commission + pg_charge) * _rate(rates["fee_gst_rate"])
+    tds = net * _rate(rates["tds_rate"])
+    final = net - commission - pg_charge - taxes_zomato_fee - tds
+    amounts = {
+        "net_amount": net,
+        "tax_paid_by_customer": tax,
+        "commission_value": commission,
+        "pg_applied_on": pg_applied_on,
+        "pg_charge": pg_charge,
+        "taxes_zomato_fee": taxes_zomato_fee,
+        "tds_amount": tds,
+        "final_amount": final,
+    }
+    return {name: func.round(value, 2) for name, value in amounts.items()}
+
+
+def _amount(column):
+    # Missing amounts count as zero, like the in-process engine
+    return func.coalesce(column, 0)
+
+
+class SheetQueries:
+    """INSERT ... SELECT statements that fill every sheet table for one partition"""
+
+    def __init__(self, partition: Partition, rates: Union[Dict[str, float], RateTable], tolerance: float,
+                 dialect: str, rules: Optional[Dict[str, List[dict]]] = None):
+        from app.models.sso.reconciliation import ZomatoOrder
+
+        self.partition = partition
+        self.rates = rates
+        self.rules = rules_with_defaults(rules)
+        self.tolerance = tolerance
+        self.dialect = dialect
+        self.zomato = ZomatoOrder.__table__
+        self.pos = pos_orders_table()
+        slack = timedelta(minutes=settings.reconciliation_match_slack_minutes)
+        self.slack_start = partition.start - slack
+        self.slack_end = partition.end + slack
+
+    # Row sets
+
+    def _in_stores(self, column) -> list:
+        return [_store_filter(column, self.partition.store_codes)] if self.partition.store_codes else []
+
+    def zomato_rows(self, action: str, start: datetime, end: datetime) -> list:
+        zomato = self.zomato
+        return [zomato.c.order_date >= start, zomato.c.order_date < end,
+                zomato.c.action == action, *self._in_stores(zomato.c.store_code)]
+
+    def pos_rows(self, start: datetime, end: datetime) -> list:
+        pos = self.pos
+        return [pos.c.order_date >= start, pos.c.order_date < end, *self._in_stores(pos.c.store_code)]
+
+    def matches_pos(self):
+        """Join condition of a Zomato row to the POS order it names"""
+        zomato = self.zomato
+        key = func.coalesce(func.nullif(zomato.c.pos_order_id, ""), zomato.c.order_id)
+        return and_(self.pos.c.order_id == key, *self.pos_rows(self.slack_start, self.slack_end))
+
+    # Column sets
+
+    def _rates(self, table) -> Dict[str, object]:
+        """Rates for rows of the Zomato or POS table, by their store and date"""
+        if not isinstance(self.rates, RateTable):
+            return self.rates
+        return rate_columns(self.rates, table.c.store_code, business_date(table.c.order_date, self.dialect))
+
+    def _common(self) -> Dict[str, object]:
+        zomato = self.zomato
+        return {
+            "id": zomato.c.id,
+            "pos_order_id": self.pos.c.order_id,
+            "zomato_order_id": zomato.c.order_id,
+            "order_date": business_date(zomato.c.order_date, self.dialect),
+            "store_name": zomato.c.store_code,
+            "match_confidence": literal(1.0),
+        }
+
+    def _reported(self) -> Dict[str, object]:
+        return {name: _amount(self.zomato.c[name]) for name in AMOUNT_FIELDS}
+
+    def _from_pos(self, rates) -> Dict[str, object]:
+        return charge_columns(_amount(self.pos.c.order_amount), _amount(self.pos.c.tax_amount), rates)
+
+    def _calculated(self, reported, rates) -> Dict[str, object]:
+        calculated = charge_columns(reported["net_amount"], reported["tax_paid_by_customer"], rates)
+        return {f"calculated_zomato_{name}": calculated[name] for name in AMOUNT_FIELDS}
+
+    def _fixed(self) -> Dict[str, object]:
+        return {f"fixed_{name}": _amount(self.zomato.c[name]) for name in ADJUSTMENT_FIELDS}
+
+    # Statements
+
+    def _insert(self, model, columns: Dict[str, object], source, *criteria):
+        now = datetime.utcnow()
+        columns = {**columns, "created_at": literal(now), "updated_at": literal(now)}
+        query = select(*[value.label(name) for name, value in columns.items()]).select_from(source)
+        return insert(model.__table__).from_select(list(columns), query.where(*criteria))
+
+    def pos_vs_3po(self):
+        from app.models.sso import ZomatoPosVs3poData
+
+        rates = self._rates(self.zomato)
+        reported, from_pos = self._reported(), self._from_pos(rates)
+        columns = self._common()
+        for name in AMOUNT_FIELDS:
+            columns[f"pos_{name}"] = from_pos[name]
+            columns[f"zomato_{name}"] = reported[name]
+            columns[f"pos_vs_zomato_{name}_delta"] = func.round(from_pos[name] - reported[name], 2)
+        columns["order_status_pos"] = self.pos.c.status
+        return self._insert(ZomatoPosVs3poData, columns, self.zomato.join(self.pos, self.matches_pos()),
+                            *self.zomato_rows("sale", self.partition.start, self.partition.end))
+
+    def three_po_vs_pos(self):
+        from app.models.sso import Zomato3poVsPosData
+
+        rates = self._rates(self.zomato)
+        reported, from_pos = self._reported(), self._from_pos(rates)
+        columns = self._common()
+        for name in AMOUNT_FIELDS:
+            columns[f"zomato_{name}"] = reported[name]
+            columns[f"pos_{name}"] = from_pos[name]
+            columns[f"zomato_vs_pos_{name}_delta"] = func.round(reported[name] - from_pos[name], 2)
+        columns.update(self._calculated(reported, rates))
+        columns.update(self._fixed())
+        columns["order_status_zomato"] = self.zomato.c.order_status
+        return self._insert(Zomato3poVsPosData, columns, self.zomato.join(self.pos, self.matches_pos()),
+                            *self.zomato_rows("sale", self.partition.start, self.partition.end))
+
+    def refunds(self):
+        """Refund rows with the POS order they reverse, if any"""
+        from app.models.sso import Zomato3poVsPosRefundData
+
+        zomato = self.zomato
+        # Refunds may be reported as negative amounts; a full refund equals the POS order value
+        refunded = func.abs(_amount(zomato.c.net_amount))
+        pos_net = _amount(self.pos.c.order_amount)
+        delta = func.round(refunded - pos_net, 2)
+        columns = {
+            "id": zomato.c.id,
+            "zomato_order_id": zomato.c.order_id,
+            "pos_order_id": self.pos.c.order_id,
+            "order_date": business_date(zomato.c.order_date, self.dialect),
+            "store_name": zomato.c.store_code,
+            "zomato_net_amount": zomato.c.net_amount,
+            "pos_net_amount": self.pos.c.order_amount,
+            "zomato_vs_pos_net_amount_delta": delta,
+            "order_status_zomato": zomato.c.order_status,
+        }
+        return self._insert(Zomato3poVsPosRefundData, columns, zomato.outerjoin(self.pos, self.matches_pos()),
+                            *self.zomato_rows("refund", self.partition.start, self.partition.end))
+
+    def not_in_pos(self):
+        """Zomato sales whose order is missing from POS (anti-join)"""
+        from app.models.sso import OrdersNotInPosData
+
+        zomato = self.zomato
+        reported = self._reported()
+        columns = {
+            "id": zomato.c.id,
+            "zomato_order_id": zomato.c.order_id,
+            "order_date": business_date(zomato.c.order_date, self.dialect),
+            "store_name": zomato.c.store_code,
+            **{f"zomato_{name}": reported[name] for name in AMOUNT_FIELDS},
+            **self._calculated(reported, self._rates(zomato)),
+            **self._fixed(),
+            "order_status_zomato": zomato.c.order_status,
+        }
+        missing = ~exists().where(self.matches_pos())
+        return self._insert(OrdersNotInPosData, columns, zomato,
+                            *self.zomato_rows("sale", self.partition.start, self.partition.end), missing)
+
+    def not_in_3po(self):
+        """POS orders no Zomato sale refers to (anti-join)"""
+        from app.models.sso import OrdersNotIn3poData
+
+        pos, zomato = self.pos, self.zomato
+        from_pos = self._from_pos(self._rates(pos))
+        columns = {
+            "id": pos.c.order_id,
+            "pos_order_id": pos.c.order_id,
+            "order_date": business_date(pos.c.order_date, self.dialect),
+            "store_name": pos.c.store_code,
+            **{f"pos_{name}": from_pos[name] for name in AMOUNT_FIELDS},
+            "order_status_pos": pos.c.status,
+        }
+        # One anti-join per way a sale can name the order, so each can use its index
+        sales = self.zomato_rows("sale", self.slack_start, self.slack_end)
+        named = ~exists().where(zomato.c.pos_order_id == pos.c.order_id, *sales)
+        by_zomato_id = ~exists().where(
+            zomato.c.order_id == pos.c.order_id,
+            or_(zomato.c.pos_order_id.is_(None), zomato.c.pos_order_id == ""),
+            *sales,
+        )
+        return self._insert(OrdersNotIn3poData, columns, pos,
+                            *self.pos_rows(self.partition.start, self.partition.end), named, by_zomato_id)
+
+    # Reasons
+
+    def classify(self, model, kind: str, reason_column: str, fields: Dict[str, object], settled, gap):
+        """UPDATE setting the reason, status and amounts of a sheet's rows in the partition"""
+        table = model.__table__
+        reason, status = classify_sql(fields, self.rules[kind], self.tolerance)
+        reconciled = status == RECONCILED
+        return update(table).where(
+            table.c.order_date >= self.partition.start.date(),
+            table.c.order_date < self.partition.end.date(),
+            *self._in_stores(table.c.store_name),
+        ).values({
+            reason_column: reason,
+            "reconciled_status": status,
+            "reconciled_amount": case((reconciled, settled), else_=0),
+            "unreconciled_amount": case((reconciled, 0), else_=gap),
+        })
+
+    def classifications(self) -> list:
+        """(model, statement) classifying each of the five sheet tables"""
+        from app.models.sso import (
+            ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+            OrdersNotInPosData, OrdersNotIn3poData
+        )
+        pos_vs_3po = ZomatoPosVs3poData.__table__.c
+        three_po_vs_pos = Zomato3poVsPosData.__table__.c
+        refund = Zomato3poVsPosRefundData.__table__.c
+        not_in_pos = OrdersNotInPosData.__table__.c
+        not_in_3po = OrdersNotIn3poData.__table__.c
+        # Rules see POS minus Zomato deltas, whichever way round the sheet stores them
+        return [
+            (ZomatoPosVs3poData, self.classify(
+                ZomatoPosVs3poData, "matched", "pos_vs_zomato_reason",
+                {name: pos_vs_3po[f"pos_vs_zomato_{name}_delta"] for name in AMOUNT_FIELDS},
+                pos_vs_3po.zomato_final_amount, func.abs(pos_vs_3po.pos_vs_zomato_final_amount_delta),
+            )),
+            (Zomato3poVsPosData, self.classify(
+                Zomato3poVsPosData, "matched", "zomato_vs_pos_reason",
+                {name: -three_po_vs_pos[f"zomato_vs_pos_{name}_delta"] for name in AMOUNT_FIELDS},
+                three_po_vs_pos.zomato_final_amount, func.abs(three_po_vs_pos.zomato_vs_pos_final_amount_delta),
+            )),
+            (Zomato3poVsPosRefundData, self.classify(
+                Zomato3poVsPosRefundData, "refund", "zomato_vs_pos_reason",
+                {"net_amount": refund.zomato_vs_pos_net_amount_delta, "pos_order_id": refund.pos_order_id},
+                func.abs(_amount(refund.zomato_net_amount)), func.abs(refund.zomato_vs_pos_net_amount_delta),
+            )),
+            (OrdersNotInPosData, self.classify(
+                OrdersNotInPosData, "not_in_pos", "zomato_vs_pos_reason", {},
+                not_in_pos.zomato_final_amount, func.abs(not_in_pos.zomato_final_amount),
+            )),
+            (OrdersNotIn3poData, self.classify(
+                OrdersNotIn3poData, "not_in_3po", "pos_vs_zomato_reason", {},
+                not_in_3po.pos_final_amount, func.abs(not_in_3po.pos_final_amount),
+            )),
+        ]
+
+    def statements(self) -> list:
+        """(model, statement) for each of the five sheet tables"""
+        from app.models.sso import (
+            ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+            OrdersNotInPosData, OrdersNotIn3poData
+        )
+        return [
+            (ZomatoPosVs3poData, self.pos_vs_3po()),
+            (Zomato3poVsPosData, self.three_po_vs_pos()),
+            (Zomato3poVsPosRefundData, self.refunds()),
+            (OrdersNotInPosData, self.not_in_pos()),
+            (OrdersNotIn3poData, self.not_in_3po()),
+        ]
+
+
+async def reconcile_in_database(db: AsyncSession, request_data, partitions: Optional[List[Partition]] = None,
+                                rates: Union[Dict[str, float], RateTable, None] = None,
+                                replace: bool = False,
+                                rules: Optional[Dict[str, List[dict]]] = None) -> Dict[str, int]:
+    """Fill the five sheet tables for a request; returns the rows written per table
+
+    Without partitions the whole requested period is one partition, and
+    without rates or rules the request organization's rate cards and
+    reason rules apply. With replace, each partition's existing sheet rows
+    are deleted first; a partition is deleted, written and classified in
+    one transaction.
+    """
+    if rates is None:
+        rates = await load_rate_table(db, request_data.organization_id)
+    if rules is None:
+        rules = await load_reason_rules(db, request_data.organization_id)
+    if partitions is None:
+        start, end = parse_period(request_data.start_date, request_data.end_date)
+        partitions = [Partition(list(request_data.store_codes or []), start, end)]
+
+    written: Dict[str, int] = {}
+    for partition in partitions:
+        queries = SheetQueries(partition, rates, settings.reconciliation_tolerance, db.bind.dialect.name, rules)
+        try:
+            for model, statement in queries.statements():
+                if replace:
+                    await delete_sheet_rows(db, model, partition, commit=False)
+                result = await db.execute(statement)
+                written[model.__tablename__] = written.get(model.__tablename__, 0) + max(result.rowcount, 0)
+            for model, statement in queries.classifications():
+                await db.execute(statement)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error reconciling {partition} in the database: {e}")
+            raise
+    logger.info(f"Reconciled {len(partitions)} partitions in the database: {written}")
+    return written
@@ -0,0 +1,142 @@
+"""
+Staging tables for upload ingestion
+
+Each ingest job bulk-loads into its own staging table, which carries the
+target's columns and unique keys but none of its secondary indexes. Readers
+of the live table never see partial rows and are not blocked by a long
+load. Once the staged rows pass validation they are merged into the live
+table with a single INSERT ... SELECT in one short transaction. The staging
+table is dropped afterwards, whether the load succeeded or failed.
+
+Tables keyed on a natural key (a row hash such as ``uid``) rather than an
+auto-increment id take repeated rows without failing: the staging load
+skips keys repeated within the file, and the merge drops staged rows whose
+key the live table already has, before the rollup and the copy.
+"""
+
+from sqlalchemy import MetaData, Table, Column, select, func, or_, true, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.workers.bulk_loader import insert_ignore_statement, upsert_statement
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StagingValidationError(Exception):
+    """Raised when staged rows must not be merged into the live table"""
+
+
+def staging_table_name(table: Table, upload_id: int) -> str:
+    # MySQL identifiers are limited to 64 characters
+    return f"stg_{upload_id}_{table.name}"[:64]
+
+
+def build_staging_table(table: Table, name: str) -> Table:
+    """Copy of a table's columns and unique keys, without secondary indexes"""
+    columns = []
+    for column in table.columns:
+        staged: Column = column._copy()
+        staged.index = None
+        columns.append(staged)
+    return Table(name, MetaData(), *columns)
+
+
+@asynccontextmanager
+async def staging_table(db: AsyncSession, table: Table, upload_id: int):
+    """Create a fresh staging table for a job and always drop it afterwards"""
+    staging = build_staging_table(table, staging_table_name(table, upload_id))
+    conn = await db.connection()
+    # A retried job may find the table left behind by a crashed attempt
+    await conn.run_sync(lambda sync_conn: staging.drop(sync_conn, checkfirst=True))
+    await conn.run_sync(staging.create)
+    await db.commit()
+    try:
+        yield staging
+    finally:
+        try:
+            await db.rollback()
+            conn = await db.connection()
+            await conn.run_sync(lambda sync_conn: staging.drop(sync_conn, checkfirst=True))
+            await db.commit()
+        except Exception as e:
+            logger.error(f"Could not drop staging table {staging.name}: {e}")
+
+
+async def count_rows(db: AsyncSession, table: Table) -> int:
+    result = await db.execute(select(func.count()).select_from(table))
+    return result.scalar() or 0
+
+
+async def validate_staging(db: AsyncSession, staging: Table, required: List[str],
+                           expected_rows: Optional[int] = None) -> int:
+    """Check the staged rows before they are merged; returns the staged row count"""
+    staged_rows = await count_rows(db, staging)
+    if expected_rows is not None and staged_rows != expected_rows:
+        raise StagingValidationError(
+            f"Staged {staged_rows} rows but loaded {expected_rows}; refusing to merge"
+        )
+
+    if required and staged_rows:
+        result = await db.execute(
+            select(func.count()).select_from(staging)
+            .where(or_(*[staging.c[name].is_(None) for name in required]))
+        )
+        missing = result.scalar() or 0
+        if missing:
+            raise StagingValidationError(
+                f"{missing} staged rows are missing required values ({', '.join(required)})"
+            )
+    return staged_rows
+
+
+def natural_key(table: Table) -> Optional[str]:
+    """The table's primary key column if it holds data (not an auto-increment id)"""
+    keys = [column.name for column in table.primary_key.columns if column is not table.autoincrement_column]
+    return keys[0] if len(keys) == 1 else None
+
+
+def merge_columns(staging: Table, target: Table) -> List[str]:
+    """Columns copied into the live table; auto-increment ids are assigned there"""
+    skip = target.autoincrement_column.name if target.autoincrement_column is not None else None
+    return [column.name for column in staging.columns if column.name != skip]
+
+
+async def merge_staging(db: AsyncSession, staging: Table, target: Table,
+                        upsert_key: Optional[str] = None,
+                        before_merge: Optional[Callable[[AsyncSession], Awaitable]] = None):
+    """Copy staged rows into the live table in one transaction; returns the duplicates skipped
+
+    With upsert_key, existing rows with the same key are updated in place.
+    Otherwise staged rows whose natural key the live table already has are
+    dropped and counted, and the rest are inserted. before_merge, if given,
+    is awaited inside the same transaction just before the copy, while the
+    live table still holds the old rows and the staging table only the
+    rows to be merged.
+    """
+    dialect = db.bind.dialect.name
+    columns = merge_columns(staging, target)
+    key = None if upsert_key else natural_key(target)
+    # The WHERE clause keeps SQLite's INSERT ... SELECT ... ON CONFLICT unambiguous
+    source = select(*[staging.c[name] for name in columns]).where(true())
+    if upsert_key:
+        stmt = upsert_statement(dialect, target, upsert_key, columns, from_select=source)
+    elif key:
+        stmt = insert_ignore_statement(dialect, target, columns, from_select=source)
+    else:
+        stmt = insert(target).from_select(columns, source)
+
+    duplicates = 0
+    try:
+        if key:
+            result = await db.execute(delete(staging).where(staging.c[key].in_(select(target.c[key]))))
+            duplicates = max(result.rowcount, 0)
+        if before_merge is not None:
+            await before_merge(db)
+        await db.execute(stmt)
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    return duplicates
@@ -3,8 +3,13 @@ Background tasks and scheduled jobs
 """
 
 import asyncio
+import json
+import os
+import time
 from datetime import datetime
-from app.config.database import get_sso_db, get_main_db
+from typing import Optional
+from app.config.database import sso_db_session
+from app.config.settings import settings
 from app.utils.email import send_email
 import logging
 
@@ -59,125 +64,199 @@ async def send_notification_email(recipients: list, subject: str, body: str):
         logger.error(f"Error sending notification email: {e}")
 
 
-async def process_upload_file(upload_id: int, file_path: str, upload_type: str):
-    """Process uploaded file in background"""
+def upload_summary_message(summary: dict) -> str:
+    """Short status message for a finished upload"""
+    message = f"Processed {summary['rows']} rows"
+    if summary.get("invalid_rows"):
+        message += f", skipped {summary['invalid_rows']} invalid rows"
+    if "inserted" in summary:
+        message += (f" ({summary['inserted']} inserted, {summary['updated']} updated, "
+                    f"{summary['unchanged']} unchanged)")
+    return message
+
+
+async def process_upload_file(upload_id: int, file_path: str, upload_type: str,
+                              final_attempt: bool = True):
+    """Process uploaded file in background
+
+    When final_attempt is False, transient errors are re-raised so the job
+    queue can retry instead of marking the upload failed.
+    """
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+    from app.workers.ingestion import ingest_upload
+    from app.workers.jobs import TRANSIENT_ERRORS
+    
+    working_copy = False
     try:
         logger.info(f"Starting background processing for upload {upload_id}")
         
-        # Get database session
-        async with get_main_db() as db:
-            from app.models.main.upload_record import UploadRecord
-            
-            # Update status to processing
-            await UploadRecord.update(db, upload_id, status="processing")
-            
-            # Process file based on type
-            if upload_type == "reconciliation":
-                await process_reconciliation_file(db, upload_id, file_path)
-            elif upload_type == "sheet_data":
-                await process_sheet_data_file(db, upload_id, file_path)
-            else:
-                await process_generic_file(db, upload_id, file_path)
-            
-            # Update status to completed
-            await UploadRecord.update(db, upload_id, status="completed")
-            logger.info(f"Background processing completed for upload {upload_id}")
+        # Upload records are written through the SSO session by the uploader routes
+        async with sso_db_session() as db:
+            upload_record = await UploadRecord.update(db, upload_id, status="processing")
+        
+        async def report_progress(progress: dict):
+            async with sso_db_session() as db:
+                await UploadRecord.update(db, upload_id,
+                    message=f"Processing: {progress['rows_loaded']} rows loaded",
+                    processed_data=json.dumps({"progress": progress})
+                )
+        
+        # Stored uploads are compressed; parsers need a plain, seekable file
+        if upload_record and upload_record.storage_key:
+            await asyncio.to_thread(get_blob_store().fetch, upload_record.storage_key, file_path)
+            working_copy = True
+        
+        # Parse and load the file with the parser registered for its type,
+        # reusing the parse cache from an earlier run when it is still valid
+        summary = await ingest_upload(upload_id, file_path, upload_type,
+            cache_path=upload_record.cache_path if upload_record else None,
+            cache_version=upload_record.cache_version if upload_record else None,
+            progress_callback=report_progress
+        )
+        
+        async with sso_db_session() as db:
+            await UploadRecord.update(db, upload_id,
+                status="completed",
+                message=upload_summary_message(summary),
+                processed_data=json.dumps(summary),
+                cache_path=summary["cache_path"],
+                cache_version=summary["parser_version"] if summary["cache_path"] else None
+            )
+        logger.info(f"Background processing completed for upload {upload_id}")
             
     except Exception as e:
+        if not final_attempt and isinstance(e, TRANSIENT_ERRORS):
+            raise
         logger.error(f"Error processing upload {upload_id}: {e}")
         # Update status to failed
         try:
-            async with get_main_db() as db:
-                from app.models.main.upload_record import UploadRecord
+            async with sso_db_session() as db:
                 await UploadRecord.update(db, upload_id, status="failed", message=str(e))
-        except:
+        except Exception:
             pass
+    finally:
+        if working_copy:
+            _remove_working_copy(file_path)
 
 
-async def process_reconciliation_file(db, upload_id: int, file_path: str):
-    """Process reconciliation file"""
-    # TODO: Implement reconciliation file processing logic
-    logger.info(f"Processing reconciliation file: {file_path}")
-    pass
-
-
-async def process_sheet_data_file(db, upload_id: int, file_path: str):
-    """Process sheet data file"""
-    # TODO: Implement sheet data file processing logic
-    logger.info(f"Processing sheet data file: {file_path}")
-    pass
-
-
-async def process_generic_file(db, upload_id: int, file_path: str):
-    """Process generic file"""
-    # TODO: Implement generic file processing logic
-    logger.info(f"Processing generic file: {file_path}")
-    pass
-
+def _remove_working_copy(file_path: str):
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not delete working copy {file_path}: {e}")
+
+
+async def cleanup_upload_files(storage_key: Optional[str], filepath: str, cache_path: Optional[str]):
+    """Remove the files of a deleted upload
+
+    The stored file is shared by every upload with the same contents, so it
+    is deleted only once no upload references it.
+    """
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+    from app.workers.parse_cache import remove_cache
+    from app.workers.validation import error_path_for, remove_error_file
+
+    await asyncio.to_thread(remove_cache, cache_path)
+    await asyncio.to_thread(remove_error_file, error_path_for(filepath))
+    if not storage_key:
+        # Uploads made before content-addressed storage kept a plain local file
+        await asyncio.to_thread(_remove_working_copy, filepath)
+        return
+
+    async with sso_db_session() as db:
+        referenced = await UploadRecord.is_stored_file_referenced(db, storage_key)
+    if not referenced:
+        await asyncio.to_thread(get_blob_store().delete, storage_key)
+        logger.info(f"Deleted stored file {storage_key}")
+
+
+async def collect_storage_garbage() -> int:
+    """Delete stored files no upload references
+
+    Files newer than ``storage_gc_grace_seconds`` are kept, since an upload
+    stores its file just before its record is created. Returns the number
+    of files deleted.
+    """
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+
+    store = get_blob_store()
+    cutoff = time.time() - settings.storage_gc_grace_seconds
+    async with sso_db_session() as db:
+        referenced = await UploadRecord.get_storage_keys(db)
+
+    def sweep() -> int:
+        deleted = 0
+        for key, modified in store.list():
+            if modified < cutoff and key not in referenced:
+                store.delete(key)
+                deleted += 1
+        return deleted
+
+    deleted = await asyncio.to_thread(sweep)
+    logger.info(f"Storage garbage collection deleted {deleted} unreferenced files")
+    return deleted
+
+
+async def process_sheet_data_generation(job_id: str, request_data, final_attempt: bool = True):
+    """Process sheet data generation in background
+
+    Both engines fill all five sheet tables: the two Zomato POS vs 3PO
+    sheets, refunds, and the orders missing from POS or from Zomato.
+    Every partition's existing rows are deleted before it is written, in
+    both modes, so a retried job rewrites the partitions an earlier
+    attempt already committed instead of inserting them twice. A failure
+    on the last attempt is logged and re-raised, so the job is reported
+    failed.
+    """
+    from app.workers.jobs import TRANSIENT_ERRORS
 
-async def process_sheet_data_generation(job_id: str, request_data):
-    """Process sheet data generation in background"""
     try:
         logger.info(f"Starting sheet data generation for job {job_id}")
         
         # Get database session
-        async with get_sso_db() as db:
-            from app.models.sso import (
-                ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
-                OrdersNotInPosData, OrdersNotIn3poData
+        async with sso_db_session() as db:
+            from app.workers.reconciliation import (
+                choose_engine, iter_reconciled_partitions, plan_dirty_partitions, clear_dirty_partitions,
+                write_partition_sheets
             )
-            
-            # Process each sheet type
-            if request_data.sheet_type == "zomato_pos_vs_3po":
-                await process_zomato_pos_vs_3po_data(db, request_data)
-            elif request_data.sheet_type == "zomato_3po_vs_pos":
-                await process_zomato_3po_vs_pos_data(db, request_data)
-            elif request_data.sheet_type == "zomato_3po_vs_pos_refund":
-                await process_zomato_3po_vs_pos_refund_data(db, request_data)
-            elif request_data.sheet_type == "orders_not_in_pos":
-                await process_orders_not_in_pos_data(db, request_data)
-            elif request_data.sheet_type == "orders_not_in_3po":
-                await process_orders_not_in_3po_data(db, request_data)
+            from app.workers.sql_reconciliation import reconcile_in_database
+
+            mode = request_data.mode or settings.sheet_generation_mode
+            started = datetime.utcnow()
+            if mode == "incremental":
+                # Only store-days changed by ingestion since their last run; their rows are replaced
+                partitions = await plan_dirty_partitions(request_data, started)
+                logger.info(f"Incremental sheet generation for job {job_id}: {len(partitions)} dirty partitions")
+            else:
+                partitions = None
+
+            engine = request_data.engine or settings.reconciliation_engine
+            if engine == "auto":
+                engine = await choose_engine(request_data, partitions)
+            logger.info(f"Sheet generation for job {job_id} uses the {engine} engine")
+
+            if engine == "sql":
+                # All five sheet tables are filled by INSERT ... SELECT inside the database
+                await reconcile_in_database(db, request_data, partitions, replace=True)
+            else:
+                # Partitions are written as they are reconciled, so only one is held in memory;
+                # each one replaces its rows in all five sheet tables
+                async for partition, sheets in iter_reconciled_partitions(request_data, partitions=partitions):
+                    await write_partition_sheets(db, sheets, replace=partition)
+            await clear_dirty_partitions(request_data, started)
             
             logger.info(f"Sheet data generation completed for job {job_id}")
             
     except Exception as e:
+        if not final_attempt and isinstance(e, TRANSIENT_ERRORS):
+            raise
         logger.error(f"Error in sheet data generation for job {job_id}: {e}")
-
-
-async def process_zomato_pos_vs_3po_data(db, request_data):
-    """Process Zomato POS vs 3PO data"""
-    # TODO: Implement data processing logic
-    logger.info("Processing Zomato POS vs 3PO data")
-    pass
-
-
-async def process_zomato_3po_vs_pos_data(db, request_data):
-    """Process Zomato 3PO vs POS data"""
-    # TODO: Implement data processing logic
-    logger.info("Processing Zomato 3PO vs POS data")
-    pass
-
-
-async def process_zomato_3po_vs_pos_refund_data(db, request_data):
-    """Process Zomato 3PO vs POS refund data"""
-    # TODO: Implement data processing logic
-    logger.info("Processing Zomato 3PO vs POS refund data")
-    pass
-
-
-async def process_orders_not_in_pos_data(db, request_data):
-    """Process orders not in POS data"""
-    # TODO: Implement data processing logic
-    logger.info("Processing orders not in POS data")
-    pass
-
-
-async def process_orders_not_in_3po_data(db, request_data):
-    """Process orders not in 3PO data"""
-    # TODO: Implement data processing logic
-    logger.info("Processing orders not in 3PO data")
-    pass
+        raise
 
 
 # Scheduled tasks
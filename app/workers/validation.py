@@ -0,0 +1,138 @@
+"""
+Row-level validation of parsed batches
+
+Checks run column-wise over whole batches. A row fails when a required
+value is missing or when a non-empty raw value could not be coerced to its
+column's type (an unparseable date or amount). Failed rows are dropped
+from the batch and written, with their original values and the reasons,
+to a gzip-compressed CSV sidecar next to the upload. The remaining rows
+keep loading.
+"""
+
+from app.config.settings import settings
+from collections import Counter
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+import gzip
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def error_path_for(file_path: str) -> str:
+    """Error sidecar location for an uploaded file"""
+    name = os.path.basename(file_path)
+    return os.path.join(settings.upload_dir, "errors", f"{name}.errors.csv.gz")
+
+
+def _present(raw: pd.Series) -> pd.Series:
+    if raw.dtype == object:
+        return raw.notna() & (raw.astype(str).str.strip() != "")
+    return raw.notna()
+
+
+def check_batch(raw: pd.DataFrame, typed: pd.DataFrame, column_types: Dict[str, str],
+                required: List[str]) -> Dict[str, pd.Series]:
+    """Boolean masks of failing rows, keyed by the reason they fail"""
+    failures = {}
+    unparseable = {}
+    for name, kind in column_types.items():
+        if kind == "string" or name not in raw:
+            continue
+        mask = _present(raw[name]) & typed[name].isna()
+        unparseable[name] = mask
+        if mask.any():
+            failures[f"{name}: invalid {kind}"] = mask
+
+    for name in required:
+        mask = typed[name].isna()
+        if typed[name].dtype == object:
+            mask |= typed[name].astype(str).str.strip() == ""
+        if name in unparseable:
+            mask &= ~unparseable[name]
+        if mask.any():
+            failures[f"{name}: required"] = mask
+    return failures
+
+
+def split_invalid(raw: pd.DataFrame, typed: pd.DataFrame, failures: Dict[str, pd.Series]):
+    """Separate valid typed rows from a report of the invalid raw rows"""
+    if not failures:
+        return typed, None
+
+    invalid = np.logical_or.reduce([mask.to_numpy() for mask in failures.values()])
+    report = raw.loc[invalid].copy()
+    parts = pd.DataFrame(
+        {reason: np.where(mask.loc[report.index], reason, None) for reason, mask in failures.items()},
+        index=report.index,
+    )
+    # stack() drops the empty cells, leaving each row's failed checks
+    reasons = parts.stack().groupby(level=0).agg("; ".join)
+    report.insert(0, "errors", reasons.reindex(report.index))
+    report.insert(0, "row", report.index)
+    return typed.loc[~invalid], report
+
+
+class ErrorSidecarWriter:
+    """Appends rejected rows to a gzip CSV and counts them by reason"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.reasons: Counter = Counter()
+        self._tmp_path = path + ".tmp"
+        self._file = None
+
+    def write(self, report: pd.DataFrame):
+        if report is None or report.empty:
+            return
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = gzip.open(self._tmp_path, "wt", encoding="utf-8", newline="")
+            report.to_csv(self._file, index=False)
+        else:
+            report.to_csv(self._file, index=False, header=False)
+        self.rows += len(report)
+        for errors in report["errors"]:
+            self.reasons.update(errors.split("; "))
+
+    def close(self) -> Optional[str]:
+        """Publish the sidecar; returns its path, or None when no row failed"""
+        if self._file is None:
+            remove_error_file(self.path)
+            return None
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+        remove_error_file(self._tmp_path)
+
+    def summary(self) -> dict:
+        return {"invalid_rows": self.rows, "errors": dict(self.reasons)}
+
+
+def remove_error_file(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def read_error_summary(path: str) -> dict:
+    """Counts from an existing sidecar, used when a run reads the parse cache"""
+    if not os.path.exists(path):
+        return {"invalid_rows": 0, "errors": {}}
+    reasons: Counter = Counter()
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=["errors"], dtype=str, chunksize=50000):
+        rows += len(chunk)
+        for errors in chunk["errors"].fillna(""):
+            reasons.update(errors.split("; "))
+    return {"invalid_rows": rows, "errors": dict(reasons)}
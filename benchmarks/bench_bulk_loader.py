@@ -0,0 +1,114 @@
+"""
+Benchmark bulk load modes against per-row ORM inserts
+
+Usage:
+    python -m benchmarks.bench_bulk_loader --rows 200000
+    python -m benchmarks.bench_bulk_loader --url mysql+aiomysql://user:pw@host/db --local-infile
+
+Creates a scratch copy of the orders table, loads the same synthetic rows
+with each mode and prints rows/second. The scratch table is dropped at
+the end. Defaults to the main database from settings.
+"""
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.config.settings import get_database_urls
+from app.models.main.orders import Orders
+from app.workers.bulk_loader import BulkLoader
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import time
+
+BENCH_TABLE = "bench_bulk_orders"
+
+
+def make_rows(count: int):
+    start = datetime(2025, 1, 1)
+    return [
+        {
+            "order_id": f"BENCH{i:09d}",
+            "store_code": f"S{i % 400:04d}",
+            "customer_name": f"Customer {i % 5000}",
+            "order_amount": round((i % 2000) * 1.37, 2),
+            "tax_amount": round((i % 2000) * 0.07, 2),
+            "order_date": start + timedelta(minutes=i),
+            "status": "Delivered",
+            "payment_method": "UPI" if i % 3 else "CARD",
+            "created_at": start,
+            "updated_at": start,
+        }
+        for i in range(count)
+    ]
+
+
+async def run_orm_per_row(session_factory, table, rows):
+    """Baseline: one add + commit per row, like Model.create()"""
+    async with session_factory() as db:
+        for row in rows:
+            await db.execute(table.insert().values(**row))
+            await db.commit()
+
+
+async def run_orm_batched(session_factory, table, rows, batch_size):
+    async with session_factory() as db:
+        for start in range(0, len(rows), batch_size):
+            for row in rows[start:start + batch_size]:
+                await db.execute(table.insert().values(**row))
+            await db.commit()
+
+
+async def run_loader(session_factory, table, rows, mode, batch_size):
+    async with session_factory() as db:
+        loader = BulkLoader(db, table, mode=mode, batch_size=batch_size)
+        await loader.add(rows)
+        await loader.flush()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=get_database_urls()[1])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--per-row-sample", type=int, default=2000,
+                        help="rows used for the per-row baseline, which is extrapolated")
+    parser.add_argument("--local-infile", action="store_true", help="also benchmark LOAD DATA LOCAL INFILE")
+    args = parser.parse_args()
+
+    connect_args = {"local_infile": True} if args.local_infile else {}
+    engine = create_async_engine(args.url, connect_args=connect_args)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    metadata = MetaData()
+    table = Orders.__table__.to_metadata(metadata, name=BENCH_TABLE)
+    rows = make_rows(args.rows)
+
+    cases = [
+        ("per-row commit", lambda: run_orm_per_row(session_factory, table, rows[:args.per_row_sample]),
+         args.per_row_sample),
+        ("row inserts, commit per batch", lambda: run_orm_batched(session_factory, table, rows, args.batch_size),
+         args.rows),
+        ("executemany", lambda: run_loader(session_factory, table, rows, "executemany", args.batch_size), args.rows),
+        ("multirow", lambda: run_loader(session_factory, table, rows, "multirow", args.batch_size), args.rows),
+    ]
+    if args.local_infile:
+        cases.append(("load_data", lambda: run_loader(session_factory, table, rows, "load_data", 50_000), args.rows))
+
+    print(f"{'mode':32} {'rows':>10} {'seconds':>10} {'rows/s':>12}")
+    try:
+        for name, run, count in cases:
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.drop_all)
+                await conn.run_sync(metadata.create_all)
+            started = time.perf_counter()
+            await run()
+            elapsed = time.perf_counter() - started
+            print(f"{name:32} {count:>10} {elapsed:>10.2f} {count / elapsed:>12.0f}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+"""
+Benchmark parallel reconciliation from 1 to N workers
+
+Usage:
+    python -m benchmarks.bench_reconciliation --orders 2000000 --stores 400 --max-workers 32
+
+Builds synthetic POS and Zomato orders for a month, shards them by store
+into partitions the way sheet generation does, and reconciles every
+partition with 1, 2, 4, ... workers. Prints orders/second and the speedup
+over one worker. Database loading and writing are not included, so this
+measures how the matching and arithmetic scale with cores; in production
+the sheet writer caps the end-to-end rate.
+
+Each run takes the path of a sheet generation job on the reconciliation
+worker (``--pool threads``): the job runs in a thread of the worker's
+main process on the job event loop (``jobs.run_async``), and partitions
+go through the shared ``process_pool``. With ``--prefork`` every run
+happens inside a daemonic child process instead, as in a prefork Celery
+worker, where the pool cannot start and partitions run in threads.
+"""
+
+from app.config.settings import settings
+from app.workers.reconciliation import (
+    ADJUSTMENT_FIELDS, AMOUNT_FIELDS, bounded_as_completed, default_rates, reconcile_frames,
+)
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import multiprocessing
+import time
+import numpy as np
+import pandas as pd
+
+
+def make_shards(orders: int, stores: int, shards: int, seed: int = 0):
+    """POS and Zomato frames per shard of stores; 5% of Zomato rows lack a POS order ID"""
+    rng = np.random.default_rng(seed)
+    store_ids = rng.integers(0, stores, orders)
+    times = pd.Timestamp("2025-03-01") + pd.to_timedelta(rng.integers(0, 30 * 86400, orders), unit="s")
+    amounts = np.round(rng.random(orders) * 800 + 50, 2)
+    order_ids = np.char.add("P", np.arange(orders).astype(str)).astype(object)
+
+    pos = pd.DataFrame({
+        "order_id": order_ids,
+        "store_code": np.char.add("S", store_ids.astype(str)).astype(object),
+        "order_date": times,
+        "order_amount": amounts,
+        "tax_amount": np.round(amounts * 0.05, 2),
+        "status": "Success",
+    })
+    zomato = pd.DataFrame({
+        "id": np.char.add("z", np.arange(orders).astype(str)).astype(object),
+        "order_id": np.char.add("Z", np.arange(orders).astype(str)).astype(object),
+        "pos_order_id": np.where(rng.random(orders) < 0.05, None, order_ids),
+        "store_code": pos["store_code"],
+        "order_date": times + pd.to_timedelta(rng.integers(-120, 120, orders), unit="s"),
+        "order_status": "delivered",
+    })
+    for name in AMOUNT_FIELDS + ADJUSTMENT_FIELDS:
+        zomato[name] = np.round(rng.random(orders) * 100, 2)
+    zomato["net_amount"] = amounts
+
+    shard_of = store_ids % shards
+    return [(pos[shard_of == shard], zomato[shard_of == shard]) for shard in range(shards)]
+
+
+async def reconcile_shards(shards, workers: int) -> float:
+    from app.workers.process_pool import process_pool
+
+    rates = default_rates()
+    fuzzy = {"window_minutes": 30, "amount_tolerance": 1.0, "nearest": 64}
+
+    async def reconcile(shard):
+        pos, zomato = shard
+        return await process_pool.run(reconcile_frames, pos, zomato, rates, 1.0, fuzzy)
+
+    await process_pool.warmup()
+    started = time.perf_counter()
+    async for _ in bounded_as_completed(shards, reconcile, workers):
+        pass
+    return time.perf_counter() - started
+
+
+def run(shards, workers: int) -> tuple:
+    """Seconds to reconcile every shard as a sheet generation job would, and whether the pool ran"""
+    from app.workers.jobs import run_async
+    from app.workers.process_pool import process_pool
+
+    settings.process_pool_workers = workers
+    try:
+        # Celery's threads pool runs each job in a thread of the worker process
+        with ThreadPoolExecutor(max_workers=1) as job_thread:
+            elapsed = job_thread.submit(run_async, reconcile_shards(shards, workers)).result()
+        return elapsed, process_pool.enabled
+    finally:
+        process_pool.shutdown()
+
+
+def run_in_prefork_child(shards, workers: int, results):
+    results.put(run(shards, workers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--stores", type=int, default=400)
+    parser.add_argument("--shards", type=int, default=64, help="partitions the stores are split into")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--prefork", action="store_true", help="run inside a daemonic child, as prefork does")
+    args = parser.parse_args()
+
+    shards = make_shards(args.orders, args.stores, args.shards)
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= args.max_workers:
+        worker_counts.append(worker_counts[-1] * 2)
+    if worker_counts[-1] != args.max_workers:
+        worker_counts.append(args.max_workers)
+
+    print(f"{'workers':>8} {'seconds':>10} {'orders/s':>12} {'speedup':>8} {'runs in':>10}")
+    baseline = None
+    for workers in worker_counts:
+        if args.prefork:
+            context = multiprocessing.get_context("fork")
+            results = context.Queue()
+            child = context.Process(target=run_in_prefork_child, args=(shards, workers, results), daemon=True)
+            child.start()
+            elapsed, pooled = results.get()
+            child.join()
+        else:
+            elapsed, pooled = run(shards, workers)
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {args.orders / elapsed:>12.0f} {baseline / elapsed:>8.2f} "
+              f"{'processes' if pooled else 'threads':>10}")
+
+
+if __name__ == "__main__":
+    main()
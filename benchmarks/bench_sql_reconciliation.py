@@ -0,0 +1,145 @@
+"""
+Benchmark the SQL push-down engine against the in-process engine
+
+Usage:
+    python -m benchmarks.bench_sql_reconciliation --orders 200000
+    python -m benchmarks.bench_sql_reconciliation --url mysql+aiomysql://user:pw@host/scratch --orders 1000000
+
+Loads the same synthetic POS orders and Zomato rows into one database,
+then builds the sheets with each engine and prints the time taken. The
+in-process engine loads both sides, matches them without the fuzzy pass
+and writes the two Zomato POS vs 3PO sheets; the SQL engine fills all five
+sheet tables with INSERT ... SELECT and classifies them with UPDATE. Defaults to a temporary SQLite file;
+a --url must point at a scratch database, as the sheet, orders and zomato
+tables are created in it and dropped at the end.
+"""
+
+from sqlalchemy import MetaData, delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from app.config.settings import settings
+from app.models.main.orders import Orders
+from app.models.sso import (
+    ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+    OrdersNotInPosData, OrdersNotIn3poData
+)
+from app.routes.sheet_data import GenerateSheetDataRequest
+from app.workers.bulk_loader import BulkLoader
+from app.workers.reasons import DEFAULT_REASON_RULES
+from app.workers.reconciliation import (
+    default_rates, load_pos_orders, load_zomato_orders, parse_period, reconcile_frames, write_sheet,
+)
+from app.workers.sql_reconciliation import reconcile_in_database
+from datetime import datetime, timedelta
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+SHEET_MODELS = (ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+                OrdersNotInPosData, OrdersNotIn3poData)
+
+
+def make_rows(count: int, stores: int):
+    """POS orders and Zomato sales for March; every 20th sale has no POS order"""
+    start = datetime(2025, 3, 1)
+    pos, zomato = [], []
+    for i in range(count):
+        placed = start + timedelta(seconds=i * 30 * 86400 // count)
+        amount = round((i % 2000) * 0.41 + 50, 2)
+        store = f"S{i % stores:04d}"
+        pos.append({
+            "order_id": f"P{i:09d}", "store_code": store, "order_amount": amount,
+            "tax_amount": round(amount * 0.05, 2), "order_date": placed, "status": "Success",
+        })
+        net_amount = amount + (i % 7 == 0) * 5
+        zomato.append({
+            "id": f"z{i:09d}", "order_id": f"Z{i:09d}",
+            "pos_order_id": f"P{i:09d}" if i % 20 else f"X{i:09d}",
+            "store_code": store, "order_date": placed + timedelta(minutes=1), "action": "sale",
+            "order_status": "delivered", "net_amount": net_amount,
+            "tax_paid_by_customer": round(amount * 0.05, 2), "final_amount": round(amount * 0.76, 2),
+        })
+    return pos, zomato
+
+
+async def run_python(session_factory, request, rates):
+    start, end = parse_period(request.start_date, request.end_date)
+    async with session_factory() as db:
+        pos = await load_pos_orders(db, start, end)
+        zomato = await load_zomato_orders(db, start, end)
+        sheets = reconcile_frames(pos, zomato, rates, settings.reconciliation_tolerance)
+        return {
+            ZomatoPosVs3poData.__tablename__: await write_sheet(db, ZomatoPosVs3poData, sheets["pos_vs_3po"]),
+            Zomato3poVsPosData.__tablename__: await write_sheet(db, Zomato3poVsPosData, sheets["3po_vs_pos"]),
+        }
+
+
+async def run_sql(session_factory, request, rates):
+    async with session_factory() as db:
+        return await reconcile_in_database(db, request, rates=rates, rules=DEFAULT_REASON_RULES)
+
+
+async def clear_sheets(session_factory):
+    async with session_factory() as db:
+        for model in SHEET_MODELS:
+            await db.execute(delete(model.__table__))
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="scratch database; defaults to a temporary SQLite file")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--stores", type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = None
+    if args.url:
+        url = args.url
+        settings.reconciliation_main_schema = url.rsplit("/", 1)[-1].split("?")[0]
+    else:
+        workdir = tempfile.mkdtemp()
+        url = f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"
+        settings.reconciliation_main_schema = "main"
+    engine = create_async_engine(url)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    metadata = MetaData()
+    for model in (Orders, ZomatoOrder) + SHEET_MODELS:
+        table = model.__table__.to_metadata(metadata)
+        if engine.dialect.name == "sqlite" and model in SHEET_MODELS:
+            # SQLite index names are per database and two sheet tables share theirs
+            table.indexes.clear()
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[])
+    rates = default_rates()
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+            await conn.run_sync(metadata.create_all)
+        pos, zomato = make_rows(args.orders, args.stores)
+        async with session_factory() as db:
+            for model, rows in ((Orders, pos), (ZomatoOrder, zomato)):
+                loader = BulkLoader(db, model.__table__)
+                await loader.add(rows)
+                await loader.flush()
+
+        print(f"{'engine':10} {'seconds':>10} {'orders/s':>12}  rows written")
+        for name, run in (("python", run_python), ("sql", run_sql)):
+            await clear_sheets(session_factory)
+            started = time.perf_counter()
+            written = await run(session_factory, request, rates)
+            elapsed = time.perf_counter() - started
+            print(f"{name:10} {elapsed:>10.2f} {args.orders / elapsed:>12.0f}  {written}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+        await engine.dispose()
+        if workdir:
+            os.remove(os.path.join(workdir, "bench.db"))
+            os.rmdir(workdir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
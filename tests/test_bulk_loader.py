@@ -0,0 +1,127 @@
+"""
+Tests for the bulk loader
+"""
+
+import pytest
+from sqlalchemy import MetaData, select, func
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["executemany", "multirow"])
+async def test_bulk_loader_commits_per_batch(tmp_path, mode):
+    """Test that rows are written in full batches plus a final flush"""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.orders import Orders
+    from app.workers.bulk_loader import BulkLoader
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'bulk.db'}")
+    metadata = MetaData()
+    table = Orders.__table__.to_metadata(metadata)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as db:
+        loader = BulkLoader(db, table, mode=mode, batch_size=10)
+        await loader.add([{"order_id": f"O{i}", "order_amount": float(i)} for i in range(25)])
+        assert loader.batches_committed == 2
+        await loader.flush()
+
+        assert loader.rows_loaded == 25
+        assert loader.batches_committed == 3
+        count = await db.execute(select(func.count()).select_from(table))
+        assert count.scalar() == 25
+
+    await engine.dispose()
+
+
+def test_bulk_loader_rejects_unknown_mode():
+    """Test that an unknown mode is rejected up front"""
+    from app.models.main.orders import Orders
+    from app.workers.bulk_loader import BulkLoader
+
+    with pytest.raises(ValueError):
+        BulkLoader(None, Orders.__table__, mode="copy")
+
+
+@pytest.mark.asyncio
+async def test_upsert_loader_only_writes_new_and_changed_rows(tmp_path):
+    """Test that re-loading an overlapping orders file skips unchanged rows"""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.orders import Orders
+    from app.workers.bulk_loader import UpsertLoader
+    from app.workers.parsers import get_parser, frame_to_records
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'upsert.db'}")
+    metadata = MetaData()
+    table = Orders.__table__.to_metadata(metadata)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+    parser = get_parser("orders")
+
+    def load_file(name, amounts):
+        path = tmp_path / name
+        lines = ["Bill No,Amount"] + [f"B{i},{amount}" for i, amount in amounts.items()]
+        path.write_text("\n".join(lines))
+        return [record for frame in parser.iter_batches(str(path), 100)
+                for record in frame_to_records(frame, parser.columns)]
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as db:
+        first = UpsertLoader(db, table, key="order_id", batch_size=7)
+        await first.add(load_file("day1.csv", {i: 100 + i for i in range(20)}))
+        await first.flush()
+        assert (first.inserted, first.updated, first.unchanged) == (20, 0, 0)
+
+        # Overlaps 15 orders, two of which changed, and adds five new ones
+        amounts = {i: 100 + i for i in range(5, 25)}
+        amounts[6] = 999
+        amounts[7] = 998
+        second = UpsertLoader(db, table, key="order_id", batch_size=7)
+        await second.add(load_file("day2.csv", amounts))
+        await second.flush()
+        assert (second.inserted, second.updated, second.unchanged) == (5, 2, 13)
+
+        count = await db.execute(select(func.count()).select_from(table))
+        assert count.scalar() == 25
+        amount = await db.execute(select(table.c.order_amount).where(table.c.order_id == "B6"))
+        assert amount.scalar() == 999
+
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_upsert_loader_counts_repeated_keys_once(tmp_path):
+    """Test that a key repeated within a batch or across batches of one load is inserted once"""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.orders import Orders
+    from app.workers.bulk_loader import UpsertLoader
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'upsert.db'}")
+    metadata = MetaData()
+    table = Orders.__table__.to_metadata(metadata)
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+    def order(order_id, amount):
+        return {"order_id": order_id, "order_amount": amount, "content_hash": f"{order_id}:{amount}"}
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as db:
+        loader = UpsertLoader(db, table, key="order_id", batch_size=3)
+        await loader.add([
+            order("B1", 10), order("B1", 10), order("B2", 20),
+            # Next batch: B1 again unchanged, B2 changed twice, B3 new
+            order("B1", 10), order("B2", 21), order("B2", 22),
+            order("B3", 30),
+        ])
+        await loader.flush()
+        assert (loader.inserted, loader.updated, loader.unchanged) == (3, 2, 2)
+
+        rows = await db.execute(select(table.c.order_id, table.c.order_amount).order_by(table.c.order_id))
+        assert rows.all() == [("B1", 10), ("B2", 22), ("B3", 30)]
+
+    await engine.dispose()
@@ -0,0 +1,124 @@
+"""
+Tests for streaming file upload utilities
+"""
+
+import io
+import os
+import pytest
+from app.utils.file_upload import copy_stream_to_file, FileTooLargeError
+
+
+def test_copy_stream_to_file_writes_all_bytes(tmp_path):
+    """Test that the stream is copied chunk by chunk and the byte count returned"""
+    data = os.urandom(10_000)
+    file_path = str(tmp_path / "upload.bin")
+
+    written = copy_stream_to_file(io.BytesIO(data), file_path, max_size=20_000, chunk_size=1024)
+
+    assert written == len(data)
+    with open(file_path, "rb") as f:
+        assert f.read() == data
+
+
+def test_copy_stream_to_file_aborts_when_too_large(tmp_path):
+    """Test that oversized uploads abort early and leave no partial file"""
+    file_path = str(tmp_path / "upload.bin")
+
+    with pytest.raises(FileTooLargeError):
+        copy_stream_to_file(io.BytesIO(b"x" * 5000), file_path, max_size=4096, chunk_size=1024)
+
+    assert not os.path.exists(file_path)
+
+
+async def _aiter(pieces):
+    for piece in pieces:
+        yield piece
+
+
+@pytest.mark.asyncio
+async def test_write_stream_at_offset_assembles_out_of_order_chunks(tmp_path):
+    """Test that chunks written at their offsets reassemble the original file"""
+    import hashlib
+    from app.utils.file_upload import preallocate_file, write_stream_at_offset
+
+    data = os.urandom(2500)
+    chunk_size = 1000
+    file_path = str(tmp_path / "session.part")
+    preallocate_file(file_path, len(data))
+
+    for index in (2, 0, 1):
+        chunk = data[index * chunk_size:(index + 1) * chunk_size]
+        pieces = [chunk[i:i + 300] for i in range(0, len(chunk), 300)]
+        checksum = await write_stream_at_offset(_aiter(pieces), file_path, index * chunk_size, len(chunk))
+        assert checksum == hashlib.sha256(chunk).hexdigest()
+
+    with open(file_path, "rb") as f:
+        assert f.read() == data
+
+
+@pytest.mark.asyncio
+async def test_write_stream_at_offset_rejects_wrong_length(tmp_path):
+    """Test that a chunk longer than expected is rejected"""
+    from app.utils.file_upload import preallocate_file, write_stream_at_offset, ChunkLengthError
+
+    file_path = str(tmp_path / "session.part")
+    preallocate_file(file_path, 100)
+
+    with pytest.raises(ChunkLengthError):
+        await write_stream_at_offset(_aiter([b"x" * 60, b"x" * 60]), file_path, 0, 100)
+
+
+class _Body:
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self):
+        return _aiter([self.data])
+
+
+class _User:
+    def __init__(self, username):
+        self.username = username
+
+
+@pytest.mark.asyncio
+async def test_session_chunk_resend_with_bad_checksum_leaves_chunk_missing(tmp_path):
+    """Test that a corrupt resend un-marks the chunk and other users cannot touch the session"""
+    pytest.importorskip("aiosqlite")
+    import hashlib
+    from fastapi import HTTPException
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.upload_session import UploadSession, UploadSessionChunk
+    from app.routes.uploader import upload_session_chunk, get_upload_session
+    from app.utils.file_upload import preallocate_file
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sessions.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(UploadSession.__table__.create)
+        await conn.run_sync(UploadSessionChunk.__table__.create)
+
+    data = os.urandom(200)
+    file_path = str(tmp_path / "session.part")
+    preallocate_file(file_path, len(data))
+    owner = _User("owner@example.com")
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        await UploadSession.create(db, id="s1", filename="orders.xlsx", filepath=file_path, filetype="xlsx",
+                                   upload_type="pos", total_size=200, chunk_size=100, total_chunks=2,
+                                   created_by=owner.username)
+
+        chunk = data[:100]
+        await upload_session_chunk("s1", 0, _Body(chunk), hashlib.sha256(chunk).hexdigest(), db, owner)
+        assert await UploadSessionChunk.get_received_indexes(db, "s1") == [0]
+
+        with pytest.raises(HTTPException) as mismatch:
+            await upload_session_chunk("s1", 0, _Body(b"x" * 100), hashlib.sha256(chunk).hexdigest(), db, owner)
+        assert mismatch.value.status_code == 400
+        assert await UploadSessionChunk.get_received_indexes(db, "s1") == []
+
+        for endpoint in (upload_session_chunk("s1", 0, _Body(chunk), hashlib.sha256(chunk).hexdigest(),
+                                              db, _User("other@example.com")),
+                         get_upload_session("s1", db, _User("other@example.com"))):
+            with pytest.raises(HTTPException) as foreign:
+                await endpoint
+            assert foreign.value.status_code == 404
+    await engine.dispose()
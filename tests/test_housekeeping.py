@@ -0,0 +1,114 @@
+"""
+Tests for retention housekeeping
+"""
+
+import hashlib
+import os
+import pytest
+import pytest_asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def housekeeping_env(tmp_path, monkeypatch):
+    """Housekeeping wired to a SQLite upload log and local gzip storage"""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.config.settings import settings
+    from app.models.main.upload_record import UploadRecord
+    from app.workers import housekeeping
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'housekeeping.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(UploadRecord.__table__.create)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def session():
+        async with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(housekeeping, "sso_db_session", session)
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "reports_dir", str(tmp_path / "reports"))
+    monkeypatch.setattr(settings, "storage_backend", "local")
+    monkeypatch.setattr(settings, "storage_root", None)
+    monkeypatch.setattr(settings, "storage_compression", "gzip")
+    monkeypatch.setattr(settings, "retention_upload_days", 30)
+    monkeypatch.setattr(settings, "retention_upload_type_days", {"trm": 5})
+    monkeypatch.setattr(settings, "retention_report_days", 10)
+    monkeypatch.setattr(settings, "retention_report_type_days", {"trm": 2})
+    monkeypatch.setattr(settings, "retention_archive_dir", None)
+    monkeypatch.setattr(settings, "retention_batch_size", 1)
+
+    yield session_factory
+    await engine.dispose()
+
+
+async def add_upload(db, tmp_path, name, upload_type, age_days, data, status="completed"):
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+
+    path = tmp_path / name
+    path.write_bytes(data)
+    sha256 = hashlib.sha256(data).hexdigest()
+    key = get_blob_store().put(str(path), sha256)
+    path.unlink()
+    updated = datetime.utcnow() - timedelta(days=age_days)
+    record = await UploadRecord.create(db, filename=name, filepath=str(path), filesize=len(data),
+                                       filetype=".csv", upload_type=upload_type, sha256=sha256,
+                                       storage_key=key, status=status)
+    await db.execute(UploadRecord.__table__.update()
+                     .where(UploadRecord.id == record.id).values(updated_at=updated))
+    await db.commit()
+    return record.id, key
+
+
+def write_report(tmp_path, name, age_days):
+    path = tmp_path / "reports" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"x" * 100)
+    mtime = (datetime.utcnow() - timedelta(days=age_days)).timestamp()
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.asyncio
+async def test_retention_purges_expired_files_only(tmp_path, housekeeping_env):
+    """Test per-type retention for uploads and reports, and shared stored files"""
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+    from app.workers.housekeeping import run_housekeeping
+
+    async with housekeeping_env() as db:
+        old_orders, old_key = await add_upload(db, tmp_path, "a.csv", "orders", 40, b"orders a")
+        recent_orders, recent_key = await add_upload(db, tmp_path, "b.csv", "orders", 10, b"orders b")
+        old_trm, shared_key = await add_upload(db, tmp_path, "c.csv", "trm", 6, b"shared")
+        # Same contents under a type that keeps its files longer
+        kept_mpr, _ = await add_upload(db, tmp_path, "d.csv", "mpr_hdfc_card", 6, b"shared")
+        failed, failed_key = await add_upload(db, tmp_path, "e.csv", "orders", 40, b"failed", status="failed")
+
+    write_report(tmp_path, "trm_trm_1.xlsx", 3)
+    write_report(tmp_path, "receivable_1.xlsx", 3)
+    write_report(tmp_path, "receivable_2.xlsx", 11)
+
+    result = await run_housekeeping()
+
+    assert result["uploads"]["records"] == 2
+    assert result["reports"] == {"files": 2, "bytes": 200}
+    assert result["bytes_reclaimed"] > 200
+    assert sorted(os.listdir(tmp_path / "reports")) == ["receivable_1.xlsx"]
+
+    stored = {key for key, _ in get_blob_store().list()}
+    assert stored == {recent_key, shared_key, failed_key}
+    async with housekeeping_env() as db:
+        purged = {upload_id: await UploadRecord.get_by_id(db, upload_id)
+                  for upload_id in (old_orders, recent_orders, old_trm, kept_mpr)}
+    assert purged[old_orders].purged_at is not None and purged[old_orders].storage_key is None
+    assert purged[old_trm].purged_at is not None
+    assert purged[recent_orders].purged_at is None
+    assert purged[kept_mpr].storage_key == shared_key
+
+    # Nothing left to do on a second run
+    assert (await run_housekeeping())["bytes_reclaimed"] == 0
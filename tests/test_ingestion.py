@@ -0,0 +1,242 @@
+"""
+Tests for staged upload ingestion
+"""
+
+import pytest
+import pytest_asyncio
+from contextlib import asynccontextmanager
+from sqlalchemy import select, func, inspect
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def ingest_env(tmp_path, monkeypatch):
+    """Ingestion wired to a SQLite database with the pool disabled"""
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.config.settings import settings
+    from app.models.main.header_mapping import HeaderMapping
+    from app.models.main.orders import Orders
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.models.sso.reconciliation import Trm
+    from app.workers import ingestion
+    from app.workers.process_pool import ProcessPoolManager
+    import app.workers.process_pool as process_pool_module
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ingest.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Orders.__table__.create)
+        await conn.run_sync(HeaderMapping.__table__.create)
+        await conn.run_sync(StoreDailyRollup.__table__.create)
+        await conn.run_sync(DirtyPartition.__table__.create)
+        await conn.run_sync(Trm.__table__.create)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def sqlite_session(database):
+        async with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(ingestion, "db_session_for", sqlite_session)
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "process_pool_workers", 0)
+    monkeypatch.setattr(process_pool_module, "process_pool", ProcessPoolManager())
+
+    yield engine, session_factory
+    await engine.dispose()
+
+
+async def table_names(engine):
+    async with engine.connect() as conn:
+        return await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names())
+
+
+@pytest.mark.asyncio
+async def test_staged_upsert_merges_into_live_table(tmp_path, ingest_env):
+    """Test that orders are staged, merged and the staging table dropped"""
+    from app.models.main.orders import Orders
+    from app.workers.ingestion import ingest_upload
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "orders.csv"
+    path.write_text("Bill No,Amount\n" + "\n".join(f"B{i},{i}" for i in range(30)))
+
+    summary = await ingest_upload(1, str(path), "orders")
+    assert (summary["inserted"], summary["staged_rows"]) == (30, 30)
+    assert summary["profile"]["columns"]["order_amount"]["sum"] == sum(range(30))
+    assert summary["profile"]["columns"]["order_id"]["distinct"] == 30
+
+    path.write_text("Bill No,Amount\n" + "\n".join(f"B{i},{i if i < 27 else i * 2}" for i in range(25, 35)))
+    summary = await ingest_upload(2, str(path), "orders")
+    assert (summary["inserted"], summary["updated"], summary["unchanged"]) == (5, 3, 2)
+
+    async with session_factory() as db:
+        count = await db.execute(select(func.count()).select_from(Orders.__table__))
+        assert count.scalar() == 35
+        amount = await db.execute(select(Orders.order_amount).where(Orders.order_id == "B28"))
+        assert amount.scalar() == 56
+    assert [name for name in await table_names(engine) if name.startswith("stg_")] == []
+
+
+@pytest.mark.asyncio
+async def test_failed_load_leaves_live_table_untouched(tmp_path, ingest_env, monkeypatch):
+    """Test that a load failing part-way through is never merged"""
+    from app.config.settings import settings
+    from app.models.sso.reconciliation import Trm
+    from app.workers.bulk_loader import BulkLoader
+    from app.workers.ingestion import ingest_upload
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "trm.csv"
+    path.write_text("Terminal ID,RRN,Txn Date,Amount\nT1,R1,01/02/2025,10\nT2,R2,02/02/2025,5\n"
+                    "T3,R3,03/02/2025,10\n")
+    monkeypatch.setattr(settings, "bulk_load_batch_size", 1)
+    write = BulkLoader._write
+
+    async def failing_write(self, batch):
+        if self.batches_committed == 2:
+            raise RuntimeError("connection lost")
+        await write(self, batch)
+
+    monkeypatch.setattr(BulkLoader, "_write", failing_write)
+
+    with pytest.raises(RuntimeError):
+        await ingest_upload(3, str(path), "trm")
+
+    async with session_factory() as db:
+        count = await db.execute(select(func.count()).select_from(Trm.__table__))
+        assert count.scalar() == 0
+    assert [name for name in await table_names(engine) if name.startswith("stg_")] == []
+
+
+@pytest.mark.asyncio
+async def test_repeated_and_overlapping_rows_are_skipped(tmp_path, ingest_env):
+    """Test that row-hash keys seen in the file or already stored are skipped, not fatal"""
+    import datetime
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.models.sso.reconciliation import Trm
+    from app.workers.ingestion import ingest_upload
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "trm.csv"
+    # The repeated transaction derives the same uid as the first one
+    path.write_text("Terminal ID,RRN,Store,Txn Date,Amount\nT1,R1,S1,01/02/2025,10\nT2,R2,S1,02/02/2025,5\n"
+                    "T1,R1,S1,01/02/2025,10\n")
+    summary = await ingest_upload(5, str(path), "trm")
+    assert (summary["rows"], summary["staged_rows"], summary["duplicate_rows"]) == (3, 2, 1)
+
+    # An overlapping export: T2 is already stored, T3 is new
+    path.write_text("Terminal ID,RRN,Store,Txn Date,Amount\nT2,R2,S1,02/02/2025,5\nT3,R3,S1,02/02/2025,7\n")
+    summary = await ingest_upload(6, str(path), "trm")
+    assert summary["duplicate_rows"] == 1
+
+    async with session_factory() as db:
+        count = await db.execute(select(func.count()).select_from(Trm.__table__))
+        assert count.scalar() == 3
+        rows = await StoreDailyRollup.get_daily_totals(
+            db, "trm", datetime.date(2025, 2, 1), datetime.date(2025, 2, 28)
+        )
+    # Skipped rows are not added to the rollup
+    assert {row.business_date.day: (row.txn_count, float(row.gross_amount)) for row in rows} == {
+        1: (1, 10.0), 2: (2, 12.0),
+    }
+
+
+@pytest.mark.asyncio
+async def test_invalid_rows_go_to_error_sidecar(tmp_path, ingest_env):
+    """Test that invalid rows are skipped and written to the error sidecar"""
+    import pandas as pd
+    from app.models.sso.reconciliation import Trm
+    from app.workers.ingestion import ingest_upload
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "trm.csv"
+    path.write_text("Terminal ID,RRN,Txn Date,Amount\nT1,R1,01/02/2025,10\nT2,R2,02/02/2025,\n"
+                    "T3,R3,not a date,abc\nT4,R4,04/02/2025,7\n")
+
+    summary = await ingest_upload(4, str(path), "trm")
+    assert (summary["rows"], summary["invalid_rows"]) == (2, 2)
+    assert summary["errors"] == {
+        "amount: required": 1, "transaction_date: invalid date": 1, "amount: invalid float": 1,
+    }
+
+    async with session_factory() as db:
+        count = await db.execute(select(func.count()).select_from(Trm.__table__))
+        assert count.scalar() == 2
+
+    report = pd.read_csv(summary["error_file"], dtype=str)
+    assert list(report["row"]) == ["3", "4"]
+    assert list(report["tid"]) == ["T2", "T3"]
+    assert report.loc[1, "errors"] == "transaction_date: invalid date; amount: invalid float"
+
+
+@pytest.mark.asyncio
+async def test_header_mapping_is_learned_and_reused(tmp_path, ingest_env, monkeypatch):
+    """Test that a header layout is resolved once and reused by later uploads"""
+    from app.models.main.header_mapping import HeaderMapping
+    from app.workers.ingestion import ingest_upload
+    from app.workers.parsers import UploadParser
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "orders.csv"
+    path.write_text("Order Numbr,Amount\nB1,10\nB2,20\n")
+
+    summary = await ingest_upload(5, str(path), "orders")
+    assert (summary["rows"], summary["header_mapping"]) == (2, "learned")
+
+    def fail(self, headers):
+        raise AssertionError("headers should not be matched again")
+
+    monkeypatch.setattr(UploadParser, "resolve_columns", fail)
+    path.write_text("Order Numbr,Amount\nB3,30\n")
+    summary = await ingest_upload(6, str(path), "orders")
+    assert (summary["rows"], summary["header_mapping"]) == (1, "reused")
+
+    async with session_factory() as db:
+        mappings = await HeaderMapping.get_mappings(db, "orders", 2)
+        hits = await db.execute(select(HeaderMapping.hits))
+    assert list(mappings.values()) == [{0: "order_id", 1: "order_amount"}]
+    assert hits.scalar() == 2
+
+
+@pytest.mark.asyncio
+async def test_store_daily_rollup_tracks_inserts_and_updates(tmp_path, ingest_env):
+    """Test that rollups add new rows and move the totals of updated ones"""
+    import datetime
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.workers.ingestion import ingest_upload
+
+    engine, session_factory = ingest_env
+    path = tmp_path / "orders.csv"
+    path.write_text("Bill No,Store,Amount,Bill Date\n"
+                    "B1,S1,10,01/03/2025 10:00\nB2,S1,20,01/03/2025 18:00\nB3,S2,5,02/03/2025 09:00\n")
+    summary = await ingest_upload(7, str(path), "orders")
+    assert summary["rollup"] == "pos"
+
+    # B2 moves to the next day with a new amount; B1 is unchanged; B4 is new
+    path.write_text("Bill No,Store,Amount,Bill Date\n"
+                    "B1,S1,10,01/03/2025 10:00\nB2,S1,25,02/03/2025 18:00\nB4,S2,1,02/03/2025 11:00\n")
+    await ingest_upload(8, str(path), "orders")
+
+    async with session_factory() as db:
+        rows = await StoreDailyRollup.get_daily_totals(
+            db, "pos", datetime.date(2025, 3, 1), datetime.date(2025, 3, 31)
+        )
+        totals = {(row.store_code, row.business_date.day): (row.txn_count, float(row.gross_amount))
+                  for row in rows}
+        by_store = await StoreDailyRollup.get_totals_by_store(
+            db, "pos", datetime.date(2025, 3, 1), datetime.date(2025, 3, 31)
+        )
+    assert totals == {("S1", 1): (1, 10.0), ("S1", 2): (1, 25.0), ("S2", 2): (2, 6.0)}
+    assert [(row["store_code"], row["txn_count"], row["gross_amount"]) for row in by_store] == [
+        ("S1", 2, 35.0), ("S2", 2, 6.0),
+    ]
+
+    from app.models.main.dirty_partition import DirtyPartition
+    async with session_factory() as db:
+        dirty = await DirtyPartition.get_keys(
+            db, ["pos"], datetime.date(2025, 3, 1), datetime.date(2025, 3, 31)
+        )
+    # B2 moved away from S1 on the 1st, so that day is dirty too
+    assert {(store, day.day) for store, day in dirty} == {("S1", 1), ("S1", 2), ("S2", 2)}
@@ -0,0 +1,82 @@
+"""
+Tests for background job retries
+"""
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+
+@pytest.fixture
+def eager_jobs():
+    from app.workers.celery_app import celery_app
+
+    previous = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    yield celery_app
+    celery_app.conf.task_always_eager = previous
+
+
+def test_upload_job_retries_transient_errors(eager_jobs, monkeypatch):
+    """Test that transient errors are retried and only the last attempt may mark failure"""
+    from app.workers import jobs, tasks
+
+    attempts = []
+
+    async def flaky_process(upload_id, file_path, upload_type, final_attempt=True):
+        attempts.append(final_attempt)
+        if len(attempts) < 3:
+            raise OperationalError("SELECT 1", {}, Exception("connection lost"))
+
+    monkeypatch.setattr(tasks, "process_upload_file", flaky_process)
+    jobs.process_upload_file_job.apply_async(
+        kwargs={"upload_id": 1, "file_path": "x.csv", "upload_type": "orders"}
+    )
+
+    assert attempts == [False, False, False]
+
+
+def test_upload_job_does_not_retry_permanent_errors(eager_jobs, monkeypatch):
+    """Test that non-transient errors are not retried"""
+    from app.workers import jobs, tasks
+
+    attempts = []
+
+    async def broken_process(upload_id, file_path, upload_type, final_attempt=True):
+        attempts.append(final_attempt)
+        raise ValueError("bad file")
+
+    monkeypatch.setattr(tasks, "process_upload_file", broken_process)
+    result = jobs.process_upload_file_job.apply_async(
+        kwargs={"upload_id": 1, "file_path": "x.csv", "upload_type": "orders"}
+    )
+
+    assert attempts == [False]
+    assert result.failed()
+
+
+def test_concurrent_inline_jobs_get_their_own_loops_and_engines(eager_jobs, monkeypatch):
+    """Test that inline jobs started at once each run on their thread's loop and engines"""
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.config import database
+    from app.workers import jobs, tasks
+
+    both_running = threading.Barrier(2, timeout=10)
+    seen = []
+
+    async def process(upload_id, file_path, upload_type, final_attempt=True):
+        await asyncio.to_thread(both_running.wait)
+        seen.append((asyncio.get_running_loop(), await database._session_factories()))
+
+    monkeypatch.setattr(tasks, "process_upload_file", process)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda upload_id: jobs.process_upload_file_job.apply_async(
+            kwargs={"upload_id": upload_id, "file_path": "x.csv", "upload_type": "orders"}
+        ), [1, 2]))
+
+    assert all(result.successful() for result in results)
+    (first_loop, first_factories), (second_loop, second_factories) = seen
+    assert first_loop is not second_loop
+    assert first_factories[1] is not second_factories[1]
+    assert database.main_session_factory not in (first_factories[1], second_factories[1])
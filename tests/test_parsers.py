@@ -0,0 +1,88 @@
+"""
+Tests for streaming upload parsers
+"""
+
+import datetime
+import pytest
+from app.workers.parsers import (
+    PARSERS, get_parser, frame_to_records, MissingColumnsError, UnsupportedFileError
+)
+
+
+def test_every_upload_type_has_a_parser():
+    """Test that each valid upload type is registered"""
+    from app.routes.uploader import VALID_TYPES
+    for upload_type in VALID_TYPES:
+        assert upload_type in PARSERS
+
+
+def test_csv_orders_are_streamed_in_typed_batches(tmp_path):
+    """Test that CSV files are read in batches with aliased headers resolved"""
+    path = tmp_path / "orders.csv"
+    lines = ["Bill No,Store,Amount,Tax,Bill Date,Payment Mode"]
+    for i in range(25):
+        lines.append(f"B{i},S001,\"1,{i:03d}.50\",10,05/03/2025 14:30,UPI")
+    path.write_text("\n".join(lines))
+
+    batches = list(get_parser("orders").iter_batches(str(path), batch_size=10))
+
+    assert [len(b) for b in batches] == [10, 10, 5]
+    first = batches[0]
+    assert first["order_id"].iloc[0] == "B0"
+    assert first["order_amount"].iloc[1] == pytest.approx(1001.5)
+    assert first["order_date"].iloc[0] == datetime.datetime(2025, 3, 5, 14, 30)
+    assert first["customer_name"].isna().all()
+    assert batches[-1].attrs["progress"] == pytest.approx(1.0)
+
+
+def test_xlsx_trm_is_streamed_with_derived_uid(tmp_path):
+    """Test that XLSX files are read in read-only mode and TRM uids are derived"""
+    from openpyxl import Workbook
+
+    path = tmp_path / "trm.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(["Terminal ID", "RRN", "Txn Date", "Amount"])
+    sheet.append([12345678.0, 998877, datetime.datetime(2025, 1, 2), 250.0])
+    sheet.append([None, None, None, None])
+    sheet.append(["T2", "R2", "03/01/2025", "99.9"])
+    workbook.save(path)
+
+    batches = list(get_parser("trm").iter_batches(str(path), batch_size=100))
+    frame = batches[0]
+
+    assert len(frame) == 2
+    assert frame["tid"].tolist() == ["12345678", "T2"]
+    assert frame["transaction_date"].iloc[1] == datetime.datetime(2025, 1, 3)
+    assert frame["uid"].notna().all()
+    assert frame["uid"].iloc[0] != frame["uid"].iloc[1]
+
+    records = frame_to_records(frame, get_parser("trm").columns)
+    assert records[0]["transaction_date"] == datetime.date(2025, 1, 2)
+    assert records[0]["batch_no"] is None
+
+
+def test_missing_required_columns(tmp_path):
+    """Test that files without required columns are rejected"""
+    path = tmp_path / "mpr.csv"
+    path.write_text("foo,bar\n1,2\n")
+
+    with pytest.raises(MissingColumnsError):
+        list(get_parser("mpr_hdfc_card").iter_batches(str(path), batch_size=10))
+
+
+def test_unsupported_extension(tmp_path):
+    """Test that unknown file formats are rejected"""
+    path = tmp_path / "orders.json"
+    path.write_text("{}")
+
+    with pytest.raises(UnsupportedFileError):
+        list(get_parser("orders").iter_batches(str(path), batch_size=10))
+
+
+def test_resolve_columns_fuzzy_matches_renamed_headers():
+    """Test that near-miss vendor headers still map to canonical columns"""
+    mapping = get_parser("mpr_hdfc_card").resolve_columns(
+        ["Txn Date", "Gross Amt", "Settlement Amout", "Remarks"]
+    )
+    assert mapping == {0: "transaction_date", 1: "gross_amount", 2: "net_amount"}
@@ -0,0 +1,124 @@
+"""
+Tests for process pool parsing
+"""
+
+import pytest
+
+
+def write_orders_csv(path, rows):
+    lines = ["Bill No,Store,Amount,Bill Date"]
+    for i in range(rows):
+        lines.append(f"B{i},S001,{i}.5,05/03/2025 14:30")
+    path.write_text("\n".join(lines))
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("workers", [0, 1])
+async def test_parsed_batches_come_back_columnar(tmp_path, monkeypatch, workers):
+    """Test that batches parsed in the pool (or a thread) round-trip in order"""
+    from app.config.settings import settings
+    from app.workers.columnar import iter_parsed_batches
+    from app.workers.process_pool import ProcessPoolManager
+    import app.workers.process_pool as process_pool_module
+
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "process_pool_spool_batches", 2)
+    pool = ProcessPoolManager()
+    pool.start(workers=workers)
+    monkeypatch.setattr(process_pool_module, "process_pool", pool)
+
+    path = tmp_path / "orders.csv"
+    write_orders_csv(path, 45)
+    try:
+        frames = [frame async for frame in iter_parsed_batches("orders", str(path), None, 10)]
+    finally:
+        pool.shutdown()
+
+    assert pool.enabled is False
+    assert [len(frame) for frame in frames] == [10, 10, 10, 10, 5]
+    assert frames[4]["order_id"].iloc[-1] == "B44"
+    assert frames[0]["order_amount"].iloc[1] == pytest.approx(1.5)
+    assert not any((tmp_path / "uploads" / "tmp").iterdir())
+
+
+@pytest.mark.asyncio
+async def test_parse_errors_are_raised_in_the_caller(tmp_path, monkeypatch):
+    """Test that a parser failure in the pool surfaces to the reader"""
+    from app.config.settings import settings
+    from app.workers.columnar import iter_parsed_batches
+    from app.workers.parsers import MissingColumnsError
+    from app.workers.process_pool import ProcessPoolManager
+    import app.workers.process_pool as process_pool_module
+
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    pool = ProcessPoolManager()
+    pool.start(workers=1)
+    monkeypatch.setattr(process_pool_module, "process_pool", pool)
+    path = tmp_path / "orders.csv"
+    path.write_text("Something,Else\n1,2\n")
+
+    try:
+        with pytest.raises(MissingColumnsError) as error:
+            async for _ in iter_parsed_batches("orders", str(path), None, 10):
+                pass
+    finally:
+        pool.shutdown()
+
+    assert error.value.upload_type == "orders"
+
+
+@pytest.mark.asyncio
+async def test_parse_cache_round_trips_typed_batches(tmp_path, monkeypatch):
+    """Test that a cache written on the first parse is read back identically"""
+    import pandas as pd
+    from app.config.settings import settings
+    from app.workers.columnar import iter_parsed_batches
+    from app.workers.parse_cache import cache_path_for, is_cache_valid
+    from app.workers.process_pool import ProcessPoolManager
+    import app.workers.process_pool as process_pool_module
+
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(process_pool_module, "process_pool", ProcessPoolManager())
+    monkeypatch.setattr(settings, "process_pool_workers", 0)
+
+    path = tmp_path / "orders.csv"
+    write_orders_csv(path, 25)
+    cache_path = cache_path_for(str(path), 1)
+
+    parsed = [frame async for frame in iter_parsed_batches("orders", str(path), None, 10, write_cache=cache_path)]
+    assert is_cache_valid(cache_path, 1, 1)
+    assert not is_cache_valid(cache_path, 1, 2)
+
+    path.unlink()
+    cached = [frame async for frame in iter_parsed_batches("orders", str(path), None, 10, read_cache=cache_path)]
+
+    pd.testing.assert_frame_equal(pd.concat(parsed, ignore_index=True), pd.concat(cached, ignore_index=True))
+    assert cached[0]["order_date"].dtype.kind == "M"
+
+
+def _pool_enabled(results):
+    from app.workers.process_pool import ProcessPoolManager
+
+    pool = ProcessPoolManager()
+    pool.start(workers=1)
+    results.put(pool.enabled)
+    pool.shutdown()
+
+
+def test_pool_runs_in_processes_only_outside_daemonic_workers():
+    """Test that a threads-pool worker gets real processes where a prefork child falls back to threads"""
+    import multiprocessing
+    import threading
+
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    # A Celery threads-pool job runs in a thread of the (non-daemonic) worker process
+    job = threading.Thread(target=_pool_enabled, args=(results,))
+    job.start()
+    job.join()
+    # Prefork children are daemonic
+    child = context.Process(target=_pool_enabled, args=(results,), daemon=True)
+    child.start()
+    child.join()
+
+    assert [results.get(timeout=10), results.get(timeout=10)] == [True, False]
@@ -0,0 +1,53 @@
+"""
+Tests for streaming upload profiles
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from app.workers.profiling import HyperLogLog, UploadProfile
+
+
+def test_hyperloglog_estimates_distinct_counts():
+    """Test that the sketch stays within a few percent across batches and merges"""
+    values = pd.Series([f"S{i}" for i in range(100_000)])
+    sketch = HyperLogLog()
+    for start in range(0, len(values), 7_000):
+        sketch.add(values[start:start + 7_000])
+    sketch.add(values[:5_000])
+    assert abs(sketch.estimate() - 100_000) / 100_000 < 0.05
+
+    small = HyperLogLog()
+    small.add(pd.Series(["a", "b", "c", "a", None]))
+    assert small.estimate() == 3
+
+    other = HyperLogLog()
+    other.add(pd.Series(["c", "d"]))
+    small.merge(other)
+    assert small.estimate() == 4
+
+
+def test_upload_profile_accumulates_across_batches():
+    """Test that counts, ranges and totals cover every batch"""
+    profile = UploadProfile({"store_code": "string", "order_amount": "float",
+                             "order_date": "datetime", "status": "string"})
+    profile.update(pd.DataFrame({
+        "store_code": ["S1", "S2", None],
+        "order_amount": [10.5, np.nan, 4.5],
+        "order_date": pd.to_datetime(["2025-03-02", "2025-03-01", None]),
+    }))
+    profile.update(pd.DataFrame({
+        "store_code": ["S2", "S3"],
+        "order_amount": [5.0, 100.0],
+        "order_date": pd.to_datetime(["2025-03-09 14:30", "2025-03-04 00:00"]),
+    }))
+
+    result = json.loads(json.dumps(profile.to_dict()))
+    assert result["rows"] == 5
+    assert result["columns"]["store_code"] == {"count": 4, "nulls": 1, "distinct": 3}
+    assert result["columns"]["order_amount"] == {
+        "count": 4, "nulls": 1, "distinct": 4, "min": 4.5, "max": 100.0, "sum": 120.0,
+    }
+    assert result["columns"]["order_date"]["min"] == "2025-03-01"
+    assert result["columns"]["order_date"]["max"] == "2025-03-09T14:30:00"
+    assert "status" not in result["columns"]
@@ -0,0 +1,882 @@
+"""
+Tests for the POS vs Zomato reconciliation engine
+"""
+
+import pytest
+import pytest_asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import select
+
+RATES = {"commission_rate": 0.2, "pg_rate": 0.02, "fee_gst_rate": 0.18, "tds_rate": 0.001}
+
+
+def zomato_row(order_id, pos_order_id, net, final, **amounts):
+    row = {
+        "id": f"z-{order_id}", "order_id": order_id, "pos_order_id": pos_order_id,
+        "store_code": "S1", "order_date": datetime(2025, 3, 1, 12), "order_status": "delivered",
+        "net_amount": net, "tax_paid_by_customer": 5.0, "commission_value": None,
+        "pg_applied_on": None, "pg_charge": None, "taxes_zomato_fee": None,
+        "tds_amount": None, "final_amount": final,
+    }
+    row.update(amounts)
+    return row
+
+
+def test_reconcile_frames_matches_on_order_id_and_computes_deltas():
+    """Test that orders are matched by merchant order ID and every delta is computed"""
+    from app.workers.reconciliation import ADJUSTMENT_FIELDS, reconcile_frames
+
+    pos = pd.DataFrame({
+        "order_id": ["P1", "P2", "P3"],
+        "store_code": ["S1", "S1", "S2"],
+        "order_date": pd.to_datetime(["2025-03-01 12:00", "2025-03-01 13:00", "2025-03-02 09:00"]),
+        "order_amount": [100.0, 200.0, 50.0],
+        "tax_amount": [5.0, 10.0, 2.5],
+        "status": ["Success"] * 3,
+    })
+    zomato = pd.DataFrame([
+        # P1 settled exactly as expected: 100 - 20 - 2.1 - 3.98 - 0.1
+        zomato_row("Z1", "P1", 100.0, 73.82),
+        # P2 paid 10 short
+        zomato_row("Z2", "P2", 200.0, 137.64, tax_paid_by_customer=10.0),
+        # No merchant order ID, matched on Zomato's own ID; Z4 has no POS order at all
+        zomato_row("P3", None, 50.0, 36.91, tax_paid_by_customer=2.5),
+        zomato_row("Z4", "P9", 80.0, 60.0),
+    ])
+    for name in ADJUSTMENT_FIELDS:
+        zomato[name] = 0.0
+
+    sheets = reconcile_frames(pos, zomato, RATES, tolerance=1.0)
+    pos_vs_3po = sheets["pos_vs_3po"].set_index("pos_order_id")
+    assert list(pos_vs_3po.index) == ["P1", "P2", "P3"]
+    assert pos_vs_3po.loc["P1", "pos_commission_value"] == 20.0
+    assert pos_vs_3po.loc["P1", "pos_pg_applied_on"] == 105.0
+    assert pos_vs_3po.loc["P1", "pos_vs_zomato_final_amount_delta"] == 0.0
+    assert pos_vs_3po.loc["P1", "pos_vs_zomato_commission_value_delta"] == 20.0
+    assert pos_vs_3po.loc["P2", "pos_vs_zomato_final_amount_delta"] == pytest.approx(10.0)
+    assert list(pos_vs_3po["reconciled_status"]) == ["reconciled", "unreconciled", "reconciled"]
+    assert pos_vs_3po.loc["P2", "unreconciled_amount"] == pytest.approx(10.0)
+    assert pos_vs_3po.loc["P3", "zomato_order_id"] == "P3"
+
+    three_po_vs_pos = sheets["3po_vs_pos"].set_index("zomato_order_id")
+    assert three_po_vs_pos.loc["Z2", "zomato_vs_pos_final_amount_delta"] == pytest.approx(-10.0)
+    assert three_po_vs_pos.loc["Z2", "calculated_zomato_final_amount"] == pytest.approx(147.64)
+    assert "Z4" not in three_po_vs_pos.index
+
+
+def test_fuzzy_pass_pairs_orders_without_a_shared_id():
+    """Test that leftover orders pair on store, time and amount with a confidence score"""
+    from app.workers.reconciliation import ADJUSTMENT_FIELDS, reconcile_frames
+
+    pos = pd.DataFrame({
+        "order_id": ["P1", "P2", "P3", "P4"],
+        "store_code": ["S1", "S1", "S1", "S2"],
+        "order_date": pd.to_datetime(["2025-03-01 12:00", "2025-03-01 12:05", "2025-03-01 15:00",
+                                      "2025-03-01 12:00"]),
+        "order_amount": [100.0, 250.0, 100.0, 100.0],
+        "tax_amount": [5.0] * 4,
+        "status": ["Success"] * 4,
+    })
+    zomato = pd.DataFrame([
+        zomato_row("Z1", "P1", 100.0, 73.82),
+        # No merchant order ID; P2 is 10 minutes and 50 paise away
+        zomato_row("Z2", None, 250.5, 180.0, order_date=datetime(2025, 3, 1, 12, 15)),
+        # Matches P3's amount but two hours off, and P4 is in another store
+        zomato_row("Z3", None, 100.0, 70.0, order_date=datetime(2025, 3, 1, 13, 0)),
+    ])
+    for name in ADJUSTMENT_FIELDS:
+        zomato[name] = 0.0
+
+    exact_only = reconcile_frames(pos, zomato, RATES, tolerance=1.0)
+    assert list(exact_only["pos_vs_3po"]["zomato_order_id"]) == ["Z1"]
+
+    sheets = reconcile_frames(pos, zomato, RATES, tolerance=1.0,
+                              fuzzy={"window_minutes": 30, "amount_tolerance": 1.0})
+    matched = sheets["pos_vs_3po"].set_index("zomato_order_id")
+    assert list(matched.index) == ["Z1", "Z2"]
+    assert matched.loc["Z2", "pos_order_id"] == "P2"
+    assert matched.loc["Z1", "match_confidence"] == 1.0
+    # 10 of 30 minutes and 0.5 of 1.0 rupee apart
+    assert matched.loc["Z2", "match_confidence"] == pytest.approx(1 - (1 / 3 + 0.5) / 2, abs=1e-4)
+
+
+def test_fuzzy_pass_pairs_each_order_once_across_partitions():
+    """Test that a zero window still pairs same-time orders and slack POS orders are not candidates"""
+    from app.workers.reconciliation import ADJUSTMENT_FIELDS, reconcile_frames
+
+    pos = pd.DataFrame({
+        "order_id": ["P1", "P2"], "store_code": ["S1", "S1"],
+        "order_date": pd.to_datetime(["2025-03-01 12:00", "2025-03-01 23:55"]),
+        "order_amount": [100.0, 200.0], "tax_amount": [5.0, 10.0], "status": ["Success"] * 2,
+    })
+    zomato = pd.DataFrame([
+        zomato_row("Z1", None, 100.0, 73.82),
+        # Both without a merchant order ID and close enough to P2, one on either side of midnight
+        zomato_row("Z2", None, 200.0, 147.64, order_date=datetime(2025, 3, 1, 23, 58)),
+        zomato_row("Z3", None, 200.0, 147.64, order_date=datetime(2025, 3, 2, 0, 2)),
+    ])
+    for name in ADJUSTMENT_FIELDS:
+        zomato[name] = 0.0
+
+    exact_time = reconcile_frames(pos.iloc[:1], zomato.iloc[:1], RATES, tolerance=1.0,
+                                  fuzzy={"window_minutes": 0, "amount_tolerance": 1.0})
+    assert list(exact_time["pos_vs_3po"]["pos_order_id"]) == ["P1"]
+
+    fuzzy = {"window_minutes": 30, "amount_tolerance": 1.0}
+    days = [(datetime(2025, 3, 1), datetime(2025, 3, 2)), (datetime(2025, 3, 2), datetime(2025, 3, 3))]
+    pairs = [
+        (row["pos_order_id"], row["zomato_order_id"])
+        for period in days
+        for row in reconcile_frames(pos, zomato, RATES, 1.0, fuzzy, period=period)["pos_vs_3po"].to_dict("records")
+    ]
+    assert sorted(pairs) == [("P1", "Z1"), ("P2", "Z2")]
+
+
+def test_fuzzy_pass_considers_every_order_in_the_window():
+    """Test that the best pair in the window wins and a row whose first choice is taken gets its next"""
+    import numpy as np
+    from app.workers.reconciliation import fuzzy_match_orders
+
+    t = datetime(2025, 3, 1, 12)
+    pos = pd.DataFrame({
+        "order_id": ["P1", "P2", "P3"], "store_code": ["S1"] * 3,
+        "order_date": [t, t + pd.Timedelta(minutes=2), t + pd.Timedelta(days=2)],
+        "order_amount": [100.0, 150.0, 150.0],
+    })
+    zomato = pd.DataFrame({"store_code": ["S1"], "order_date": [t + pd.Timedelta(minutes=1)],
+                           "net_amount": [150.0]})
+    none = np.array([], dtype=np.intp)
+    pos_rows, zomato_rows, _ = fuzzy_match_orders(pos, zomato, none, none, 30, 1.0)
+    assert (list(pos_rows), list(zomato_rows)) == ([1], [0])
+
+    # A busy store: every order has the same amount and dozens of others within the window
+    rng = np.random.default_rng(1)
+    times = pd.Timestamp(t) + pd.to_timedelta(np.sort(rng.integers(0, 4 * 3600, 2000)), unit="s")
+    pos = pd.DataFrame({"order_id": [f"P{i}" for i in range(2000)], "store_code": "S1",
+                        "order_date": times, "order_amount": 100.0})
+    zomato = pd.DataFrame({"store_code": "S1", "net_amount": 100.0,
+                           "order_date": times + pd.to_timedelta(rng.integers(-60, 60, 2000), unit="s")})
+    pos_rows, zomato_rows, confidence = fuzzy_match_orders(pos, zomato, none, none, 30, 1.0)
+    assert len(set(pos_rows)) == len(pos_rows) and len(set(zomato_rows)) == len(zomato_rows)
+    # Every sale finds a partner; rows whose nearest order was taken fall back to the next
+    assert len(zomato_rows) == 2000
+    # Bounding the candidates to the nearest on each side loses almost nothing
+    assert len(fuzzy_match_orders(pos, zomato, none, none, 30, 1.0, nearest=64)[0]) >= 1990
+    assert (np.abs(pos["order_date"].to_numpy()[pos_rows] - zomato["order_date"].to_numpy()[zomato_rows])
+            <= np.timedelta64(30, "m")).all()
+    assert confidence.min() > 0
+
+
+@pytest.mark.asyncio
+async def test_partitions_run_concurrently_up_to_the_worker_limit():
+    """Test that at most limit partitions are in flight and every result is yielded"""
+    import asyncio
+    from app.workers.reconciliation import bounded_as_completed
+
+    running, peak = 0, 0
+
+    async def work(item, offset):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (item % 3))
+        running -= 1
+        return item + offset
+
+    results = [result async for result in bounded_as_completed(range(10), work, 3, 100)]
+    assert sorted(results) == list(range(100, 110))
+    assert peak == 3
+
+
+def test_plan_partitions_packs_stores_within_the_row_budget():
+    """Test that small stores share partitions and oversized ones are split by day"""
+    from datetime import date
+    from app.workers.reconciliation import plan_partitions
+
+    start, end = date(2025, 3, 1), date(2025, 3, 15)
+    counts = {("A", date(2025, 3, 1)): 3, ("B", date(2025, 3, 2)): 4, ("C", date(2025, 3, 3)): 5}
+    counts.update({("D", date(2025, 3, day)): 6 for day in (8, 9, 10)})
+    partitions = plan_partitions(counts, start, end, bucket_days=7, max_rows=10)
+
+    assert [(p.store_codes, p.start.day, p.end.day, p.rows) for p in partitions] == [
+        (["A", "B"], 1, 8, 7),
+        (["C"], 1, 8, 5),
+        (["D"], 8, 9, 6),
+        (["D"], 9, 10, 6),
+        (["D"], 10, 11, 6),
+    ]
+
+
+@pytest_asyncio.fixture
+async def reconciliation_env(tmp_path, monkeypatch):
+    """Reconciliation wired to SQLite databases with the pool disabled"""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.config.settings import settings
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.orders import Orders
+    from app.models.sso import ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosData, ReconciliationReasonRules
+    from app.workers import ingestion, reconciliation
+    from app.workers.process_pool import ProcessPoolManager
+
+    # SQLite index names are per database and both sheet tables index "store_name"
+    engines, factories = [], {}
+    tables = (Orders, ZomatoOrder, ZomatoPosVs3poData, DirtyPartition, ReconciliationReasonRules)
+    for name, models in (("orders", tables), ("sheet", (Zomato3poVsPosData,))):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / f'{name}.db'}")
+        async with engine.begin() as conn:
+            for model in models:
+                await conn.run_sync(model.__table__.create)
+        engines.append(engine)
+        factories[name] = async_sessionmaker(engine, expire_on_commit=False)
+
+    @asynccontextmanager
+    async def sqlite_session():
+        async with factories["orders"]() as db:
+            yield db
+
+    @asynccontextmanager
+    async def sqlite_session_for(database):
+        async with sqlite_session() as db:
+            yield db
+
+    monkeypatch.setattr(reconciliation, "main_db_session", sqlite_session)
+    monkeypatch.setattr(ingestion, "db_session_for", sqlite_session_for)
+    monkeypatch.setattr(reconciliation, "sso_db_session", sqlite_session)
+    monkeypatch.setattr(settings, "process_pool_workers", 0)
+    monkeypatch.setattr(reconciliation, "process_pool", ProcessPoolManager())
+
+    yield factories
+    for engine in engines:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sheet_tables_are_populated(reconciliation_env, monkeypatch):
+    """Test that matched orders within the period are written to both sheet tables"""
+    from app.config.settings import settings
+    from app.models.main.orders import Orders
+    from app.models.sso import ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosData
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.reconciliation import iter_reconciled_partitions, write_sheet
+
+    session_factory, sheet_factory = reconciliation_env["orders"], reconciliation_env["sheet"]
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            Orders(order_id="P2", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 4, 1, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=100, tax_paid_by_customer=5,
+                        final_amount=73.82),
+            ZomatoOrder(id="z2", order_id="Z2", pos_order_id="P2", store_code="S1", action="sale",
+                        order_date=datetime(2025, 4, 1, 12), net_amount=100, final_amount=70),
+            # Settled with a timestamp past midnight, in the next date bucket
+            Orders(order_id="P3", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 7, 23, 50), status="Success"),
+            ZomatoOrder(id="z3", order_id="Z3", pos_order_id="P3", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 8, 0, 10), net_amount=100, final_amount=60),
+        ])
+        await db.commit()
+
+    # A budget of one order per partition
+    monkeypatch.setattr(settings, "reconciliation_memory_budget_mb", 0)
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=["S1"])
+    async for _, sheets in iter_reconciled_partitions(request, RATES):
+        async with session_factory() as db:
+            await write_sheet(db, ZomatoPosVs3poData, sheets["pos_vs_3po"])
+        async with sheet_factory() as db:
+            await write_sheet(db, Zomato3poVsPosData, sheets["3po_vs_pos"])
+
+    async with session_factory() as db:
+        rows = (await db.execute(select(ZomatoPosVs3poData))).scalars().all()
+        assert sorted((row.pos_order_id, row.reconciled_status) for row in rows) == [
+            ("P1", "reconciled"), ("P3", "unreconciled"),
+        ]
+        assert rows[0].order_date.isoformat() == "2025-03-01"
+        assert float(rows[0].pos_vs_zomato_final_amount_delta) == 0.0
+    async with sheet_factory() as db:
+        rows = (await db.execute(select(Zomato3poVsPosData))).scalars().all()
+        assert sorted((row.zomato_order_id, row.id) for row in rows) == [("Z1", "z1"), ("Z3", "z3")]
+
+
+@pytest.mark.asyncio
+async def test_incremental_generation_rebuilds_only_dirty_store_days(reconciliation_env):
+    """Test that incremental mode replaces the rows of dirty store-days and clears their marks"""
+    from datetime import date
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.orders import Orders
+    from app.models.sso import ZomatoOrder, ZomatoPosVs3poData
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.reconciliation import (
+        plan_dirty_partitions, clear_dirty_partitions, delete_sheet_rows, write_sheet
+    )
+
+    session_factory = reconciliation_env["orders"]
+    async with session_factory() as db:
+        for i, store in enumerate(["S1", "S2"]):
+            db.add_all([
+                Orders(order_id=f"P{i}", store_code=store, order_amount=100, tax_amount=5,
+                       order_date=datetime(2025, 3, 10, 12), status="Success"),
+                ZomatoOrder(id=f"z{i}", order_id=f"Z{i}", pos_order_id=f"P{i}", store_code=store,
+                            action="sale", order_date=datetime(2025, 3, 10, 12), net_amount=100,
+                            tax_paid_by_customer=5, final_amount=60),
+                # Stale rows from an earlier run
+                ZomatoPosVs3poData(id=f"z{i}", store_name=store, order_date=date(2025, 3, 10),
+                                   reconciled_status="stale"),
+            ])
+        db.add(DirtyPartition(source="zomato", store_code="S1", business_date=date(2025, 3, 10),
+                              marked_at=datetime(2025, 3, 11)))
+        await db.commit()
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[])
+    started = datetime(2025, 3, 12)
+    partitions = await plan_dirty_partitions(request, started)
+    # With the match slack, the Zomato mark also dirties the neighbouring days
+    assert [(p.store_codes, p.start.day, p.end.day) for p in partitions] == [
+        (["S1"], 9, 10), (["S1"], 10, 11), (["S1"], 11, 12),
+    ]
+
+    from app.workers.reconciliation import iter_reconciled_partitions
+    async for partition, sheets in iter_reconciled_partitions(request, RATES, partitions=partitions):
+        async with session_factory() as db:
+            await delete_sheet_rows(db, ZomatoPosVs3poData, partition)
+            await write_sheet(db, ZomatoPosVs3poData, sheets["pos_vs_3po"])
+    assert await clear_dirty_partitions(request, started) == 1
+
+    async with session_factory() as db:
+        rows = (await db.execute(select(ZomatoPosVs3poData).order_by(ZomatoPosVs3poData.id))).scalars().all()
+        assert [(row.store_name, row.reconciled_status) for row in rows] == [
+            ("S1", "unreconciled"), ("S2", "stale"),
+        ]
+    assert await plan_dirty_partitions(request, started) == []
+
+
+@pytest_asyncio.fixture
+async def sql_database(tmp_path, monkeypatch):
+    """One SQLite database holding the POS, Zomato, rate card, rollup and sheet tables"""
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy import MetaData
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.config.settings import settings
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.orders import Orders
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.models.sso import (
+        ZomatoOrder, ZomatoRateCard, ReconciliationReasonRules, ZomatoPosVs3poData, Zomato3poVsPosData,
+        Zomato3poVsPosRefundData, OrdersNotInPosData, OrdersNotIn3poData
+    )
+
+    # One SQLite file plays both databases, so the POS table's schema is SQLite's own "main"
+    monkeypatch.setattr(settings, "reconciliation_main_schema", "main")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'sso.db'}")
+    metadata = MetaData()
+    for model in (Orders, ZomatoOrder, ZomatoRateCard, ReconciliationReasonRules, StoreDailyRollup, DirtyPartition):
+        model.__table__.to_metadata(metadata)
+    for model in (ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+                  OrdersNotInPosData, OrdersNotIn3poData):
+        # Two sheet tables share index names, which SQLite does not allow in one file
+        model.__table__.to_metadata(metadata).indexes.clear()
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sql_engine_fills_every_sheet_like_the_python_engine(sql_database):
+    """Test that INSERT ... SELECT statements match, anti-join and price orders as reconcile_frames does"""
+    from app.config.settings import settings
+    from app.models.main.orders import Orders
+    from app.models.sso import (
+        ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+        OrdersNotInPosData, OrdersNotIn3poData
+    )
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.reconciliation import load_pos_orders, load_zomato_orders, parse_period, reconcile_frames
+    from app.workers.sql_reconciliation import reconcile_in_database
+
+    session_factory = sql_database
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            Orders(order_id="P2", store_code="S1", order_amount=200, tax_amount=10,
+                   order_date=datetime(2025, 3, 2, 12), status="Success"),
+            Orders(order_id="P4", store_code="S1", order_amount=50, tax_amount=2.5,
+                   order_date=datetime(2025, 3, 3, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=100, tax_paid_by_customer=5,
+                        final_amount=73.82, order_status="delivered"),
+            # Matched on Zomato's own ID, 10 short
+            ZomatoOrder(id="z2", order_id="P2", pos_order_id="", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 2, 12, 30), net_amount=200, tax_paid_by_customer=10,
+                        final_amount=137.64, customer_discount=4, order_status="delivered"),
+            ZomatoOrder(id="z3", order_id="Z3", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 2, 13), net_amount=80, final_amount=60),
+            ZomatoOrder(id="r1", order_id="Z1", pos_order_id="P1", store_code="S1", action="refund",
+                        order_date=datetime(2025, 3, 4, 9), net_amount=-100),
+        ])
+        await db.commit()
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=["S1"])
+    async with session_factory() as db:
+        written = await reconcile_in_database(db, request, rates=RATES)
+    assert written == {
+        "zomato_pos_vs_3po_data": 2, "zomato_3po_vs_pos_data": 2, "zomato_3po_vs_pos_refund_data": 1,
+        "orders_not_in_pos_data": 1, "orders_not_in_3po_data": 1,
+    }
+
+    start, end = parse_period(request.start_date, request.end_date)
+    async with session_factory() as db:
+        expected = reconcile_frames(await load_pos_orders(db, start, end), await load_zomato_orders(db, start, end),
+                                    RATES, settings.reconciliation_tolerance)
+        for model, sheet in ((ZomatoPosVs3poData, "pos_vs_3po"), (Zomato3poVsPosData, "3po_vs_pos")):
+            rows = {row.id: row for row in (await db.execute(select(model))).scalars().all()}
+            for record in expected[sheet].to_dict("records"):
+                row = rows[record["id"]]
+                assert row.pos_order_id == record["pos_order_id"]
+                assert row.reconciled_status == record["reconciled_status"]
+                for reason in ("pos_vs_zomato_reason", "zomato_vs_pos_reason"):
+                    if reason in record:
+                        assert getattr(row, reason) == record[reason]
+                assert row.order_date == record["order_date"].date()
+                for name, value in record.items():
+                    if name.endswith("_amount") or name.endswith("_delta") or name.startswith("fixed_"):
+                        assert float(getattr(row, name)) == pytest.approx(value), name
+        assert float(rows["z2"].zomato_vs_pos_final_amount_delta) == pytest.approx(-10.0)
+        assert float(rows["z2"].fixed_customer_discount) == 4.0
+
+        refund = (await db.execute(select(Zomato3poVsPosRefundData))).scalar_one()
+        assert (refund.pos_order_id, refund.reconciled_status, refund.zomato_vs_pos_reason) == (
+            "P1", "reconciled", "Full refund"
+        )
+        not_in_pos = (await db.execute(select(OrdersNotInPosData))).scalar_one()
+        assert (not_in_pos.zomato_order_id, float(not_in_pos.unreconciled_amount)) == ("Z3", 60.0)
+        assert not_in_pos.zomato_vs_pos_reason == "Order not in POS"
+        not_in_3po = (await db.execute(select(OrdersNotIn3poData))).scalar_one()
+        assert (not_in_3po.pos_order_id, float(not_in_3po.pos_final_amount)) == ("P4", 36.91)
+        assert not_in_3po.pos_vs_zomato_reason == "Order not in Zomato"
+
+
+@pytest.fixture
+def python_engine(sql_database, monkeypatch):
+    """The in-process engine reading and writing the sql_database tables, with the pool disabled"""
+    from app.config.settings import settings
+    from app.workers import ingestion, reconciliation, tasks
+    from app.workers.process_pool import ProcessPoolManager
+
+    @asynccontextmanager
+    async def sqlite_session():
+        async with sql_database() as db:
+            yield db
+
+    @asynccontextmanager
+    async def sqlite_session_for(database):
+        async with sqlite_session() as db:
+            yield db
+
+    monkeypatch.setattr(reconciliation, "main_db_session", sqlite_session)
+    monkeypatch.setattr(reconciliation, "sso_db_session", sqlite_session)
+    monkeypatch.setattr(tasks, "sso_db_session", sqlite_session)
+    monkeypatch.setattr(ingestion, "db_session_for", sqlite_session_for)
+    monkeypatch.setattr(settings, "process_pool_workers", 0)
+    monkeypatch.setattr(reconciliation, "process_pool", ProcessPoolManager())
+    return sql_database
+
+
+async def generate_in_python(session_factory, request, rates=RATES):
+    """Write every sheet of a request with the in-process engine, one partition at a time"""
+    from app.workers.reconciliation import iter_reconciled_partitions, write_partition_sheets
+
+    async for _, sheets in iter_reconciled_partitions(request, rates):
+        async with session_factory() as db:
+            await write_partition_sheets(db, sheets)
+
+
+@pytest.mark.asyncio
+async def test_python_engine_fills_every_sheet(python_engine, monkeypatch):
+    """Test that the in-process engine writes refunds and the orders missing on either side, once each"""
+    from app.config.settings import settings
+    from app.models.main.orders import Orders
+    from app.models.sso import (
+        ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosRefundData, OrdersNotInPosData, OrdersNotIn3poData
+    )
+    from app.routes.sheet_data import GenerateSheetDataRequest
+
+    session_factory = python_engine
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            # Placed before midnight, settled after it: matched across the partition boundary
+            Orders(order_id="P2", store_code="S1", order_amount=200, tax_amount=10,
+                   order_date=datetime(2025, 3, 1, 23, 55), status="Success"),
+            Orders(order_id="P4", store_code="S1", order_amount=50, tax_amount=2.5,
+                   order_date=datetime(2025, 3, 3, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=100, tax_paid_by_customer=5,
+                        final_amount=73.82, order_status="delivered"),
+            ZomatoOrder(id="z2", order_id="Z2", pos_order_id="P2", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 2, 0, 5), net_amount=200, tax_paid_by_customer=10,
+                        final_amount=147.64, order_status="delivered"),
+            ZomatoOrder(id="z3", order_id="Z3", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 3, 13), net_amount=80, final_amount=60,
+                        customer_discount=4),
+            ZomatoOrder(id="r1", order_id="Z1", pos_order_id="P1", store_code="S1", action="refund",
+                        order_date=datetime(2025, 3, 1, 18), net_amount=-100),
+            ZomatoOrder(id="r2", order_id="Z8", pos_order_id="P8", store_code="S1", action="refund",
+                        order_date=datetime(2025, 3, 3, 9), net_amount=-40),
+        ])
+        await db.commit()
+
+    # A budget of one order per partition, so every day is its own partition
+    monkeypatch.setattr(settings, "reconciliation_memory_budget_mb", 0)
+    monkeypatch.setattr(settings, "reconciliation_fuzzy_match", False)
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=["S1"])
+    await generate_in_python(session_factory, request)
+
+    async with session_factory() as db:
+        matched = (await db.execute(select(ZomatoPosVs3poData))).scalars().all()
+        assert sorted((row.id, row.pos_order_id, row.reconciled_status) for row in matched) == [
+            ("z1", "P1", "reconciled"), ("z2", "P2", "reconciled"),
+        ]
+        refunds = {row.id: row for row in (await db.execute(select(Zomato3poVsPosRefundData))).scalars()}
+        assert (refunds["r1"].pos_order_id, refunds["r1"].reconciled_status) == ("P1", "reconciled")
+        assert refunds["r1"].zomato_vs_pos_reason == "Full refund"
+        assert (refunds["r2"].pos_order_id, float(refunds["r2"].unreconciled_amount)) == (None, 40.0)
+        assert refunds["r2"].zomato_vs_pos_reason == "Refund not in POS"
+        not_in_pos = (await db.execute(select(OrdersNotInPosData))).scalar_one()
+        assert (not_in_pos.zomato_order_id, float(not_in_pos.unreconciled_amount)) == ("Z3", 60.0)
+        assert (float(not_in_pos.fixed_customer_discount), not_in_pos.zomato_vs_pos_reason) == (
+            4.0, "Order not in POS"
+        )
+        not_in_3po = (await db.execute(select(OrdersNotIn3poData))).scalar_one()
+        assert (not_in_3po.pos_order_id, float(not_in_3po.pos_final_amount)) == ("P4", 36.91)
+        assert not_in_3po.pos_vs_zomato_reason == "Order not in Zomato"
+        assert not_in_3po.order_date.isoformat() == "2025-03-03"
+
+
+@pytest.mark.asyncio
+async def test_generation_job_rebuilds_all_five_sheets(python_engine):
+    """Test that a full in-process generation job writes every sheet table, once even when retried"""
+    from app.config.settings import Settings
+    from app.models.main.orders import Orders
+    from app.models.sso import (
+        ZomatoOrder, ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+        OrdersNotInPosData, OrdersNotIn3poData
+    )
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.tasks import process_sheet_data_generation
+
+    session_factory = python_engine
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            Orders(order_id="P4", store_code="S1", order_amount=50, tax_amount=2.5,
+                   order_date=datetime(2025, 3, 3, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=100, final_amount=73.82),
+            ZomatoOrder(id="z3", order_id="Z3", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 3, 13), net_amount=80, final_amount=60),
+            ZomatoOrder(id="r1", order_id="Z1", pos_order_id="P1", store_code="S1", action="refund",
+                        order_date=datetime(2025, 3, 1, 18), net_amount=-100),
+        ])
+        await db.commit()
+
+    # Mode and engine are left to the defaults: a full run, in-process whatever the volume
+    assert Settings.model_fields["sheet_generation_mode"].default == "full"
+    assert Settings.model_fields["reconciliation_engine"].default == "python"
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[])
+    await process_sheet_data_generation("job-1", request)
+    # A retry starts over without the endpoint's truncation and must not insert the rows twice
+    await process_sheet_data_generation("job-1", request)
+
+    async with session_factory() as db:
+        for model in (ZomatoPosVs3poData, Zomato3poVsPosData, Zomato3poVsPosRefundData,
+                      OrdersNotInPosData, OrdersNotIn3poData):
+            assert len((await db.execute(select(model))).scalars().all()) == 1, model.__tablename__
+
+
+@pytest.mark.asyncio
+async def test_incremental_partition_is_replaced_in_one_transaction(python_engine, monkeypatch):
+    """Test that a Zomato mark dirties the neighbouring days and a failed rewrite keeps the old rows"""
+    from datetime import date
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.sso import OrdersNotIn3poData, ZomatoOrder, ZomatoPosVs3poData
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers import reconciliation
+
+    session_factory = python_engine
+    async with session_factory() as db:
+        db.add_all([
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 10, 0, 20), net_amount=100, final_amount=60),
+            ZomatoPosVs3poData(id="z1", store_name="S1", order_date=date(2025, 3, 10), reconciled_status="stale"),
+            DirtyPartition(source="zomato", store_code="S1", business_date=date(2025, 3, 10),
+                           marked_at=datetime(2025, 3, 11)),
+        ])
+        await db.commit()
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[])
+    partitions = await reconciliation.plan_dirty_partitions(request, datetime(2025, 3, 12))
+    # The sale may pair with a POS order settled the day before or after
+    assert sorted(p.start.day for p in partitions) == [9, 10, 11]
+
+    write_sheet = reconciliation.write_sheet
+
+    async def failing_write_sheet(db, model, frame, commit=True):
+        if model is OrdersNotIn3poData:
+            raise RuntimeError("connection lost")
+        return await write_sheet(db, model, frame, commit)
+
+    monkeypatch.setattr(reconciliation, "write_sheet", failing_write_sheet)
+    partition = next(p for p in partitions if p.start.day == 10)
+    async for _, sheets in reconciliation.iter_reconciled_partitions(request, RATES, partitions=[partition]):
+        async with session_factory() as db:
+            with pytest.raises(RuntimeError):
+                await reconciliation.write_partition_sheets(db, sheets, replace=partition)
+
+    async with session_factory() as db:
+        rows = (await db.execute(select(ZomatoPosVs3poData))).scalars().all()
+        assert [(row.id, row.reconciled_status) for row in rows] == [("z1", "stale")]
+
+
+def test_rate_table_resolves_dated_and_store_cards():
+    """Test that each order gets the latest card in force, a store's own card first, else the defaults"""
+    import numpy as np
+    from app.workers.rates import RATE_FIELDS, RateTable
+    from app.workers.reconciliation import ADJUSTMENT_FIELDS, reconcile_frames
+
+    cards = pd.DataFrame([
+        [None, "2025-03-01", 0.20], [None, "2025-03-15", 0.25], ["S2", "2025-03-10", 0.10],
+    ], columns=["store_code", "effective_from", "commission_rate"])
+    for name in RATE_FIELDS[1:]:
+        cards[name] = RATES[name]
+    table = RateTable(1, cards, {**RATES, "commission_rate": 0.3})
+
+    stores = np.array(["S1", "S1", "S1", "S2", "S2", "S2", None], dtype=object)
+    times = pd.to_datetime(["2025-02-20 09:00", "2025-03-05 23:00", "2025-03-20 09:00", "2025-03-05 09:00",
+                            "2025-03-12 09:00", "2025-03-20 09:00", "2025-03-20 09:00"]).to_numpy()
+    rates = table.lookup(stores, times)
+    assert list(rates["commission_rate"]) == [0.3, 0.2, 0.25, 0.2, 0.1, 0.1, 0.25]
+    assert list(rates["tds_rate"]) == [RATES["tds_rate"]] * 7
+
+    pos = pd.DataFrame({
+        "order_id": ["P1", "P2"], "store_code": ["S1", "S2"],
+        "order_date": pd.to_datetime(["2025-03-20 12:00"] * 2),
+        "order_amount": [100.0, 100.0], "tax_amount": [5.0, 5.0], "status": ["Success"] * 2,
+    })
+    zomato = pd.DataFrame([
+        zomato_row("Z1", "P1", 100.0, 70.0, order_date=datetime(2025, 3, 20, 12)),
+        zomato_row("Z2", "P2", 100.0, 70.0, store_code="S2", order_date=datetime(2025, 3, 20, 12)),
+    ])
+    for name in ADJUSTMENT_FIELDS:
+        zomato[name] = 0.0
+    sheet = reconcile_frames(pos, zomato, table, tolerance=1.0)["3po_vs_pos"].set_index("zomato_order_id")
+    assert list(sheet["pos_commission_value"]) == [25.0, 10.0]
+    assert list(sheet["calculated_zomato_commission_value"]) == [25.0, 10.0]
+
+
+@pytest.mark.asyncio
+async def test_rate_card_marks_store_days_and_applies_in_the_sql_engine(sql_database):
+    """Test that saving a card dirties the Zomato store-days it covers and the SQL engine prices with it"""
+    from datetime import date
+    from app.models.main.dirty_partition import DirtyPartition
+    from app.models.main.orders import Orders
+    from app.models.main.store_daily_rollup import StoreDailyRollup
+    from app.models.sso import ZomatoOrder, Zomato3poVsPosData, OrdersNotIn3poData
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.rates import save_rate_card
+    from app.workers.sql_reconciliation import reconcile_in_database
+
+    session_factory = sql_database
+    async with session_factory() as db:
+        for store in ("S1", "S2"):
+            db.add_all([
+                StoreDailyRollup(source="zomato", store_code=store, business_date=date(2025, 3, day))
+                for day in (1, 10)
+            ])
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 10, 12), status="Success"),
+            Orders(order_id="P2", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 10, 12), net_amount=100, tax_paid_by_customer=5),
+        ])
+        await db.commit()
+
+        card, marked = await save_rate_card(db, 7, date(2025, 3, 5), dict(RATES, commission_rate=0.1),
+                                            store_code="S1")
+        assert marked == 1
+        keys = await DirtyPartition.get_keys(db, ["zomato"], date(2025, 3, 1), date(2025, 3, 31))
+        assert keys == {("S1", date(2025, 3, 10))}
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[],
+                                       organization_id=7)
+    async with session_factory() as db:
+        await reconcile_in_database(db, request)
+        row = (await db.execute(select(Zomato3poVsPosData))).scalar_one()
+        assert float(row.pos_commission_value) == 10.0
+        assert float(row.calculated_zomato_commission_value) == 10.0
+        # P2 predates the card and keeps the configured default rate
+        unmatched = (await db.execute(select(OrdersNotIn3poData))).scalar_one()
+        assert (unmatched.pos_order_id, float(unmatched.pos_commission_value)) == ("P2", 18.0)
+
+
+@pytest.mark.asyncio
+async def test_rate_cards_price_every_sheet_in_the_python_engine(python_engine):
+    """Test that the in-process engine prices matched and unmatched orders from the organization's cards"""
+    from datetime import date
+    from app.models.main.orders import Orders
+    from app.models.sso import ZomatoOrder, Zomato3poVsPosData, OrdersNotInPosData, OrdersNotIn3poData
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.rates import save_rate_card
+
+    session_factory = python_engine
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 10, 12), status="Success"),
+            Orders(order_id="P2", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 11, 12), status="Success"),
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 10, 12), net_amount=100, tax_paid_by_customer=5),
+            ZomatoOrder(id="z2", order_id="Z2", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 12, 12), net_amount=50, tax_paid_by_customer=2.5),
+            # Before the card, at the default rate
+            ZomatoOrder(id="z3", order_id="Z3", pos_order_id="P8", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=50, tax_paid_by_customer=2.5),
+        ])
+        await db.commit()
+        await save_rate_card(db, 7, date(2025, 3, 5), dict(RATES, commission_rate=0.1), store_code="S1")
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=[],
+                                       organization_id=7)
+    await generate_in_python(session_factory, request, rates=None)
+
+    async with session_factory() as db:
+        matched = (await db.execute(select(Zomato3poVsPosData))).scalar_one()
+        assert float(matched.calculated_zomato_commission_value) == 10.0
+        not_in_pos = {row.id: row for row in (await db.execute(select(OrdersNotInPosData))).scalars()}
+        assert float(not_in_pos["z2"].calculated_zomato_commission_value) == 5.0
+        assert float(not_in_pos["z3"].calculated_zomato_commission_value) == 9.0
+        not_in_3po = (await db.execute(select(OrdersNotIn3poData))).scalar_one()
+        assert (not_in_3po.pos_order_id, float(not_in_3po.pos_commission_value)) == ("P2", 10.0)
+
+
+def test_classify_gives_each_row_its_first_matching_reason():
+    """Test that the ordered rules label every delta row, defaults and an organization's own alike"""
+    import numpy as np
+    from app.workers.reasons import AMOUNT_FIELDS, DEFAULT_REASON_RULES, FALLBACK_REASON, classify, validate_rules
+
+    deltas = {name: np.zeros(5) for name in AMOUNT_FIELDS}
+    # Exact; TDS off by 0.6; commission off by 5; order value and payout off; payout 3 short alone
+    deltas["tds_amount"][1] = deltas["final_amount"][1] = 0.6
+    deltas["commission_value"][2] = deltas["final_amount"][2] = 5.0
+    deltas["net_amount"][3] = deltas["final_amount"][3] = -20.0
+    deltas["final_amount"][4] = 3.0
+
+    reasons, reconciled = classify(deltas, DEFAULT_REASON_RULES["matched"], tolerance=0.5)
+    assert list(reasons) == [None, "TDS rounding within 1 rupee", "Commission delta only",
+                             "Order value differs", "Short payment"]
+    assert list(reconciled) == [True, True, False, False, False]
+
+    rules = validate_rules({"matched": [
+        {"reason": "Small gap", "status": "reconciled", "when": [["final_amount", "abs<=", 5]]},
+    ]})["matched"]
+    reasons, reconciled = classify(deltas, rules, tolerance=0.5)
+    assert list(reasons) == ["Small gap"] * 3 + [FALLBACK_REASON, "Small gap"]
+    assert list(reconciled) == [True, True, True, False, True]
+
+    for bad in ({"matched": [{"status": "done"}]}, {"refund": [{"status": "reconciled", "when": [["x", "missing"]]}]},
+                {"matched": [{"status": "reconciled", "when": [["net_amount", "abs<=", "a lot"]]}]}):
+        with pytest.raises(ValueError):
+            validate_rules(bad)
+
+
+@pytest.mark.asyncio
+async def test_organization_reason_rules_apply_in_the_sql_engine(sql_database):
+    """Test that an organization's saved rules replace the defaults of the kinds they cover"""
+    from app.models.main.orders import Orders
+    from app.models.sso import ZomatoOrder, ZomatoPosVs3poData, OrdersNotInPosData, ReconciliationReasonRules
+    from app.routes.sheet_data import GenerateSheetDataRequest
+    from app.workers.sql_reconciliation import reconcile_in_database
+
+    session_factory = sql_database
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            # 3.82 short of the expected 73.82
+            ZomatoOrder(id="z1", order_id="Z1", pos_order_id="P1", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 12), net_amount=100, tax_paid_by_customer=5,
+                        commission_value=20, pg_applied_on=105, pg_charge=2.1, taxes_zomato_fee=3.98,
+                        tds_amount=0.1, final_amount=70),
+            ZomatoOrder(id="z2", order_id="Z2", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 13), net_amount=80, final_amount=60),
+        ])
+        await ReconciliationReasonRules.save(db, 7, {"matched": [
+            {"reason": "Payout short, under 5", "status": "reconciled",
+             "when": [["final_amount", ">", 0], ["final_amount", "<", 5], ["others", "abs<=", 0]]},
+        ]})
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=["S1"],
+                                       organization_id=7)
+    async with session_factory() as db:
+        await reconcile_in_database(db, request, rates=RATES)
+        matched = (await db.execute(select(ZomatoPosVs3poData))).scalar_one()
+        assert (matched.pos_vs_zomato_reason, matched.reconciled_status) == ("Payout short, under 5", "reconciled")
+        assert float(matched.reconciled_amount) == 70.0
+        not_in_pos = (await db.execute(select(OrdersNotInPosData))).scalar_one()
+        assert not_in_pos.zomato_vs_pos_reason == "Order not in POS"
+
+
+@pytest.mark.asyncio
+async def test_organization_reason_rules_apply_in_the_python_engine(python_engine):
+    """Test that the in-process engine classifies refunds and unmatched orders with an organization's rules"""
+    from app.models.main.orders import Orders
+    from app.models.sso import (
+        ZomatoOrder, Zomato3poVsPosRefundData, OrdersNotInPosData, OrdersNotIn3poData, ReconciliationReasonRules
+    )
+    from app.routes.sheet_data import GenerateSheetDataRequest
+
+    session_factory = python_engine
+    async with session_factory() as db:
+        db.add_all([
+            Orders(order_id="P1", store_code="S1", order_amount=100, tax_amount=5,
+                   order_date=datetime(2025, 3, 1, 12), status="Success"),
+            ZomatoOrder(id="z2", order_id="Z2", pos_order_id="P9", store_code="S1", action="sale",
+                        order_date=datetime(2025, 3, 1, 13), net_amount=80, final_amount=60),
+            # Refunds half of P1
+            ZomatoOrder(id="r1", order_id="Z1", pos_order_id="P1", store_code="S1", action="refund",
+                        order_date=datetime(2025, 3, 1, 18), net_amount=-50),
+        ])
+        await ReconciliationReasonRules.save(db, 7, {
+            "refund": [{"reason": "Partial refund, accepted", "status": "reconciled",
+                        "when": [["pos_order_id", "present"], ["net_amount", "<", 0]]}],
+            "not_in_pos": [{"reason": "Awaiting POS sync", "status": "reconciled", "when": []}],
+        })
+
+    request = GenerateSheetDataRequest(start_date="2025-03-01", end_date="2025-03-31", store_codes=["S1"],
+                                       organization_id=7)
+    await generate_in_python(session_factory, request)
+
+    async with session_factory() as db:
+        refund = (await db.execute(select(Zomato3poVsPosRefundData))).scalar_one()
+        assert (refund.zomato_vs_pos_reason, refund.reconciled_status) == ("Partial refund, accepted", "reconciled")
+        assert float(refund.reconciled_amount) == 50.0
+        not_in_pos = (await db.execute(select(OrdersNotInPosData))).scalar_one()
+        assert (not_in_pos.zomato_vs_pos_reason, float(not_in_pos.reconciled_amount)) == ("Awaiting POS sync", 60.0)
+        # P1 was refunded but never sold on Zomato; kinds the organization left out keep the defaults
+        not_in_3po = (await db.execute(select(OrdersNotIn3poData))).scalar_one()
+        assert (not_in_3po.pos_vs_zomato_reason, not_in_3po.reconciled_status) == (
+            "Order not in Zomato", "unreconciled"
+        )
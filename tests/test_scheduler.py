@@ -0,0 +1,74 @@
+"""
+Tests for the upload processing scheduler
+"""
+
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def upload_db(tmp_path):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.upload_record import UploadRecord
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uploads.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(UploadRecord.__table__.create)
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as db:
+        yield db
+    await engine.dispose()
+
+
+async def queue_uploads(db, *upload_types):
+    from app.models.main.upload_record import UploadRecord
+
+    records = []
+    for i, upload_type in enumerate(upload_types):
+        records.append(await UploadRecord.create(db,
+            filename=f"f{i}.csv", filepath=f"f{i}.csv", filesize=1, filetype=".csv",
+            upload_type=upload_type, status="uploaded"
+        ))
+    return records
+
+
+@pytest.mark.asyncio
+async def test_scheduler_enforces_global_and_per_type_limits(upload_db):
+    """Test that claims stop at the per-type and global caps"""
+    from app.workers.scheduler import UploadScheduler, CLAIMED, WAIT
+
+    scheduler = UploadScheduler(max_concurrent=3, max_per_type=2, type_limits={})
+    mpr1, mpr2, mpr3, trm1, trm2 = await queue_uploads(
+        upload_db, "mpr_hdfc_card", "mpr_hdfc_card", "mpr_hdfc_card", "trm", "trm"
+    )
+
+    assert await scheduler.claim_with_session(upload_db, mpr1.id, "mpr_hdfc_card") == CLAIMED
+    assert await scheduler.claim_with_session(upload_db, mpr2.id, "mpr_hdfc_card") == CLAIMED
+    # Per-type cap reached for MPR files, but TRM may still run
+    assert await scheduler.claim_with_session(upload_db, mpr3.id, "mpr_hdfc_card") == WAIT
+    assert await scheduler.claim_with_session(upload_db, trm1.id, "trm") == CLAIMED
+    # Global cap reached
+    assert await scheduler.claim_with_session(upload_db, trm2.id, "trm") == WAIT
+
+
+@pytest.mark.asyncio
+async def test_scheduler_is_fifo_and_skips_finished_uploads(upload_db):
+    """Test that older eligible uploads go first and finished ones are skipped"""
+    from app.models.main.upload_record import UploadRecord
+    from app.workers.scheduler import UploadScheduler, CLAIMED, WAIT, SKIP
+
+    scheduler = UploadScheduler(max_concurrent=1, max_per_type=1, type_limits={})
+    first, second = await queue_uploads(upload_db, "orders", "orders")
+
+    # The newer upload must wait while the older one is still queued
+    assert await scheduler.claim_with_session(upload_db, second.id, "orders") == WAIT
+    assert await scheduler.claim_with_session(upload_db, first.id, "orders") == CLAIMED
+    # A redelivered job for an upload already holding a slot keeps it
+    assert await scheduler.claim_with_session(upload_db, first.id, "orders") == CLAIMED
+
+    await UploadRecord.update(upload_db, first.id, status="completed")
+    assert await scheduler.claim_with_session(upload_db, first.id, "orders") == SKIP
+    assert await scheduler.claim_with_session(upload_db, second.id, "orders") == CLAIMED
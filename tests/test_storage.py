@@ -0,0 +1,123 @@
+"""
+Tests for content-addressed upload storage
+"""
+
+import hashlib
+import importlib.util
+import os
+import time
+import pytest
+from app.utils.storage import BlobStore, LocalBackend
+
+COMPRESSIONS = [
+    pytest.param("zstd", marks=pytest.mark.skipif(
+        importlib.util.find_spec("zstandard") is None, reason="zstandard not installed")),
+    "gzip",
+    "none",
+]
+
+
+def write_file(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("compression", COMPRESSIONS)
+def test_blobs_round_trip_compressed_and_deduplicated(tmp_path, monkeypatch, compression):
+    """Test that files are stored once per content and read back unchanged"""
+    from app.config.settings import settings
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "upload_chunk_size", 4096)
+
+    store = BlobStore(LocalBackend(str(tmp_path / "store")), compression)
+    data = b"order_id,amount\n" + b"".join(b"B%d,%d\n" % (i, i % 97) for i in range(20000))
+    path, sha256 = write_file(tmp_path, "orders.csv", data)
+
+    key = store.put(path, sha256)
+    assert key.startswith(f"{sha256[:2]}/{sha256[2:4]}/{sha256}")
+    assert os.path.exists(path)
+    stored_size = os.path.getsize(tmp_path / "store" / key)
+    if compression != "none":
+        assert stored_size < len(data) / 3
+
+    # A second copy of the same contents is not written again
+    assert store.put(path, sha256) == key
+    assert [stored for stored, _ in store.list()] == [key]
+
+    with store.open(key) as stream:
+        assert stream.read(16) == b"order_id,amount\n"
+    store.fetch(key, str(tmp_path / "work" / "copy.csv"))
+    assert (tmp_path / "work" / "copy.csv").read_bytes() == data
+
+    store.delete(key)
+    assert list(store.list()) == []
+
+
+def test_garbage_collection_keeps_referenced_and_recent_files(tmp_path, monkeypatch):
+    """Test that only old, unreferenced stored files are deleted"""
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from contextlib import asynccontextmanager
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.config.settings import settings
+    from app.models.main.upload_record import UploadRecord
+    from app.utils.storage import get_blob_store
+    from app.workers import tasks
+
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "storage_backend", "local")
+    monkeypatch.setattr(settings, "storage_root", None)
+    monkeypatch.setattr(settings, "storage_compression", "gzip")
+    store = get_blob_store()
+    keys = {}
+    for name in ("kept", "orphan", "fresh"):
+        path, sha256 = write_file(tmp_path, f"{name}.csv", name.encode())
+        keys[name] = store.put(path, sha256)
+    old = time.time() - 2 * settings.storage_gc_grace_seconds
+    for name in ("kept", "orphan"):
+        os.utime(tmp_path / "uploads" / "store" / keys[name], (old, old))
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'gc.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(UploadRecord.__table__.create)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+        @asynccontextmanager
+        async def session():
+            async with session_factory() as db:
+                yield db
+
+        monkeypatch.setattr(tasks, "sso_db_session", session)
+        async with session_factory() as db:
+            await UploadRecord.create(db, filename="kept.csv", filepath="kept.csv", filesize=4,
+                                      filetype=".csv", upload_type="orders", storage_key=keys["kept"])
+        try:
+            return await tasks.collect_storage_garbage()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == 1
+    assert sorted(key for key, _ in store.list()) == sorted([keys["kept"], keys["fresh"]])
+
+
+def test_s3_backend_round_trip(tmp_path, monkeypatch):
+    """Test the S3 backend against an in-process S3 stand-in"""
+    moto = pytest.importorskip("moto")
+    import boto3
+    from app.utils.storage import S3Backend
+    from app.config.settings import settings
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="uploads")
+        store = BlobStore(S3Backend("uploads", prefix="blobs/", region="us-east-1"), "gzip")
+        path, sha256 = write_file(tmp_path, "mpr.csv", b"tid,amount\nT1,10\n")
+
+        key = store.put(path, sha256)
+        assert store.backend.exists(key)
+        with store.open(key) as stream:
+            assert stream.read() == b"tid,amount\nT1,10\n"
+        store.delete(key)
+        assert list(store.list()) == []
@@ -0,0 +1,131 @@
+"""
+Tests for content-hash deduplication of uploads
+"""
+
+import hashlib
+import pytest
+import pytest_asyncio
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest_asyncio.fixture
+async def upload_db(tmp_path):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from app.models.main.upload_record import UploadRecord
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'uploads.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(UploadRecord.__table__.create)
+
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_factory() as db:
+        yield db
+    await engine.dispose()
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    from app.workers import jobs
+
+    calls = []
+
+    async def fake_enqueue(upload_id, file_path, upload_type):
+        calls.append((upload_id, file_path))
+
+    monkeypatch.setattr(jobs, "enqueue_upload_processing", fake_enqueue)
+    return calls
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    from app.config.settings import settings
+
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "storage_backend", "local")
+    monkeypatch.setattr(settings, "storage_root", None)
+    monkeypatch.setattr(settings, "storage_compression", "gzip")
+
+
+def write_copy(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_duplicate_upload_returns_existing_record(tmp_path, upload_db, queued):
+    """Test that identical contents are registered once and the copy is discarded"""
+    from app.routes.uploader import register_upload
+
+    data = b"order_id,amount\nA1,10\n"
+    sha256 = hashlib.sha256(data).hexdigest()
+    first_path = write_copy(tmp_path, "first.csv", data)
+    second_path = write_copy(tmp_path, "second.csv", data)
+
+    first, outcome = await register_upload(upload_db, "mpr.csv", first_path, len(data), ".csv", "mpr_hdfc_card", sha256)
+    assert outcome == "uploaded"
+
+    second, outcome = await register_upload(upload_db, "mpr copy.csv", second_path, len(data), ".csv", "mpr_hdfc_card", sha256)
+    assert outcome == "duplicate"
+    assert second.id == first.id
+    assert not (tmp_path / "first.csv").exists()
+    assert not (tmp_path / "second.csv").exists()
+    assert queued == [(first.id, first_path)]
+
+    # The same contents under another upload type are a separate upload
+    other_path = write_copy(tmp_path, "other.csv", data)
+    other, outcome = await register_upload(upload_db, "mpr.csv", other_path, len(data), ".csv", "mpr_hdfc_upi", sha256)
+    assert outcome == "uploaded"
+    assert other.id != first.id
+
+    # Both uploads share one compressed copy in storage
+    from app.utils.storage import get_blob_store
+    assert other.storage_key == first.storage_key
+    with get_blob_store().open(first.storage_key) as stored:
+        assert stored.read() == data
+
+
+@pytest.mark.asyncio
+async def test_force_requeues_existing_record(tmp_path, upload_db, queued):
+    """Test that force reprocesses the existing record from its stored file"""
+    from app.models.main.upload_record import UploadRecord
+    from app.routes.uploader import register_upload
+
+    data = b"settlement"
+    sha256 = hashlib.sha256(data).hexdigest()
+    first_path = write_copy(tmp_path, "first.csv", data)
+    first, _ = await register_upload(upload_db, "z.csv", first_path, len(data), ".csv", "reconciliation", sha256)
+    await UploadRecord.update(upload_db, first.id, status="completed", processed_data='{"rows": 1}')
+
+    again_path = write_copy(tmp_path, "again.csv", data)
+    again, outcome = await register_upload(upload_db, "z.csv", again_path, len(data), ".csv", "reconciliation", sha256, force=True)
+
+    assert outcome == "reprocessing"
+    assert again.id == first.id
+    assert again.status == "uploaded"
+    assert again.processed_data is None
+    assert queued == [(first.id, first_path), (first.id, first_path)]
+
+
+@pytest.mark.asyncio
+async def test_force_is_refused_while_processing(tmp_path, upload_db, queued):
+    """Test that force does not queue a second job for a record that is still processing"""
+    from fastapi import HTTPException
+    from app.models.main.upload_record import UploadRecord
+    from app.routes.uploader import register_upload
+
+    data = b"settlement"
+    sha256 = hashlib.sha256(data).hexdigest()
+    first_path = write_copy(tmp_path, "first.csv", data)
+    first, _ = await register_upload(upload_db, "z.csv", first_path, len(data), ".csv", "reconciliation", sha256)
+    await UploadRecord.update(upload_db, first.id, status="processing")
+
+    again_path = write_copy(tmp_path, "again.csv", data)
+    with pytest.raises(HTTPException) as conflict:
+        await register_upload(upload_db, "z.csv", again_path, len(data), ".csv", "reconciliation", sha256, force=True)
+
+    assert conflict.value.status_code == 409
+    assert (await UploadRecord.get_by_id(upload_db, first.id)).status == "processing"
+    assert (tmp_path / "again.csv").exists()
+    assert queued == [(first.id, first_path)]